@@ -1,9 +1,9 @@
 from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
+from app.utils.storage import StorageSQLAlchemy, init_storage
 from config import Config
 
-db = SQLAlchemy()
+db = StorageSQLAlchemy()
 
 def create_app(config_class=Config):
     """
@@ -19,8 +19,11 @@ def create_app(config_class=Config):
     app.config.from_object(config_class)
     
     # Initialize extensions
+    storage = init_storage(app)  # WAL/PostgreSQL engine tuning, before the engine exists
     db.init_app(app)
     CORS(app)  # Enable CORS for all routes
+    from app.utils.metrics import instrument_app
+    instrument_app(app)  # Per-route latency histograms for /metrics
     
     # Register blueprints
     from app.routes import bp
@@ -28,4 +31,25 @@ def create_app(config_class=Config):
     
     with app.app_context():
         db.create_all()
+        # Writer thread and read-only connections only once the tables exist; upgrades of an
+        # existing database run from the ingesting entry points (app.utils.migrations.migrate_database)
+        storage.start(db.engine)
+        if storage.writer is not None:
+            from app.utils.metrics import register_queue
+            register_queue('db_writer', storage.writer.depth)
+        print(f"Storage mode: {storage.mode}")
+
+    # Warm-load cached anomaly models so the first cycle only scores
+    from app.utils.model_registry import model_registry
+    loaded = model_registry.warm_load()
+    if loaded:
+        print(f"Loaded cached models: {', '.join(loaded)}")
+    from app.utils.feature_store import feature_store, snapshot_path as feature_store_snapshot_path
+    if feature_store.load(feature_store_snapshot_path()):
+        print(f"Restored address feature store ({feature_store.stats()['addresses']} addresses)")
+    if config_class.ANOMALY_DETECTOR == 'streaming':
+        from app.utils.streaming_detector import load_detectors
+        restored = load_detectors(list(config_class.MONITORED_TOKENS.values()))
+        if restored:
+            print(f"Restored streaming detector state for {len(restored)} tokens")
     return app
\ No newline at end of file
@@ -1,14 +1,57 @@
 from datetime import datetime
+from decimal import Decimal
 from app import db
+from app.utils.log_decoder import format_amount, known_decimals
+from config import Config
+
+class TokenAmount(db.TypeDecorator):
+    """
+    Exact uint256 token amount in base units, as a Python int.
+
+    Stored as NUMERIC(78, 0) on PostgreSQL and as decimal text on SQLite,
+    whose INTEGER stops at 2**63.
+    """
+    impl = db.String(78)
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == 'postgresql':
+            return dialect.type_descriptor(db.Numeric(78, 0))
+        return dialect.type_descriptor(db.String(78))
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return Decimal(int(value)) if dialect.name == 'postgresql' else str(int(value))
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else int(value)
 
 class Transaction(db.Model):
+    __table_args__ = (
+        # Serves newest-first ordering and keyset pagination on (timestamp, id)
+        db.Index('ix_transaction_timestamp_id', 'timestamp', 'id'),
+        db.Index('ix_transaction_block_number', 'block_number'),
+        # Address indexes carry amount and is_anomaly so activity totals are index-only
+        db.Index('ix_transaction_from_activity', 'from_address', 'timestamp', 'amount', 'is_anomaly'),
+        db.Index('ix_transaction_to_activity', 'to_address', 'timestamp', 'amount', 'is_anomaly'),
+        # Per-token windows (dashboard filters, per-token anomaly models)
+        db.Index('ix_transaction_token_timestamp', 'token_address', 'timestamp', 'id'),
+        # One transaction can emit several transfers (e.g. a swap across tokens)
+        db.UniqueConstraint('tx_hash', 'log_index', name='uq_transaction_log'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
-    tx_hash = db.Column(db.String(66), unique=True, nullable=False)
+    tx_hash = db.Column(db.String(66), nullable=False)
+    # Rows ingested before multi-token monitoring are USDC transfers
+    token_address = db.Column(db.String(42), nullable=True, default=Config.USDC_CONTRACT_ADDRESS)
     from_address = db.Column(db.String(42), nullable=False)
     to_address = db.Column(db.String(42), nullable=False)
-    amount = db.Column(db.Float, nullable=False)
+    amount = db.Column(db.Float, nullable=False)  # Approximate, for aggregates and models
+    amount_raw = db.Column(TokenAmount, nullable=True)  # Exact amount in token base units
     timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     block_number = db.Column(db.Integer, nullable=False)
+    log_index = db.Column(db.Integer, nullable=True)
     is_anomaly = db.Column(db.Boolean, default=False)
     anomaly_score = db.Column(db.Float, nullable=True)
 
@@ -16,11 +59,73 @@ class Transaction(db.Model):
         return {
             'id': self.id,
             'tx_hash': self.tx_hash,
+            'token_address': self.token_address,
             'from_address': self.from_address,
             'to_address': self.to_address,
             'amount': self.amount,
+            'amount_raw': str(self.amount_raw) if self.amount_raw is not None else None,
+            'amount_formatted': format_amount(self.amount_raw,
+                                              known_decimals(self.token_address or Config.USDC_CONTRACT_ADDRESS)),
             'timestamp': self.timestamp.isoformat(),
             'block_number': self.block_number,
+            'log_index': self.log_index,
             'is_anomaly': self.is_anomaly,
             'anomaly_score': self.anomaly_score
-        }
\ No newline at end of file
+        }
+
+class IngestCursor(db.Model):
+    """Last block whose Transfer logs were fully ingested, per contract."""
+    contract_address = db.Column(db.String(42), primary_key=True)
+    last_block = db.Column(db.Integer, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'contract_address': self.contract_address,
+            'last_block': self.last_block,
+            'updated_at': self.updated_at.isoformat()
+        }
+
+
+class Token(db.Model):
+    """Decimals of a token, stored by ingestion so processes that never read them on chain can format amounts."""
+    address = db.Column(db.String(42), primary_key=True)  # Lowercase
+    decimals = db.Column(db.Integer, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class BackfillUnit(db.Model):
+    """One block range of a backfill job; done units are skipped when the job is resumed."""
+    __table_args__ = (
+        db.UniqueConstraint('job', 'start_block', name='uq_backfill_unit'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    job = db.Column(db.String(64), nullable=False)
+    start_block = db.Column(db.Integer, nullable=False)
+    end_block = db.Column(db.Integer, nullable=False)
+    done = db.Column(db.Boolean, nullable=False, default=False)
+    transfers = db.Column(db.Integer, nullable=True)  # Transfers found in the range once done
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class TransactionRollup(db.Model):
+    """Pre-aggregated volume, count and anomaly count per time bucket."""
+    __table_args__ = (
+        db.UniqueConstraint('granularity', 'bucket_start', 'token_address', name='uq_rollup_token_bucket'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    granularity = db.Column(db.String(8), nullable=False)  # 'minute', 'hour' or 'day'
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    token_address = db.Column(db.String(42), nullable=False)
+    volume = db.Column(db.Float, nullable=False, default=0.0)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    anomaly_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def to_dict(self):
+        return {
+            'volume': self.volume,
+            'count': self.count,
+            'anomalies': self.anomaly_count
+        }
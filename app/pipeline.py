@@ -0,0 +1,359 @@
+import asyncio
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.utils.hot_window import hot_window
+from app.utils.metrics import record_ingest_position, register_queue, stage_seconds
+from app.utils.transfer_graph import transfer_graph
+from config import Config
+
+STAGES = ('heads', 'fetch', 'blocks', 'decode', 'score', 'write')
+
+# Sentinel passed down the queues on shutdown, once every batch before it
+STOP = object()
+
+
+class StageStats:
+    """Throughput counters of one pipeline stage."""
+
+    def __init__(self, name=None):
+        self.name = name
+        self.batches = 0
+        self.rows = 0
+        self.busy = 0.0
+        self.errors = 0
+
+    def record(self, rows, seconds):
+        self.batches += 1
+        self.rows += rows
+        self.busy += seconds
+        stage_seconds.observe(seconds, self.name)
+
+    def to_dict(self, queue=None):
+        return {
+            'batches': self.batches,
+            'rows': self.rows,
+            'busy_seconds': round(self.busy, 3),
+            'rows_per_second': round(self.rows / self.busy, 1) if self.busy else 0.0,
+            'errors': self.errors,
+            'queued': queue.qsize() if queue is not None else 0
+        }
+
+
+class Batch:
+    """One block range moving through the pipeline."""
+
+    __slots__ = ('seq', 'start_block', 'end_block', 'events', 'timestamps', 'rows')
+
+    def __init__(self, seq, start_block, end_block):
+        self.seq = seq
+        self.start_block = start_block
+        self.end_block = end_block
+        self.events = None
+        self.timestamps = None
+        self.rows = None
+
+
+class IngestionPipeline:
+    """
+    Staged asyncio ingestion engine.
+
+    A head watcher polls the chain head and, whenever a new head is seen,
+    plans the newly confirmed block ranges, each swept once for the
+    Transfer logs of every monitored token. Each range then moves through
+    log fetching, block metadata, decoding, scoring and the DB writer.
+    Stages are connected by bounded queues, so a slow writer makes the
+    fetchers wait instead of buffering without limit (backpressure), while
+    RPC waits for the next ranges overlap with scoring and writing of the
+    current one.
+
+    Blocking work runs in executors: RPC calls in an I/O pool (with
+    `fetch_workers` concurrent range fetches), decoding and scoring in one
+    CPU thread and every DB write in a single writer thread inside an app
+    context. Batches are restored to block order before scoring, so the
+    streaming detector sees transfers in order and the cursor only advances
+    over contiguous, committed ranges.
+
+    `stop()` (SIGINT/SIGTERM when run via `ingest.py`) stops planning new
+    ranges; batches already in flight are fetched, written and the cursor
+    advanced before `run()` returns. A second signal cancels immediately.
+    """
+
+    def __init__(self, app, w3=None, queue_size=None, fetch_workers=None, poll_interval=None,
+                 maintenance_interval=None):
+        self.app = app
+        self.w3 = w3
+        self.tokens = None
+        self.queue_size = queue_size or Config.PIPELINE_QUEUE_SIZE
+        self.fetch_workers = fetch_workers or Config.PIPELINE_FETCH_WORKERS
+        self.poll_interval = Config.HEAD_POLL_INTERVAL if poll_interval is None else poll_interval
+        self.maintenance_interval = (Config.PIPELINE_MAINTENANCE_INTERVAL if maintenance_interval is None
+                                     else maintenance_interval)
+        self.stage_stats = {name: StageStats(name) for name in STAGES}
+        self.head_block = None
+        self.committed_block = None
+        self.error = None
+        self._stopping = None
+        self._tasks = []
+
+    # Executors -----------------------------------------------------------
+
+    async def _run_in(self, executor, func, *args):
+        return await asyncio.get_event_loop().run_in_executor(executor, func, *args)
+
+    def _in_app_context(self, func, *args):
+        with self.app.app_context():
+            return func(*args)
+
+    async def _db(self, func, *args):
+        return await self._run_in(self._db_executor, self._in_app_context, func, *args)
+
+    async def _retry(self, stage, executor, func, *args):
+        """Run a blocking call, retrying with backoff before giving up on the pipeline."""
+        for attempt in range(Config.PIPELINE_RETRIES + 1):
+            try:
+                return await self._run_in(executor, func, *args)
+            except Exception as e:
+                self.stage_stats[stage].errors += 1
+                if attempt == Config.PIPELINE_RETRIES:
+                    raise
+                print(f"Pipeline {stage} failed ({str(e)}), retrying")
+                await asyncio.sleep(2 ** attempt)
+
+    # Control -------------------------------------------------------------
+
+    def stop(self):
+        """Stop planning new ranges and drain the batches in flight."""
+        if self._stopping is not None and not self._stopping.is_set():
+            print("Stopping ingestion pipeline, flushing in-flight batches...")
+            self._stopping.set()
+        elif self._tasks:
+            print("Cancelling ingestion pipeline")
+            for task in self._tasks:
+                task.cancel()
+
+    def install_signal_handlers(self):
+        loop = asyncio.get_event_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self.stop)
+
+    def stats(self):
+        queues = dict(zip(STAGES, getattr(self, '_queues', [None] * len(STAGES))))
+        return {
+            'head_block': self.head_block,
+            'committed_block': self.committed_block,
+            'stages': {name: stats.to_dict(queues.get(name)) for name, stats in self.stage_stats.items()}
+        }
+
+    async def run(self):
+        """Run until `stop()`, or until a stage fails after its retries."""
+        from app.routes import get_web3, monitored_tokens
+
+        self.w3 = self.w3 or get_web3()
+        self.tokens = monitored_tokens()
+        self._stopping = asyncio.Event()
+        self._fetchers_done = 0
+        self._io_executor = ThreadPoolExecutor(self.fetch_workers + 2, thread_name_prefix='ingest-io')
+        self._cpu_executor = ThreadPoolExecutor(1, thread_name_prefix='ingest-cpu')
+        self._db_executor = ThreadPoolExecutor(1, thread_name_prefix='ingest-db')
+        # The queue feeding each stage; 'heads' has no input queue
+        self._queues = [None] + [asyncio.Queue(self.queue_size) for _ in STAGES[1:]]
+        ranges, fetched, with_blocks, decoded, scored = self._queues[1:]
+        for name, stage_queue in zip(STAGES[1:], self._queues[1:]):
+            register_queue(f'pipeline_{name}', stage_queue.qsize)
+
+        self._tasks = [asyncio.ensure_future(coro) for coro in (
+            self._watch_heads(ranges),
+            *[self._fetch(ranges, fetched) for _ in range(self.fetch_workers)],
+            self._block_metadata(fetched, with_blocks),
+            self._decode(with_blocks, decoded),
+            self._score(decoded, scored),
+            self._write(scored),
+            self._report()
+        )]
+        try:
+            # Recent transfers are served from memory once this process ingests; the
+            # single DB thread loads them before it commits any batch
+            await self._db(hot_window.ensure_loaded)
+            await self._db(transfer_graph.ensure_loaded)
+            await asyncio.gather(*self._tasks[:-1])
+        except Exception as e:
+            self.error = e
+            print(f"Ingestion pipeline failed: {str(e)}")
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        finally:
+            self._tasks[-1].cancel()
+            for executor in (self._io_executor, self._cpu_executor, self._db_executor):
+                executor.shutdown(wait=True)
+            print(f"Ingestion pipeline stopped: {self.stats()}")
+        if self.error is not None:
+            raise self.error
+
+    # Stages --------------------------------------------------------------
+
+    async def _watch_heads(self, ranges):
+        from app.utils.ingest_cursor import get_sweep_start, plan_ranges
+
+        stats = self.stage_stats['heads']
+        next_after = await self._db(get_sweep_start, self.tokens)
+        seq = 0
+        while not self._stopping.is_set():
+            started = time.monotonic()
+            head = await self._retry('heads', self._io_executor, lambda: self.w3.eth.block_number)
+            if head != self.head_block:
+                self.head_block = head
+                record_ingest_position(head=head)
+                planned = plan_ranges(next_after, head, confirmations=Config.CONFIRMATION_DEPTH,
+                                      chunk_size=Config.INGEST_CHUNK_SIZE,
+                                      lookback=Config.INITIAL_LOOKBACK_BLOCKS)
+                stats.record(len(planned), time.monotonic() - started)
+                for start_block, end_block in planned:
+                    if self._stopping.is_set():
+                        break
+                    # Blocks while the pipeline is full
+                    await ranges.put(Batch(seq, start_block, end_block))
+                    seq += 1
+                    next_after = end_block
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+        for _ in range(self.fetch_workers):
+            await ranges.put(STOP)
+
+    async def _fetch(self, ranges, fetched):
+        from app.routes import get_transfer_events
+
+        stats = self.stage_stats['fetch']
+        while True:
+            batch = await ranges.get()
+            if batch is STOP:
+                self._fetchers_done += 1
+                if self._fetchers_done == self.fetch_workers:
+                    await fetched.put(STOP)
+                return
+            started = time.monotonic()
+            batch.events = await self._retry('fetch', self._io_executor, get_transfer_events,
+                                             self.w3, batch.start_block, batch.end_block, self.tokens)
+            stats.record(len(batch.events), time.monotonic() - started)
+            await fetched.put(batch)
+
+    async def _block_metadata(self, fetched, with_blocks):
+        from app.utils.block_cache import get_block_timestamps
+
+        stats = self.stage_stats['blocks']
+        while True:
+            batch = await fetched.get()
+            if batch is STOP:
+                await with_blocks.put(STOP)
+                return
+            started = time.monotonic()
+            block_numbers = [transfer['block_number'] for transfer in batch.events]
+            batch.timestamps = await self._retry('blocks', self._io_executor, get_block_timestamps,
+                                                 self.w3, block_numbers)
+            stats.record(len(batch.events), time.monotonic() - started)
+            await with_blocks.put(batch)
+
+    async def _decode(self, with_blocks, decoded):
+        from app.routes import token_decimals, transfers_to_rows
+        from app.utils.log_decoder import store_decimals
+
+        stats = self.stage_stats['decode']
+        decimals = await self._retry('decode', self._io_executor, token_decimals, self.w3, self.tokens)
+        # For API processes formatting amounts of tokens they never looked up
+        await self._db(store_decimals, decimals)
+        while True:
+            batch = await with_blocks.get()
+            if batch is STOP:
+                await decoded.put(STOP)
+                return
+            started = time.monotonic()
+            batch.rows = await self._run_in(self._cpu_executor, transfers_to_rows,
+                                            batch.events, batch.timestamps, decimals)
+            batch.events = batch.timestamps = None
+            stats.record(len(batch.rows), time.monotonic() - started)
+            await decoded.put(batch)
+
+    async def _score(self, decoded, scored):
+        from app.utils.streaming_detector import score_rows
+
+        stats = self.stage_stats['score']
+        # Concurrent fetches finish out of order; restore block order here
+        pending = {}
+        next_seq = 0
+        while True:
+            batch = await decoded.get()
+            if batch is STOP:
+                # A gap means an earlier range never arrived: later ones are
+                # dropped and refetched from the cursor on the next start
+                await scored.put(STOP)
+                return
+            pending[batch.seq] = batch
+            while next_seq in pending:
+                batch = pending.pop(next_seq)
+                next_seq += 1
+                started = time.monotonic()
+                if Config.ANOMALY_DETECTOR == 'streaming':
+                    await self._run_in(self._cpu_executor, score_rows, batch.rows)
+                stats.record(len(batch.rows), time.monotonic() - started)
+                await scored.put(batch)
+
+    def _commit_batch(self, batch):
+        from app.routes import write_rows
+        from app.utils.ingest_cursor import advance_cursors
+        from app.utils.response_cache import response_cache
+
+        inserted, _ = write_rows(batch.rows)
+        # Only move the cursor once the whole range is committed
+        advance_cursors(self.tokens, batch.end_block)
+        response_cache.bump_watermark(block=batch.end_block)
+        return inserted
+
+    async def _write(self, scored):
+        from app.routes import finish_ingest_cycle
+
+        stats = self.stage_stats['write']
+        last_maintenance = time.monotonic()
+        dirty = False
+        while True:
+            batch = await scored.get()
+            if batch is STOP:
+                if dirty:
+                    await self._db(finish_ingest_cycle)
+                return
+            started = time.monotonic()
+            await self._db(self._commit_batch, batch)
+            stats.record(len(batch.rows), time.monotonic() - started)
+            self.committed_block = batch.end_block
+            record_ingest_position(committed=batch.end_block)
+            dirty = True
+
+            # Prune, snapshot and batch-score once caught up, at most every interval
+            if scored.empty() and time.monotonic() - last_maintenance >= self.maintenance_interval:
+                behind = self.head_block - self.committed_block if self.head_block is not None else 0
+                print(f"Ingested up to block {self.committed_block} ({behind} behind head)")
+                await self._db(finish_ingest_cycle)
+                last_maintenance = time.monotonic()
+                dirty = False
+
+    async def _report(self):
+        while True:
+            await asyncio.sleep(Config.PIPELINE_STATS_INTERVAL)
+            print(f"Ingestion pipeline: {self.stats()}")
+
+
+def run_pipeline(app, install_signal_handlers=False):
+    """Run one pipeline to completion on a fresh event loop (e.g. in a background thread)."""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    pipeline = IngestionPipeline(app)
+    try:
+        if install_signal_handlers:
+            pipeline.install_signal_handlers()
+        loop.run_until_complete(pipeline.run())
+    finally:
+        loop.close()
+    return pipeline
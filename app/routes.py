@@ -1,202 +1,415 @@
-from flask import Blueprint, render_template, jsonify
-from .models import Transaction
-from sqlalchemy import func
-from datetime import datetime, timedelta
+from flask import Blueprint, Response, jsonify, render_template, request, stream_with_context, url_for
+from .models import IngestCursor, Transaction
+from sqlalchemy import BigInteger, and_, bindparam, case, cast, func, select
+from datetime import datetime, timedelta, timezone
 from app import db
 from web3 import Web3
 import json
 import requests
-import pandas as pd
 from sklearn.ensemble import IsolationForest
 import numpy as np
 from config import Config
+from app.utils.fraud_detection import TRANSACTION_FEATURES, amount_stats, compute_features
+from app.utils.hot_window import hot_window
+from app.utils.model_executor import ModelJobError, model_executor
+from app.utils.model_registry import model_registry
+from app.utils.response_cache import response_cache
+from app.utils.rollups import (apply_deltas, deltas_for_anomaly_changes, deltas_for_rows, prune_minute_buckets,
+                                update_rollups, window_summary)
+from app.utils.transaction_query import fetch_page, iter_export
+from app.utils.streaming_detector import save_detectors, score_rows
+from app.utils.feature_store import feature_store, snapshot_path as feature_store_snapshot_path
+from app.utils.transfer_graph import from_seconds, transfer_graph
+from app.utils.balance_service import balance_service
+from app.utils.address_activity import get_address_activity
+from app.utils.event_stream import event_broker, format_sse
+from app.utils.block_cache import block_cache, get_block_timestamps
+from app.utils.bulk_insert import bulk_insert_transactions
+from app.utils.change_feed import change_feed
+from app.utils.archive import archive_committed, archive_queue
+from app.utils.log_fetcher import log_fetcher
+from app.utils.metrics import (CONTENT_TYPE, metrics, model_rows, model_seconds, record_ingest_position,
+                               register_cache, register_queue, rpc_middleware)
+from app.utils.profiler import profiler
+from app.utils.storage import current_storage, writes
+from app.utils.log_decoder import (TRANSFER_TOPIC, fetch_transfer_logs, get_token_decimals, store_decimals,
+                                  transfer_from_event)
+from app.utils.ingest_cursor import advance_cursors, get_sweep_start, plan_ranges
 
 bp = Blueprint('main', __name__)
 
+# Cache hit rates and queue depths are read from their owners at scrape time
+register_cache('block_cache', block_cache.stats)
+register_cache('response_cache', response_cache.stats)
+register_cache('balance_service', balance_service.stats)
+register_queue('event_stream', event_broker.queued)
+register_queue('model_executor', model_executor.depth)
+
 def get_web3():
     """Initialize Web3 connection using Alchemy API URL"""
     if not Config.ALCHEMY_API_URL:
         raise ValueError("ALCHEMY_API_URL not set in environment variables")
-    return Web3(Web3.HTTPProvider(Config.ALCHEMY_API_URL))
+    w3 = Web3(Web3.HTTPProvider(Config.ALCHEMY_API_URL))
+    w3.middleware_onion.add(rpc_middleware, 'metrics')
+    return w3
 
 def get_token_balances(address):
     """Get token balances for a given address using Alchemy API"""
-    if not Config.ALCHEMY_API_URL:
-        raise ValueError("ALCHEMY_API_URL not set in environment variables")
-        
-    headers = {'Content-Type': 'application/json'}
-    payload = {
-        "jsonrpc": "2.0",
-        "method": "alchemy_getTokenBalances",
-        "params": [address, "erc20", {"maxCount": 100}],
-        "id": 0
-    }
-    
     try:
-        response = requests.post(Config.ALCHEMY_API_URL, headers=headers, json=payload)
-        data = response.json()
-        if 'result' in data and 'tokenBalances' in data['result']:
-            return data['result']['tokenBalances']
-        return []
-    except Exception as e:
+        balances = balance_service.get_balances([address])[address]
+    except (requests.RequestException, ValueError) as e:
         print(f"Error fetching token balances: {e}")
         return []
+    return [] if isinstance(balances, dict) else balances
+
+def monitored_tokens():
+    """Checksummed addresses of the tokens swept for Transfer logs"""
+    return [Web3.to_checksum_address(address) for address in Config.MONITORED_TOKENS.values()]
+
+def token_decimals(w3, tokens=None):
+    """Decimals of each monitored token, keyed by its checksummed address"""
+    return {token: get_token_decimals(w3, token) for token in tokens or monitored_tokens()}
+
+def stored_token_decimals(w3, tokens=None):
+    """`token_decimals`, also stored for processes that format amounts without reading them on chain"""
+    decimals = token_decimals(w3, tokens)
+    store_decimals(decimals)
+    return decimals
+
+def transfers_to_rows(transfers, block_timestamps, decimals):
+    """Convert decoded transfers into Transaction column dictionaries, given decimals per token"""
+    scales = {token: 10 ** token_decimals for token, token_decimals in decimals.items()}
+    return [{
+        'tx_hash': transfer['tx_hash'],
+        'token_address': transfer['token_address'],
+        'from_address': transfer['from_address'],
+        'to_address': transfer['to_address'],
+        # Exact base units; the float is only used for aggregates and models
+        'amount_raw': transfer['value'],
+        'amount': transfer['value'] / scales[transfer['token_address']],
+        'block_number': transfer['block_number'],
+        'log_index': transfer['log_index'],
+        'timestamp': datetime.fromtimestamp(block_timestamps[transfer['block_number']]),
+        'is_anomaly': False,
+        'anomaly_score': None
+    } for transfer in transfers]
+
+def store_events(w3, transfers):
+    """Persist decoded transfers with set-based inserts, returning (inserted, skipped)"""
+    block_timestamps = get_block_timestamps(w3, (transfer['block_number'] for transfer in transfers))
+    rows = transfers_to_rows(transfers, block_timestamps, stored_token_decimals(w3))
+    if Config.ANOMALY_DETECTOR == 'streaming':
+        # Score before insert so no second write pass is needed
+        score_rows(rows)
+    return write_rows(rows)
+
+@writes
+def write_rows(rows):
+    """Insert decoded rows with rollup, feature, stream and archive hooks, returning (inserted, skipped)"""
+    inserted, skipped = bulk_insert_transactions(rows, on_insert=update_rollups, on_commit=transactions_committed)
+    print(f"Inserted {inserted} transactions, skipped {skipped} already stored")
+    return inserted, skipped
+
+def transactions_committed(rows):
+    """Feed newly committed transactions to the feature store, transfer graph, hot window, stream clients and archive"""
+    feature_store.observe_rows(rows)
+    transfer_graph.add_rows(rows)
+    hot_window.add_rows(rows)
+    publish_transactions(rows)
+    # Only buffered here; the archive thread encodes and uploads them
+    archive_committed(rows)
+
+def publish_transactions(rows):
+    """Push newly committed transactions and their rollup deltas to stream clients"""
+    for row in rows:
+        data = {key: row.get(key) for key in ('tx_hash', 'token_address', 'from_address', 'to_address', 'amount',
+                                              'block_number', 'log_index', 'is_anomaly', 'anomaly_score')}
+        data['timestamp'] = row['timestamp'].isoformat()
+        if row.get('amount_raw') is not None:
+            # As a string: JSON numbers lose precision past 2**53
+            data['amount_raw'] = str(row['amount_raw'])
+        event_broker.publish('transaction', data, position=(row['block_number'], row.get('log_index') or 0))
+    for (granularity, bucket_start, token_address), (volume, count, anomalies) in deltas_for_rows(rows).items():
+        if granularity == 'hour':
+            event_broker.publish('rollup', {
+                'granularity': granularity,
+                'bucket_start': bucket_start.isoformat(),
+                'token_address': token_address,
+                'volume': volume,
+                'count': count,
+                'anomalies': anomalies
+            })
+
+# ERC-20 Transfer event ABI (minimal for transfer events)
+TRANSFER_ABI = json.loads('[{"anonymous":false,"inputs":[{"indexed":true,"name":"from","type":"address"},{"indexed":true,"name":"to","type":"address"},{"indexed":false,"name":"value","type":"uint256"}],"name":"Transfer","type":"event"}]')
+
+def get_transfer_events(w3, start_block, end_block, tokens=None):
+    """
+    Fetch decoded Transfer events of every monitored token for a block range.
+
+    All tokens share one eth_getLogs filter (an address list), so each block
+    range is scanned once however many tokens are monitored; requests go
+    through the adaptive, concurrent log fetcher.
+    """
+    tokens = tokens or monitored_tokens()
+    endpoint_uri = getattr(w3.provider, 'endpoint_uri', None)
+    sort_key = lambda transfer: (transfer['block_number'], transfer['log_index'])
+    if Config.RAW_LOG_DECODER and endpoint_uri:
+        # Fast path: raw eth_getLogs decoded straight from topics and data
+        def get_logs(from_block, to_block):
+            return fetch_transfer_logs(str(endpoint_uri), tokens, from_block, to_block)
+        return log_fetcher.fetch(get_logs, start_block, end_block, sort_key=sort_key)
+
+    transfer_event = w3.eth.contract(abi=TRANSFER_ABI).events.Transfer()
+
+    def get_logs(from_block, to_block):
+        logs = w3.eth.get_logs({'address': tokens, 'topics': [TRANSFER_TOPIC],
+                                'fromBlock': from_block, 'toBlock': to_block})
+        # ERC-721 transfers share the topic but index the token id as well
+        return [transfer_from_event(transfer_event.process_log(log)) for log in logs if len(log['topics']) == 3]
+
+    return log_fetcher.fetch(get_logs, start_block, end_block, sort_key=sort_key)
 
 def fetch_transactions():
+    """Ingest Transfer events of every monitored token for each confirmed block after the stored cursors"""
     w3 = get_web3()
     current_block = w3.eth.block_number
-    start_block = current_block - 2000  # Reduced to 2000 blocks to stay within Alchemy's limits
+    record_ingest_position(head=current_block)
+    hot_window.ensure_loaded()
+    transfer_graph.ensure_loaded()
+    tokens = monitored_tokens()
+    ranges = plan_ranges(
+        get_sweep_start(tokens),
+        current_block,
+        confirmations=Config.CONFIRMATION_DEPTH,
+        chunk_size=Config.INGEST_CHUNK_SIZE,
+        lookback=Config.INITIAL_LOOKBACK_BLOCKS,
+        max_chunks=Config.MAX_CATCHUP_CHUNKS
+    )
+    if not ranges:
+        return
 
-    # USDC contract ABI (minimal for transfer events)
-    abi = json.loads('[{"anonymous":false,"inputs":[{"indexed":true,"name":"from","type":"address"},{"indexed":true,"name":"to","type":"address"},{"indexed":false,"name":"value","type":"uint256"}],"name":"Transfer","type":"event"}]')
-    
     try:
-        contract = w3.eth.contract(address=Config.USDC_CONTRACT_ADDRESS, abi=abi)
-        
-        # Get transfer events with pagination
-        transfer_filter = contract.events.Transfer.create_filter(
-            fromBlock=start_block,
-            toBlock=current_block
-        )
-        
-        try:
-            events = transfer_filter.get_all_entries()
-            print(f"Found {len(events)} transfer events")
-            
-            # Process events in smaller batches to avoid database locks
-            batch_size = 50  # Reduced batch size
-            for i in range(0, len(events), batch_size):
-                batch = events[i:i + batch_size]
-                try:
-                    with db.session.begin_nested():  # Create a savepoint
-                        for event in batch:
-                            # Check if transaction already exists
-                            if not Transaction.query.filter_by(tx_hash=event['transactionHash'].hex()).first():
-                                # USDC has 6 decimals, but we'll store the raw value and format in the view
-                                amount = float(event['args']['value']) / 1e6
-                                tx = Transaction(
-                                    tx_hash=event['transactionHash'].hex(),
-                                    from_address=event['args']['from'],
-                                    to_address=event['args']['to'],
-                                    amount=amount,
-                                    block_number=event['blockNumber'],
-                                    timestamp=datetime.fromtimestamp(w3.eth.get_block(event['blockNumber'])['timestamp'])
-                                )
-                                db.session.add(tx)
-                        db.session.commit()
-                except Exception as e:
-                    print(f"Error processing batch {i} to {i + batch_size}: {str(e)}")
-                    db.session.rollback()
-                    continue  # Continue with next batch even if this one fails
-            
-            detect_anomalies()
-        except Exception as e:
-            print(f"Error fetching events: {str(e)}")
-            db.session.rollback()
-            # If we get a response size error, try with a smaller range
-            if "Log response size exceeded" in str(e):
-                print("Attempting to fetch with smaller block range...")
-                mid_block = (start_block + current_block) // 2
-                # Recursively fetch first half
-                fetch_transactions_range(start_block, mid_block)
-                # Recursively fetch second half
-                fetch_transactions_range(mid_block + 1, current_block)
+        for start_block, end_block in ranges:
+            fetch_transactions_range(start_block, end_block, w3)
+            # Only move the cursors once the whole range is committed
+            advance_cursors(tokens, end_block)
+            response_cache.bump_watermark(block=end_block)
+            record_ingest_position(committed=end_block)
+
+        print(f"Ingested up to block {ranges[-1][1]} ({current_block - ranges[-1][1]} behind head)")
+        finish_ingest_cycle()
     except Exception as e:
         print(f"Error in fetch_transactions: {str(e)}")
         db.session.rollback()
         raise
 
-def fetch_transactions_range(start_block, end_block):
-    """Helper function to fetch transactions for a specific block range"""
-    w3 = get_web3()
-    abi = json.loads('[{"anonymous":false,"inputs":[{"indexed":true,"name":"from","type":"address"},{"indexed":true,"name":"to","type":"address"},{"indexed":false,"name":"value","type":"uint256"}],"name":"Transfer","type":"event"}]')
-    
-    try:
-        contract = w3.eth.contract(address=Config.USDC_CONTRACT_ADDRESS, abi=abi)
-        transfer_filter = contract.events.Transfer.create_filter(
-            fromBlock=start_block,
-            toBlock=end_block
-        )
-        
-        events = transfer_filter.get_all_entries()
-        print(f"Found {len(events)} transfer events in blocks {start_block} to {end_block}")
-        
-        for event in events:
-            if not Transaction.query.filter_by(tx_hash=event['transactionHash'].hex()).first():
-                tx = Transaction(
-                    tx_hash=event['transactionHash'].hex(),
-                    from_address=event['args']['from'],
-                    to_address=event['args']['to'],
-                    amount=float(event['args']['value']) / 1e6,
-                    block_number=event['blockNumber'],
-                    timestamp=datetime.fromtimestamp(w3.eth.get_block(event['blockNumber'])['timestamp'])
-                )
-                db.session.add(tx)
-        
-        db.session.commit()
-    except Exception as e:
-        print(f"Error fetching transactions for blocks {start_block} to {end_block}: {str(e)}")
-        db.session.rollback()
+def finish_ingest_cycle():
+    """Housekeeping after a batch of ranges is committed: prune, snapshot and score"""
+    print(f"Block cache: {block_cache.stats()}")
+    prune_minute_buckets()
+    feature_store.save(feature_store_snapshot_path())
+    if Config.ANOMALY_DETECTOR == 'streaming':
+        save_detectors(monitored_tokens())
+    elif model_executor.in_process:
+        # Fitting and scoring run in the background; the next cycle does not wait for them
+        model_executor.submit('detect_anomalies', detect_anomalies)
+    else:
+        detect_anomalies()
+
+def fetch_transactions_range(start_block, end_block, w3=None):
+    """Helper function to fetch and store transactions for a specific block range"""
+    w3 = w3 or get_web3()
+    events = get_transfer_events(w3, start_block, end_block)
+    print(f"Found {len(events)} transfer events in blocks {start_block} to {end_block}")
+    return store_events(w3, events)
+
+def anomaly_model_name(token_address):
+    return f'transactions:{token_address}'
+
+def detect_anomalies(window=None):
+    """Score new transactions of every monitored token, each against its own model"""
+    flagged = [detect_token_anomalies(token, window) for token in monitored_tokens()]
+    return sum(count for count in flagged if count)
+
+def anomaly_window(token_address, window):
+    """Columns of a token's newest transactions, from the hot window when it holds them all, else the DB"""
+    columns = hot_window.latest(token_address, window)
+    if columns is not None:
+        return columns
+
+    # Pull only the feature columns straight into a NumPy array
+    table = Transaction.__table__
+    rows = db.session.execute(
+        select(table.c.id, table.c.amount, table.c.block_number, table.c.anomaly_score,
+               table.c.is_anomaly, table.c.timestamp, table.c.tx_hash, table.c.log_index,
+               table.c.from_address, table.c.to_address)
+        .where(table.c.token_address == token_address)
+        .order_by(table.c.timestamp.desc())
+        .limit(window)
+    ).fetchall()
+    # End the read transaction so no snapshot or lock is held while the model works
+    db.session.commit()
+    data = np.array([row[:5] for row in rows], dtype=np.float64).reshape(-1, 5)
+    return {
+        'ids': data[:, 0].astype(np.int64),
+        'amounts': data[:, 1],
+        'block_numbers': data[:, 2],
+        'scores': data[:, 3],
+        'anomalies': data[:, 4] == 1,
+        'timestamps': [row.timestamp for row in rows],
+        'tx_hashes': [row.tx_hash for row in rows],
+        'log_indexes': [row.log_index for row in rows],
+        'from_addresses': [row.from_address for row in rows],
+        'to_addresses': [row.to_address for row in rows]
+    }
 
-def detect_anomalies():
-    # Get recent transactions
-    recent_txs = Transaction.query.order_by(Transaction.timestamp.desc()).limit(1000).all()
-    
-    if len(recent_txs) < 10:  # Need minimum data for anomaly detection
+def detect_token_anomalies(token_address, window=None):
+    """Score new transactions of one token against its cached model, refitting it when it is due"""
+    window = window or Config.ANOMALY_WINDOW
+    model_name = anomaly_model_name(token_address)
+
+    columns = anomaly_window(token_address, window)
+    if len(columns['amounts']) < 10:  # Need minimum data for anomaly detection
         return
-    
-    # Prepare data for anomaly detection
-    data = pd.DataFrame([{
-        'amount': tx.amount,
-        'hour': tx.timestamp.hour,
-        'day': tx.timestamp.weekday(),
-        'block_number': tx.block_number
-    } for tx in recent_txs])
-    
-    # Calculate additional features
-    data['amount_zscore'] = (data['amount'] - data['amount'].mean()) / data['amount'].std()
-    data['time_diff'] = data['block_number'].diff().abs()
-    
+
+    ids = columns['ids']
+    amounts, block_numbers = columns['amounts'], columns['block_numbers']
+    unscored = np.isnan(columns['scores'])
+    was_anomaly = columns['anomalies']
+    timestamps, tx_hashes, log_indexes = columns['timestamps'], columns['tx_hashes'], columns['log_indexes']
+    # Per-address velocity features come from memory, not per-row SQL
+    address_features = feature_store.features_for([
+        {'timestamp': timestamp, 'tx_hash': tx_hash, 'log_index': log_index,
+         'from_address': from_address, 'to_address': to_address}
+        for timestamp, tx_hash, log_index, from_address, to_address
+        in zip(timestamps, tx_hashes, log_indexes, columns['from_addresses'], columns['to_addresses'])
+    ])
+
+    clf, metadata = model_registry.load(model_name)
+    scorable = clf is not None and 'amount_mean' in metadata
+    if scorable:
+        # Normalize with the statistics the cached model was trained on
+        features = np.hstack((
+            compute_features(amounts, block_numbers, metadata['amount_mean'], metadata['amount_std']),
+            address_features
+        ))
+        retrain, reason = model_registry.needs_retrain(model_name, TRANSACTION_FEATURES, features)
+    else:
+        retrain, reason = True, 'missing'
+
+    if retrain and scorable and len(amounts) < Config.MODEL_MIN_TRAINING_ROWS:
+        # Too small a window to replace the cached model with
+        retrain = False
+    trained = train_token_model(model_name, amounts, block_numbers, address_features, reason) if retrain else None
+    if trained is not None:
+        clf, metadata, features = trained
+        # A new model rescores the whole window
+        to_score = np.ones(len(amounts), dtype=bool)
+    elif retrain and not scorable:
+        return 0
+    else:
+        # Between retrains (or while a refit keeps failing) only newly ingested transactions are scored
+        to_score = unscored
+        if not to_score.any():
+            return 0
+
+    # One scoring call for every selected row; predict() is score < offset_
+    try:
+        with model_seconds.time('isolation_forest', 'score'):
+            scores = model_executor.score_samples(model_name, clf, features[to_score])
+    except ModelJobError as e:
+        print(f"Error scoring with anomaly model {model_name}: {str(e)}")
+        return 0
+    model_rows.inc('isolation_forest', 'score', amount=len(scores))
+    is_anomaly = scores < clf.offset_
+
+    scored = np.flatnonzero(to_score)
+    if ids is not None:
+        updates = [{'_id': int(ids[i]), '_is_anomaly': bool(flag), '_anomaly_score': float(score)}
+                   for i, flag, score in zip(scored, is_anomaly, scores)]
+    else:
+        # Rows served from the hot window are addressed by their transfer key
+        updates = [{'_tx_hash': tx_hashes[i], '_log_index': log_indexes[i], '_is_anomaly': bool(flag),
+                    '_anomaly_score': float(score)} for i, flag, score in zip(scored, is_anomaly, scores)]
+    # Keep rollup anomaly counts in step with flags that changed
+    changed = scored[is_anomaly != was_anomaly[to_score]]
+    store_scores(updates, deltas_for_anomaly_changes(
+        (timestamps[i], token_address, was_anomaly[i], not was_anomaly[i]) for i in changed
+    ))
+    hot_window.update_scores([tx_hashes[i] for i in scored], [log_indexes[i] for i in scored], scores, is_anomaly)
+    response_cache.bump_watermark(scoring_version=metadata['version'])
+
+    changed_scores = dict(zip(scored, scores))
+    for i in changed:
+        event_broker.publish('anomaly', {
+            'tx_hash': tx_hashes[i],
+            'log_index': log_indexes[i],
+            'token_address': token_address,
+            'timestamp': timestamps[i].isoformat(),
+            'is_anomaly': not was_anomaly[i],
+            'anomaly_score': float(changed_scores[i])
+        })
+    return int(is_anomaly.sum())
+
+def train_token_model(model_name, amounts, block_numbers, address_features, reason):
+    """Fit a token's model on its window in the model executor, returning (model, metadata, features) or None"""
+    amount_mean, amount_std = amount_stats(amounts)
+    features = np.hstack((compute_features(amounts, block_numbers, amount_mean, amount_std), address_features))
     # Train isolation forest with adjusted parameters
     clf = IsolationForest(
-        contamination=0.05,  # Reduced to 5% as we expect fewer anomalies
+        contamination=Config.ANOMALY_CONTAMINATION,
         random_state=42,
         n_estimators=100
     )
-    
-    # Use multiple features for anomaly detection
-    features = ['amount_zscore', 'time_diff']
-    scores = clf.fit_predict(data[features])
-    
-    # Update anomaly scores and status
-    for tx, score in zip(recent_txs, scores):
-        tx.is_anomaly = score == -1
-        tx.anomaly_score = float(clf.score_samples(data[features].iloc[[i]])[0])
-    
+    try:
+        with model_seconds.time('isolation_forest', 'fit'):
+            clf = model_executor.fit(model_name, clf, features)
+    except ModelJobError as e:
+        print(f"Error training anomaly model {model_name} ({reason}): {str(e)}")
+        return None
+    model_rows.inc('isolation_forest', 'fit', amount=len(features))
+    if len(amounts) < Config.MODEL_MIN_TRAINING_ROWS:
+        # Like detect_fraud, a model fitted on too few rows is used once but never cached
+        print(f"Fitted anomaly model {model_name} on {len(amounts)} rows without saving it ({reason})")
+        return clf, {'version': 0, 'amount_mean': amount_mean, 'amount_std': amount_std}, features
+    # Only a completed fit is saved; scorers see either the previous model or this one
+    metadata = model_registry.save(
+        model_name, clf, TRANSACTION_FEATURES, features,
+        window={'rows': len(amounts), 'start_block': int(block_numbers.min()), 'end_block': int(block_numbers.max())},
+        extra={'amount_mean': amount_mean, 'amount_std': amount_std}
+    )
+    print(f"Trained anomaly model {model_name} v{metadata['version']} ({reason})")
+    return clf, metadata, features
+
+@writes
+def store_scores(updates, deltas):
+    """
+    Update anomaly scores and status with a single executemany statement,
+    with their rollup deltas; updates carry either the row `_id` or the
+    `_tx_hash` and `_log_index` of the transfer
+    """
+    table = Transaction.__table__
+    if updates and '_id' in updates[0]:
+        key = table.c.id == bindparam('_id')
+    else:
+        key = and_(table.c.tx_hash == bindparam('_tx_hash'), table.c.log_index == bindparam('_log_index'))
+    db.session.execute(
+        table.update()
+        .where(key)
+        .values(is_anomaly=bindparam('_is_anomaly'), anomaly_score=bindparam('_anomaly_score')),
+        updates
+    )
+    apply_deltas(deltas)
     db.session.commit()
 
-def get_dashboard_data():
-    # Get last 24 hours of transactions
+def get_dashboard_data(token_address=None):
+    # Summarize the last 24 hours from the hot window, or from the rollup table when it is not held
     day_ago = datetime.utcnow() - timedelta(days=1)
-    transactions = Transaction.query.filter(Transaction.timestamp >= day_ago).all()
-    
-    # Prepare time series data
-    hourly_data = {}
-    for tx in transactions:
-        hour = tx.timestamp.replace(minute=0, second=0, microsecond=0)
-        if hour not in hourly_data:
-            hourly_data[hour] = {'volume': 0, 'count': 0, 'anomalies': 0}
-        hourly_data[hour]['volume'] += tx.amount
-        hourly_data[hour]['count'] += 1
-        if tx.is_anomaly:
-            hourly_data[hour]['anomalies'] += 1
-    
-    return {
-        'hourly_data': hourly_data,
-        'total_volume': sum(tx.amount for tx in transactions),
-        'total_transactions': len(transactions),
-        'anomaly_count': sum(1 for tx in transactions if tx.is_anomaly)
-    }
+    summary = hot_window.summary(day_ago, token_address=token_address)
+    if summary is None:
+        summary = window_summary(day_ago, token_address=token_address)
+    return summary
 
 @bp.route('/')
 def index():
@@ -207,22 +420,22 @@ def index():
 def dashboard():
     """Render the dashboard page."""
     try:
-        # Last 24 hours transactions
-        time_threshold = datetime.utcnow() - timedelta(hours=24)
-        transactions = Transaction.query.filter(Transaction.timestamp >= time_threshold).all()
-        
-        # Calculate statistics
-        total_volume = sum(t.amount for t in transactions)
-        transaction_count = len(transactions)
+        # Last 24 hours statistics come from rollups; only the latest rows are listed
+        summary = get_dashboard_data()
+        transaction_count = summary['total_transactions']
+        total_volume = summary['total_volume']
         avg_transaction = total_volume / transaction_count if transaction_count > 0 else 0
-        fraud_count = sum(1 for t in transactions if t.is_anomaly)
+        transactions = (Transaction.query
+                        .order_by(Transaction.timestamp.desc())
+                        .limit(Config.DASHBOARD_TABLE_ROWS)
+                        .all())
         
         return render_template('dashboard.html', 
                              transactions=transactions, 
                              total_volume=total_volume,
                              transaction_count=transaction_count,
                              avg_transaction=avg_transaction,
-                             fraud_count=fraud_count)
+                             fraud_count=summary['anomaly_count'])
     except Exception as e:
         print(f"Error in dashboard route: {str(e)}")
         return render_template('dashboard.html', 
@@ -233,75 +446,416 @@ def dashboard():
                              fraud_count=0)
 
 @bp.route('/api/dashboard-data')
+@response_cache.cached
 def dashboard_data():
-    """API endpoint for dashboard data"""
+    """API endpoint for dashboard data, optionally for one token (`token` symbol or address)"""
     try:
-        # Get last 24 hours of transactions
-        day_ago = datetime.utcnow() - timedelta(days=1)
-        transactions = Transaction.query.filter(Transaction.timestamp >= day_ago).all()
-        
-        # If no transactions, return empty data structure
-        if not transactions:
-            return jsonify({
-                'hourly_data': {},
-                'total_volume': 0,
-                'total_transactions': 0,
-                'anomaly_count': 0
-            })
-        
-        # Prepare time series data
-        hourly_data = {}
-        for tx in transactions:
-            hour = tx.timestamp.replace(minute=0, second=0, microsecond=0)
-            if hour not in hourly_data:
-                hourly_data[hour] = {'volume': 0, 'count': 0, 'anomalies': 0}
-            hourly_data[hour]['volume'] += tx.amount
-            hourly_data[hour]['count'] += 1
-            if tx.is_anomaly:
-                hourly_data[hour]['anomalies'] += 1
+        token_address = parse_token_arg('token')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        summary = get_dashboard_data(token_address)
         
         # Convert datetime objects to strings for JSON serialization
-        formatted_data = {
-            'hourly_data': {
-                hour.isoformat(): data 
-                for hour, data in hourly_data.items()
-            },
-            'total_volume': sum(tx.amount for tx in transactions),
-            'total_transactions': len(transactions),
-            'anomaly_count': sum(1 for tx in transactions if tx.is_anomaly)
+        summary['hourly_data'] = {
+            hour.isoformat(): data
+            for hour, data in summary['hourly_data'].items()
         }
-        
-        return jsonify(formatted_data)
+        return jsonify(summary)
     except Exception as e:
         print(f"Error in dashboard_data: {str(e)}")
         return jsonify({
             'hourly_data': {},
+            'tokens': {},
             'total_volume': 0,
             'total_transactions': 0,
             'anomaly_count': 0,
             'error': str(e)
         }), 500
 
+def parse_time_arg(name):
+    """Parse an optional ISO-8601 or unix-seconds query parameter into a naive UTC datetime, as stored"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.utcfromtimestamp(float(value))
+    except (OverflowError, OSError):
+        raise ValueError(f"Out of range time for {name}: {value}")
+    except ValueError:
+        pass
+    timestamp = datetime.fromisoformat(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+def parse_address_arg(name):
+    """Parse an optional address query parameter into its checksummed form"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    if not Web3.is_address(value):
+        raise ValueError(f"Invalid address for {name}: {value}")
+    return Web3.to_checksum_address(value)
+
+def parse_token_arg(name):
+    """Parse an optional token query parameter, given as a monitored symbol or an address"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    for symbol, address in Config.MONITORED_TOKENS.items():
+        if value.upper() == symbol:
+            return Web3.to_checksum_address(address)
+    return parse_address_arg(name)
+
+def parse_transaction_filters():
+    """Collect the server-side filters supported by /api/transactions"""
+    is_anomaly = request.args.get('is_anomaly')
+    if is_anomaly is not None:
+        is_anomaly = is_anomaly.lower() in ('1', 'true', 'yes')
+    return {
+        'min_amount': request.args.get('min_amount', type=float),
+        'max_amount': request.args.get('max_amount', type=float),
+        'is_anomaly': is_anomaly,
+        'address': parse_address_arg('address'),
+        'from_address': parse_address_arg('from_address'),
+        'to_address': parse_address_arg('to_address'),
+        'token_address': parse_token_arg('token'),
+        'start': parse_time_arg('start'),
+        'end': parse_time_arg('end')
+    }
+
 @bp.route('/api/transactions')
+@response_cache.cached
 def get_transactions():
-    """API endpoint for recent transactions"""
+    """
+    API endpoint for transactions, newest first.
+
+    Supports keyset pagination (`limit`, `cursor`; the next cursor is sent in
+    the `X-Next-Cursor` header), filters (`min_amount`, `max_amount`,
+    `is_anomaly`, `address`, `from_address`, `to_address`, `token`, `start`,
+    `end`) and streaming exports with `format=ndjson` or `format=csv`.
+    """
     try:
-        transactions = Transaction.query.order_by(Transaction.timestamp.desc()).limit(50).all()
-        return jsonify([{
-            'tx_hash': tx.tx_hash,
-            'from_address': tx.from_address,
-            'to_address': tx.to_address,
-            'amount': tx.amount,
-            'timestamp': tx.timestamp.isoformat(),
-            'is_anomaly': tx.is_anomaly,
-            'anomaly_score': tx.anomaly_score
-        } for tx in transactions])
+        filters = parse_transaction_filters()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    fmt = request.args.get('format', 'json')
+    if fmt in ('ndjson', 'csv'):
+        mimetype = 'application/x-ndjson' if fmt == 'ndjson' else 'text/csv'
+        limit = request.args.get('limit', type=int)
+        return Response(stream_with_context(iter_export(filters, fmt, limit, Config.EXPORT_CHUNK_SIZE)),
+                        mimetype=mimetype,
+                        headers={'Content-Disposition': f'attachment; filename=transactions.{fmt}'})
+
+    limit = max(1, min(request.args.get('limit', Config.API_PAGE_SIZE, type=int), Config.API_MAX_PAGE_SIZE))
+    try:
+        transactions, next_cursor = fetch_page(filters, request.args.get('cursor'), limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Error in get_transactions: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+    response = jsonify(transactions)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+        args = request.args.to_dict()
+        args['cursor'] = next_cursor
+        response.headers['Link'] = f'<{url_for(".get_transactions", **args)}>; rel="next"'
+    return response
+
+@bp.route('/api/address/<address>/activity')
+def address_activity(address):
+    """API endpoint for inbound and outbound activity of an address"""
+    if not Web3.is_address(address):
+        return jsonify({'error': f'Invalid address: {address}'}), 400
+    try:
+        start = parse_time_arg('start')
+        end = parse_time_arg('end')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    limit = min(request.args.get('limit', 50, type=int), 500)
+
+    try:
+        return jsonify(get_address_activity(Web3.to_checksum_address(address), start, end, limit))
+    except Exception as e:
+        print(f"Error in address_activity: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/graph/neighborhood/<address>')
+def graph_neighborhood(address):
+    """API endpoint for the k-hop transfer neighborhood of an address"""
+    if not Web3.is_address(address):
+        return jsonify({'error': f'Invalid address: {address}'}), 400
+    direction = request.args.get('direction', 'out')
+    if direction not in ('out', 'in', 'both'):
+        return jsonify({'error': f'Invalid direction: {direction}'}), 400
+    try:
+        start, end = parse_time_arg('start'), parse_time_arg('end')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    hops = max(1, min(request.args.get('hops', 2, type=int), Config.GRAPH_MAX_HOPS))
+
+    transfer_graph.ensure_loaded()
+    neighborhood = transfer_graph.neighborhood(Web3.to_checksum_address(address), hops, start, end, direction,
+                                               request.args.get('max_nodes', type=int))
+    if neighborhood is None:
+        return jsonify({'error': f'No transfers for {address} in the graph'}), 404
+    return jsonify(neighborhood)
+
+@bp.route('/api/graph/top-fan')
+def graph_top_fan():
+    """API endpoint for the addresses with the widest fan-out (or fan-in with direction=in)"""
+    direction = request.args.get('direction', 'out')
+    if direction not in ('out', 'in'):
+        return jsonify({'error': f'Invalid direction: {direction}'}), 400
+    try:
+        start, end = parse_time_arg('start'), parse_time_arg('end')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if start is None:
+        start = datetime.utcnow() - timedelta(days=1)
+    limit = max(1, min(request.args.get('limit', 10, type=int), Config.API_MAX_PAGE_SIZE))
+    transfer_graph.ensure_loaded()
+    return jsonify({
+        'direction': direction,
+        'start': start.isoformat(),
+        'end': end.isoformat() if end else None,
+        'addresses': transfer_graph.top_fan(direction, start, end, limit)
+    })
+
+@bp.route('/api/graph/cycles')
+def graph_cycles():
+    """API endpoint for short cycles of transfers, optionally through one address"""
+    try:
+        address = parse_address_arg('address')
+        start, end = parse_time_arg('start'), parse_time_arg('end')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if start is None:
+        start = datetime.utcnow() - timedelta(days=1)
+    max_length = max(2, min(request.args.get('max_length', Config.GRAPH_CYCLE_MAX_LENGTH, type=int),
+                            Config.GRAPH_CYCLE_MAX_LENGTH))
+    limit = max(1, min(request.args.get('limit', 100, type=int), Config.API_MAX_PAGE_SIZE))
+    transfer_graph.ensure_loaded()
+    return jsonify({
+        'address': address,
+        'start': start.isoformat(),
+        'end': end.isoformat() if end else None,
+        'cycles': transfer_graph.cycles(address, start, end, max_length, limit)
+    })
+
+def parse_recent_args():
+    """Parse `start` (an hour ago by default), `end` and `token` of the recent-activity endpoints"""
+    start, end = parse_time_arg('start'), parse_time_arg('end')
+    return start or datetime.utcnow() - timedelta(hours=1), end, parse_token_arg('token')
+
+def recent_conditions(start, end, token_address):
+    """WHERE clauses for the transactions in [start, end), of one token if given"""
+    table = Transaction.__table__
+    conditions = [table.c.timestamp >= start]
+    if end is not None:
+        conditions.append(table.c.timestamp < end)
+    if token_address is not None:
+        conditions.append(table.c.token_address == token_address)
+    return conditions
+
+def recent_query(columns, start, end, token_address):
+    """Select `columns` of the transactions in [start, end), of one token if given, for DB fallbacks"""
+    table = Transaction.__table__
+    return select(*[table.c[name] for name in columns]).where(*recent_conditions(start, end, token_address))
+
+def epoch_seconds(column):
+    """SQL expression for the whole seconds since the epoch of a naive (UTC) timestamp column"""
+    if db.engine.dialect.name == 'postgresql':
+        return cast(func.extract('epoch', column), BigInteger)
+    return cast(func.strftime('%s', column), BigInteger)
+
+def histogram_query(start, end, bucket, token_address):
+    """Volume, transfer and anomaly counts per `bucket` seconds, aggregated by the database"""
+    table = Transaction.__table__
+    bucket_id = (epoch_seconds(table.c.timestamp) / bucket).label('bucket_id')
+    return (select(bucket_id, func.sum(table.c.amount).label('volume'), func.count().label('count'),
+                   func.sum(case((table.c.is_anomaly, 1), else_=0)).label('anomalies'))
+            .where(*recent_conditions(start, end, token_address))
+            .group_by(bucket_id)
+            .order_by(bucket_id))
+
+@bp.route('/api/recent/histogram')
+@response_cache.cached
+def recent_histogram():
+    """
+    API endpoint for volume, transfer and anomaly counts per `bucket` seconds
+    over [`start`, `end`), from the hot window when it holds the range
+    """
+    try:
+        start, end, token_address = parse_recent_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    bucket = request.args.get('bucket', 60, type=int)
+    span = ((end or datetime.utcnow()) - start).total_seconds()
+    if span > Config.RECENT_MAX_SPAN:
+        return jsonify({'error': f'start and end may be at most {Config.RECENT_MAX_SPAN} seconds apart'}), 400
+    if bucket < 1 or span / bucket > Config.RECENT_MAX_BUCKETS:
+        return jsonify({'error': f'bucket must be a number of seconds giving at most '
+                                 f'{Config.RECENT_MAX_BUCKETS} buckets'}), 400
+
+    buckets = hot_window.histogram(start, end, bucket, token_address)
+    source = 'memory'
+    if buckets is None:
+        source = 'database'
+        # One row per non-empty bucket rather than one per transfer
+        buckets = [{
+            'bucket_start': from_seconds(row.bucket_id * bucket).isoformat(),
+            'volume': float(row.volume),
+            'count': int(row.count),
+            'anomalies': int(row.anomalies)
+        } for row in db.session.execute(histogram_query(start, end, bucket, token_address))]
+    return jsonify({'start': start.isoformat(), 'end': end.isoformat() if end else None, 'bucket': bucket,
+                    'source': source, 'buckets': buckets})
+
+@bp.route('/api/recent/top-transfers')
+@response_cache.cached
+def recent_top_transfers():
+    """API endpoint for the largest transfers in [`start`, `end`), from the hot window when it holds the range"""
+    try:
+        start, end, token_address = parse_recent_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    limit = max(1, min(request.args.get('limit', 10, type=int), Config.API_MAX_PAGE_SIZE))
+
+    transfers = hot_window.top_transfers(start, end, limit, token_address)
+    source = 'memory'
+    if transfers is None:
+        source = 'database'
+        columns = ('tx_hash', 'log_index', 'token_address', 'from_address', 'to_address', 'amount',
+                   'block_number', 'timestamp', 'is_anomaly', 'anomaly_score')
+        query = recent_query(columns, start, end, token_address)
+        rows = db.session.execute(query.order_by(Transaction.__table__.c.amount.desc()).limit(limit)).fetchall()
+        transfers = [dict(row._mapping, timestamp=row.timestamp.isoformat()) for row in rows]
+    return jsonify({'start': start.isoformat(), 'end': end.isoformat() if end else None,
+                    'source': source, 'transfers': transfers})
+
+@bp.route('/api/stream')
+def stream():
+    """Server-sent events of new transactions, rollup deltas and anomaly flags"""
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    subscriber = event_broker.subscribe(last_event_id)
+
+    def generate():
+        try:
+            yield f'retry: {Config.SSE_RETRY_MS}\n\n'
+            while not subscriber.dropped:
+                event = subscriber.get(timeout=Config.SSE_HEARTBEAT_INTERVAL)
+                if event is None:
+                    yield ': heartbeat\n\n'
+                    continue
+                yield format_sse(event)
+        finally:
+            event_broker.unsubscribe(subscriber)
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@bp.route('/api/ingest-stats')
+def ingest_stats():
+    """API endpoint for ingestion cache statistics"""
+    return jsonify({
+        'block_cache': block_cache.stats(),
+        'log_fetcher': log_fetcher.stats(),
+        'response_cache': response_cache.stats(),
+        'feature_store': feature_store.stats(),
+        'transfer_graph': transfer_graph.stats(),
+        'balance_service': balance_service.stats(),
+        'event_stream': event_broker.stats(),
+        'storage': current_storage().stats(),
+        'hot_window': hot_window.stats(),
+        'change_feed': change_feed.stats(),
+        'archive': archive_queue.stats(),
+        'model_executor': model_executor.stats(),
+        'cursors': [cursor.to_dict() for cursor in IngestCursor.query.all()]
+    })
+
+@bp.route('/metrics')
+def prometheus_metrics():
+    """Latency histograms, counters and gauges in the Prometheus text format"""
+    if not metrics.enabled:
+        return jsonify({'error': 'Metrics are disabled (METRICS_ENABLED=false)'}), 404
+    return Response(metrics.render(), content_type=CONTENT_TYPE)
+
+@bp.route('/api/profiler', methods=['GET', 'POST'])
+def sampling_profiler():
+    """
+    Control the sampling profiler of this process (PROFILER_ENABLED=true).
+
+    POST `{"action": "start", "interval": 0.01, "duration": 60}` (duration
+    at most, and by default, PROFILER_MAX_DURATION) or
+    `{"action": "stop"}`; GET returns its state and the top functions, or
+    the collapsed stacks for a flame graph with `format=collapsed`.
+    """
+    if not Config.PROFILER_ENABLED:
+        return jsonify({'error': 'The profiler is disabled (PROFILER_ENABLED=false)'}), 403
+    if request.method == 'POST':
+        body = request.get_json(silent=True) or {}
+        action = body.get('action')
+        if action == 'start':
+            try:
+                interval = float(body['interval']) if body.get('interval') is not None else None
+                duration = float(body.get('duration') or Config.PROFILER_MAX_DURATION)
+            except (TypeError, ValueError):
+                return jsonify({'error': 'interval and duration must be numbers of seconds'}), 400
+            # A non-positive interval would make the sampler busy-loop
+            if interval is not None and not interval > 0:
+                return jsonify({'error': 'interval must be a positive number of seconds'}), 400
+            if not 0 < duration <= Config.PROFILER_MAX_DURATION:
+                return jsonify({'error': f'duration must be between 0 and {Config.PROFILER_MAX_DURATION} seconds'}), 400
+            if not profiler.start(interval=interval, duration=duration):
+                return jsonify({'error': 'The profiler is already running'}), 409
+        elif action == 'stop':
+            profiler.stop()
+        else:
+            return jsonify({'error': 'Expected "action": "start" or "stop"'}), 400
+        return jsonify(profiler.stats())
+
+    if request.args.get('format') == 'collapsed':
+        return Response(profiler.collapsed(), mimetype='text/plain')
+    return jsonify({**profiler.stats(), 'top': profiler.top(request.args.get('limit', 20, type=int))})
+
+@bp.route('/api/model-executor', methods=['GET', 'POST'])
+def model_executor_state():
+    """
+    State of the model worker process; POST `{"action": "cancel"}` cancels
+    the running fit or scoring call, keeping the current model.
+    """
+    if request.method == 'POST':
+        if (request.get_json(silent=True) or {}).get('action') != 'cancel':
+            return jsonify({'error': 'Expected "action": "cancel"'}), 400
+        if not model_executor.cancel():
+            return jsonify({'error': 'No model job is running'}), 409
+    return jsonify(model_executor.stats())
+
 @bp.route('/api/token-balances/<address>')
 def token_balances(address):
     """API endpoint to get token balances for an address"""
     balances = get_token_balances(address)
-    return jsonify(balances)
\ No newline at end of file
+    return jsonify(balances)
+
+@bp.route('/api/token-balances', methods=['POST'])
+def batch_token_balances():
+    """API endpoint to get token balances for several addresses in one upstream round trip"""
+    addresses = (request.get_json(silent=True) or {}).get('addresses')
+    if not isinstance(addresses, list) or not addresses:
+        return jsonify({'error': 'Expected a JSON body with a non-empty "addresses" list'}), 400
+    if len(addresses) > Config.BALANCE_MAX_ADDRESSES:
+        return jsonify({'error': f'At most {Config.BALANCE_MAX_ADDRESSES} addresses per request'}), 400
+    invalid = [address for address in addresses if not isinstance(address, str) or not Web3.is_address(address)]
+    if invalid:
+        return jsonify({'error': f'Invalid addresses: {invalid}'}), 400
+
+    try:
+        return jsonify(balance_service.get_balances(addresses))
+    except (requests.RequestException, ValueError) as e:
+        print(f"Error fetching token balances: {e}")
+        return jsonify({'error': str(e)}), 502
\ No newline at end of file
@@ -0,0 +1,72 @@
+from sqlalchemy import case, func
+
+from app import db
+from app.models import Transaction
+
+
+def totals_query(column, address, start, end):
+    """Count, volume and anomaly query of one direction, answered from the covering index."""
+    query = db.session.query(
+        func.count(),
+        func.coalesce(func.sum(Transaction.amount), 0.0),
+        func.coalesce(func.sum(case((Transaction.is_anomaly.is_(True), 1), else_=0)), 0)
+    ).filter(column == address)
+    if start is not None:
+        query = query.filter(Transaction.timestamp >= start)
+    if end is not None:
+        query = query.filter(Transaction.timestamp < end)
+    return query
+
+
+def _direction_totals(column, address, start, end):
+    count, volume, anomalies = totals_query(column, address, start, end).one()
+    return {'count': count, 'volume': float(volume), 'anomalies': int(anomalies)}
+
+
+def _recent_transfers(column, address, start, end, limit):
+    query = Transaction.query.filter(column == address)
+    if start is not None:
+        query = query.filter(Transaction.timestamp >= start)
+    if end is not None:
+        query = query.filter(Transaction.timestamp < end)
+    return query.order_by(Transaction.timestamp.desc()).limit(limit).all()
+
+
+def get_address_activity(address, start=None, end=None, limit=50):
+    """
+    Summarize inbound and outbound transfers of an address over a time range.
+
+    Parameters
+    ----------
+    address : str
+        Checksummed address, as stored by ingestion.
+    start, end : datetime, optional
+        Half-open `[start, end)` time range; unbounded when omitted.
+    limit : int
+        Number of most recent transfers to include.
+
+    Returns
+    -------
+    dict
+        `outbound` and `inbound` totals (count, volume, anomalies), the net
+        flow and the most recent transfers in either direction. Every query
+        is a range scan on the `(address, timestamp, ...)` indexes.
+    """
+    outbound = _direction_totals(Transaction.from_address, address, start, end)
+    inbound = _direction_totals(Transaction.to_address, address, start, end)
+
+    # Each direction is a bounded index scan; merge the two short lists here
+    transfers = (_recent_transfers(Transaction.from_address, address, start, end, limit) +
+                 _recent_transfers(Transaction.to_address, address, start, end, limit))
+    transfers = sorted({tx.id: tx for tx in transfers}.values(), key=lambda tx: tx.timestamp, reverse=True)[:limit]
+
+    return {
+        'address': address,
+        'start': start.isoformat() if start else None,
+        'end': end.isoformat() if end else None,
+        'outbound': outbound,
+        'inbound': inbound,
+        'net_flow': inbound['volume'] - outbound['volume'],
+        'anomaly_count': outbound['anomalies'] + inbound['anomalies'],
+        'transfers': [tx.to_dict() for tx in transfers]
+    }
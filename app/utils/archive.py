@@ -0,0 +1,591 @@
+import atexit
+import gzip
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from config import Config
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet is optional; archives fall back to gzipped NDJSON
+    pa = pq = None
+
+EXTENSIONS = {'parquet': '.parquet', 'ndjson': '.ndjson.gz'}
+
+# Parquet column types of Transaction rows; other columns are inferred
+PARQUET_TYPES = {
+    'tx_hash': 'string', 'token_address': 'string', 'from_address': 'string', 'to_address': 'string',
+    'amount': 'float64', 'amount_raw': 'string', 'block_number': 'int64', 'log_index': 'int64',
+    'timestamp': 'timestamp[us]', 'is_anomaly': 'bool', 'anomaly_score': 'float64'
+}
+
+
+def archive_format(requested=None):
+    """The configured format, or 'ndjson' when Parquet is requested without pyarrow."""
+    fmt = requested or Config.ARCHIVE_FORMAT
+    if fmt not in EXTENSIONS:
+        raise ValueError(f"Unknown archive format: {fmt}")
+    return 'ndjson' if fmt == 'parquet' and pq is None else fmt
+
+
+def _to_datetime(timestamp):
+    # Rows from ingestion carry datetimes, raw API results epoch seconds
+    if isinstance(timestamp, datetime):
+        return timestamp
+    return datetime.utcfromtimestamp(float(timestamp))
+
+
+def _encode(row):
+    """Archive representation of a row: uint256 amounts as strings, timestamps as datetimes."""
+    row = dict(row)
+    row['timestamp'] = _to_datetime(row['timestamp'])
+    if row.get('amount_raw') is not None:
+        row['amount_raw'] = str(row['amount_raw'])
+    return row
+
+
+def _decode(row):
+    if isinstance(row['timestamp'], str):
+        row['timestamp'] = datetime.fromisoformat(row['timestamp'])
+    if row.get('amount_raw') is not None:
+        row['amount_raw'] = int(row['amount_raw'])
+    return row
+
+
+def _parquet_schema(rows):
+    """Schema over the columns of the first row, typed once rather than per row group."""
+    fields = []
+    for name in rows[0]:
+        if name in PARQUET_TYPES:
+            fields.append(pa.field(name, pa.type_for_alias(PARQUET_TYPES[name])))
+            continue
+        sample = next((row[name] for row in rows if row.get(name) is not None), None)
+        fields.append(pa.field(name, pa.array([sample]).type if sample is not None else pa.string()))
+    return pa.schema(fields)
+
+
+def _in_range(row, start, end, start_block, end_block):
+    block = row.get('block_number')
+    return ((start is None or row['timestamp'] >= start) and (end is None or row['timestamp'] < end) and
+            (start_block is None or block is None or block >= start_block) and
+            (end_block is None or block is None or block <= end_block))
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot archive {type(value).__name__}")
+
+
+class _LocalUpload:
+    """Write-only stream to a temporary file, moved into place on `close()`."""
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._tmp_path = path + '.tmp'
+        self._file = open(self._tmp_path, 'wb')
+        self.closed = False
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self._file.write(data)
+
+    def tell(self):
+        return self._file.tell()
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self._file.close()
+            os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        if not self.closed:
+            self.closed = True
+            self._file.close()
+            os.remove(self._tmp_path)
+
+
+class LocalBackend:
+    """Archive files under a local directory, for tests and offline runs."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, key):
+        return os.path.join(self.root, *key.split('/'))
+
+    def writer(self, key):
+        return _LocalUpload(self._path(key))
+
+    def open(self, key):
+        return open(self._path(key), 'rb')
+
+    def list(self, prefix=''):
+        base = self._path(prefix) if prefix else self.root
+        keys = []
+        for directory, _, names in os.walk(base):
+            for name in names:
+                if not name.endswith('.tmp'):
+                    path = os.path.join(directory, name)
+                    keys.append(os.path.relpath(path, self.root).replace(os.sep, '/'))
+        return sorted(keys)
+
+
+class _S3MultipartUpload:
+    """
+    Write-only stream to an S3 object through a multipart upload.
+
+    Only one part is buffered at a time, so memory stays at `part_size`
+    however large the object grows. The upload is completed on `close()`
+    and aborted on `abort()`, leaving no partial object behind.
+    """
+
+    def __init__(self, client, bucket, key, part_size):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self._buffer = io.BytesIO()
+        self._parts = []
+        self._position = 0
+        self._upload_id = client.create_multipart_upload(Bucket=bucket, Key=key)['UploadId']
+        self.closed = False
+
+    def writable(self):
+        return True
+
+    def _upload_part(self):
+        number = len(self._parts) + 1
+        reply = self.client.upload_part(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                                        PartNumber=number, Body=self._buffer.getvalue())
+        self._parts.append({'ETag': reply['ETag'], 'PartNumber': number})
+        self._buffer = io.BytesIO()
+
+    def write(self, data):
+        self._buffer.write(data)
+        self._position += len(data)
+        # S3 requires every part but the last to be at least 5 MiB
+        if self._buffer.tell() >= self.part_size:
+            self._upload_part()
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self._buffer.tell() or not self._parts:
+            self._upload_part()
+        self.client.complete_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                                              MultipartUpload={'Parts': self._parts})
+
+    def abort(self):
+        if not self.closed:
+            self.closed = True
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+
+
+class S3Backend:
+    """Archive objects in an S3 bucket, written with multipart uploads."""
+
+    def __init__(self, bucket, client=None, part_size=None):
+        if client is None:
+            import boto3
+            client = boto3.client('s3')
+        self.bucket = bucket
+        self.client = client
+        self.part_size = part_size or Config.ARCHIVE_PART_SIZE
+
+    def writer(self, key):
+        return _S3MultipartUpload(self.client, self.bucket, key, self.part_size)
+
+    def open(self, key):
+        return self.client.get_object(Bucket=self.bucket, Key=key)['Body']
+
+    def list(self, prefix=''):
+        keys = []
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            keys += [item['Key'] for item in page.get('Contents', [])]
+        return sorted(keys)
+
+
+def partition_key(timestamp):
+    """Hour partition of a row, e.g. 'date=2025-05-25/hour=12'."""
+    return timestamp.strftime('date=%Y-%m-%d/hour=%H')
+
+
+class ArchiveWriter:
+    """
+    Append transactions to a time- and block-partitioned archive.
+
+    Rows are grouped into hourly `date=.../hour=...` partitions and each
+    group is streamed into one compressed file named after its block range
+    and a digest of its transfers, e.g.
+    `transactions/date=2025-05-25/hour=12/0000001000-0000001099-1a2b3c4d.parquet`.
+    Re-archiving the same transfers rewrites the same file instead of
+    adding a duplicate, and different batches of one hour never collide.
+
+    Files are written `row_group_size` rows at a time (Parquet row groups,
+    or NDJSON lines through gzip), straight into the backend's upload
+    stream, so a batch is never serialized in memory as a whole.
+    """
+
+    def __init__(self, backend, prefix=None, fmt=None, row_group_size=None):
+        self.backend = backend
+        self.prefix = Config.ARCHIVE_PREFIX if prefix is None else prefix
+        self.format = archive_format(fmt)
+        self.row_group_size = row_group_size or Config.ARCHIVE_ROW_GROUP_SIZE
+
+    def _key(self, partition, rows):
+        blocks = [row['block_number'] for row in rows if row.get('block_number') is not None]
+        digest = hashlib.sha1()
+        for row in rows:
+            digest.update(f"{row.get('tx_hash') or row.get('hash')}:{row.get('log_index')}\n".encode())
+        name = f'{min(blocks):010d}-{max(blocks):010d}' if blocks else 'part'
+        return '/'.join(filter(None, (self.prefix, partition,
+                                      f'{name}-{digest.hexdigest()[:8]}{EXTENSIONS[self.format]}')))
+
+    def _write_parquet(self, stream, rows):
+        schema = _parquet_schema(rows)
+        writer = pq.ParquetWriter(pa.PythonFile(stream, mode='w'), schema, compression='zstd')
+        for i in range(0, len(rows), self.row_group_size):
+            writer.write_table(pa.Table.from_pylist(rows[i:i + self.row_group_size], schema=schema))
+        # Not closed on failure, so a partial file is never committed before the upload is aborted
+        writer.close()
+
+    def _write_ndjson(self, stream, rows):
+        with gzip.GzipFile(fileobj=stream, mode='wb') as gz:
+            for i in range(0, len(rows), self.row_group_size):
+                gz.write(''.join(json.dumps(row, default=_json_default) + '\n'
+                                 for row in rows[i:i + self.row_group_size]).encode())
+
+    def write(self, rows):
+        """
+        Archive transaction rows.
+
+        Parameters
+        ----------
+        rows : iterable of dict
+            Transaction rows with at least a `timestamp` (datetime or epoch
+            seconds); `block_number` and `log_index` are used for ordering
+            and file names when present.
+
+        Returns
+        -------
+        list
+            Keys of the files written, one per hour partition.
+        """
+        partitions = defaultdict(list)
+        for row in map(_encode, rows):
+            partitions[partition_key(row['timestamp'])].append(row)
+
+        keys = []
+        for partition, partition_rows in sorted(partitions.items()):
+            partition_rows.sort(key=lambda row: (row.get('block_number') or 0, row.get('log_index') or 0))
+            key = self._key(partition, partition_rows)
+            stream = self.backend.writer(key)
+            try:
+                if self.format == 'parquet':
+                    self._write_parquet(stream, partition_rows)
+                else:
+                    self._write_ndjson(stream, partition_rows)
+            except Exception:
+                stream.abort()
+                raise
+            stream.close()
+            keys.append(key)
+        return keys
+
+
+class ArchiveReader:
+    """
+    Read an archive back in chronological order.
+
+    Partitions outside the requested time range and files outside the
+    requested block range are skipped from their keys alone, before any
+    data is downloaded.
+    """
+
+    def __init__(self, backend, prefix=None):
+        self.backend = backend
+        self.prefix = Config.ARCHIVE_PREFIX if prefix is None else prefix
+
+    def keys(self, start=None, end=None, start_block=None, end_block=None):
+        """Archive files overlapping `[start, end)` and `[start_block, end_block]`."""
+        first = partition_key(start) if start is not None else None
+        last = partition_key(end) if end is not None else None
+        keys = []
+        for key in self.backend.list(self.prefix):
+            parts = key.split('/')
+            if len(parts) < 3 or not parts[-1].endswith(tuple(EXTENSIONS.values())):
+                continue
+            partition = '/'.join(parts[-3:-1])
+            if (first and partition < first) or (last and partition > last):
+                continue
+            blocks = parts[-1].split('-')
+            if blocks[0] != 'part':
+                if ((start_block is not None and int(blocks[1]) < start_block) or
+                        (end_block is not None and int(blocks[0]) > end_block)):
+                    continue
+            keys.append(key)
+        return keys
+
+    def _read(self, key):
+        body = self.backend.open(key)
+        try:
+            if key.endswith(EXTENSIONS['parquet']):
+                if pq is None:
+                    raise RuntimeError(f"pyarrow is required to read {key}")
+                parquet = pq.ParquetFile(io.BytesIO(body.read()))
+                for i in range(parquet.num_row_groups):
+                    yield [_decode(row) for row in parquet.read_row_group(i).to_pylist()]
+            else:
+                with gzip.GzipFile(fileobj=body, mode='rb') as gz:
+                    chunk = []
+                    for line in gz:
+                        chunk.append(_decode(json.loads(line)))
+                        if len(chunk) >= Config.ARCHIVE_ROW_GROUP_SIZE:
+                            yield chunk
+                            chunk = []
+                    if chunk:
+                        yield chunk
+        finally:
+            body.close()
+
+    def iter_chunks(self, start=None, end=None, start_block=None, end_block=None):
+        """Yield lists of decoded rows file by file, filtered to the requested ranges."""
+        for key in self.keys(start, end, start_block, end_block):
+            for chunk in self._read(key):
+                rows = [row for row in chunk if _in_range(row, start, end, start_block, end_block)]
+                if rows:
+                    yield rows
+
+
+def replay(reader, targets=('db', 'rollups'), start=None, end=None, start_block=None, end_block=None):
+    """
+    Rebuild state from the archive instead of re-fetching it from the chain.
+
+    Parameters
+    ----------
+    reader : ArchiveReader
+    targets : tuple
+        Any of 'db' (insert transactions, skipping those already stored),
+        'rollups' (rebuild every rollup bucket once at the end) and
+        'models' (replay transfers through the address feature store and
+        the streaming detectors and save their snapshots, then refit the
+        batch anomaly models). The transfer graph is not rebuilt here; it
+        is loaded from the database by the processes that serve it.
+    start, end, start_block, end_block : optional
+        Time (`[start, end)`) and block (inclusive) ranges to replay.
+
+    Returns
+    -------
+    dict
+        Rows read and inserted.
+    """
+    from app.utils.bulk_insert import bulk_insert_transactions
+
+    read = inserted = 0
+    tokens = set()
+    for rows in reader.iter_chunks(start, end, start_block, end_block):
+        read += len(rows)
+        if 'models' in targets:
+            from app.utils.feature_store import feature_store
+            from app.utils.streaming_detector import score_rows
+
+            feature_store.observe_rows(rows)
+            # Only detector state is rebuilt; archived scores are kept
+            score_rows([dict(row) for row in rows])
+            tokens.update(row.get('token_address') for row in rows)
+        if 'db' in targets:
+            # Rollups are rebuilt once below rather than per chunk
+            inserted += bulk_insert_transactions(rows)[0]
+
+    if 'rollups' in targets:
+        from app.utils.rollups import rebuild_rollups
+        rebuild_rollups()
+    if 'models' in targets:
+        from app.utils.feature_store import feature_store, snapshot_path
+        from app.utils.streaming_detector import save_detectors
+
+        # Snapshots the ingest and API processes restore at startup
+        feature_store.save(snapshot_path())
+        save_detectors(sorted(tokens, key=str))
+        if Config.ANOMALY_DETECTOR != 'streaming':
+            from app.routes import detect_anomalies
+            detect_anomalies()
+    return {'rows': read, 'inserted': inserted}
+
+
+def get_backend():
+    """Backend configured by ARCHIVE_BACKEND, or None when archiving is disabled."""
+    if Config.ARCHIVE_BACKEND == 'local':
+        return LocalBackend(Config.ARCHIVE_DIR)
+    if Config.ARCHIVE_BACKEND == 's3':
+        if not Config.ARCHIVE_BUCKET:
+            raise ValueError("AWS_S3_BUCKET not set in environment variables")
+        return S3Backend(Config.ARCHIVE_BUCKET)
+    if Config.ARCHIVE_BACKEND:
+        raise ValueError(f"Unknown archive backend: {Config.ARCHIVE_BACKEND}")
+    return None
+
+
+class ArchiveQueue:
+    """
+    Archive newly committed transfers on a background thread.
+
+    `add` only buffers the rows by hour partition, so it is cheap enough
+    to run as a commit hook on the database writer thread; encoding and
+    uploads happen here. A partition is written once it holds
+    `flush_rows` rows, once a later hour has started (ingestion moves
+    forward in time) or once its oldest row has waited `flush_age`
+    seconds, so files stay large without leaving rows unarchived for long.
+    The rest is written by `stop`, which also runs at interpreter exit.
+
+    Parameters
+    ----------
+    writer : ArchiveWriter, optional
+        By default one over the configured backend, created on first use.
+    flush_rows, flush_age, max_pending : optional
+        By default ARCHIVE_FLUSH_ROWS, ARCHIVE_FLUSH_AGE and
+        ARCHIVE_MAX_PENDING; rows added past `max_pending` buffered rows
+        are dropped from the archive rather than held in memory.
+    """
+
+    def __init__(self, writer=None, flush_rows=None, flush_age=None, max_pending=None):
+        self.writer = writer
+        self.flush_rows = flush_rows or Config.ARCHIVE_FLUSH_ROWS
+        self.flush_age = Config.ARCHIVE_FLUSH_AGE if flush_age is None else flush_age
+        self.max_pending = max_pending or Config.ARCHIVE_MAX_PENDING
+        self._partitions = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.pending = 0
+        self.archived = 0
+        self.dropped = 0
+        self.errors = 0
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return self
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='archive', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the thread and write every buffered row."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush(force=True)
+
+    def add(self, rows):
+        """Buffer committed rows for the archive thread."""
+        if not rows:
+            return
+        if not self.running:
+            self.start()
+        now = time.monotonic()
+        with self._lock:
+            room = max(self.max_pending - self.pending, 0)
+            if room < len(rows):
+                self.dropped += len(rows) - room
+                print(f"Archive queue full, dropped {len(rows) - room} transactions from the archive")
+                rows = rows[:room]
+            for row in map(_encode, rows):
+                partition = partition_key(row['timestamp'])
+                if partition not in self._partitions:
+                    self._partitions[partition] = (now, [])
+                self._partitions[partition][1].append(row)
+            self.pending += len(rows)
+
+    def _run(self):
+        # Checked a few times per flush_age so no partition waits much longer than that
+        while not self._stop.wait(max(min(self.flush_age / 4, 5.0), 0.05)):
+            self.flush()
+
+    def _ready(self, force):
+        """Take the partitions due for writing out of the buffer."""
+        now = time.monotonic()
+        with self._lock:
+            latest = max(self._partitions, default=None)
+            ready = [partition for partition, (since, rows) in self._partitions.items()
+                     if force or partition < latest or len(rows) >= self.flush_rows or now - since >= self.flush_age]
+            taken = [(partition, self._partitions.pop(partition)) for partition in sorted(ready)]
+            self.pending -= sum(len(rows) for _, (_, rows) in taken)
+        return taken
+
+    def flush(self, force=False):
+        """
+        Write the partitions that are due, or all of them with `force`.
+
+        Returns
+        -------
+        list
+            Keys of the files written.
+        """
+        keys = []
+        for partition, (_, rows) in self._ready(force):
+            try:
+                if self.writer is None:
+                    self.writer = ArchiveWriter(get_backend())
+                keys += self.writer.write(rows)
+                self.archived += len(rows)
+            except Exception as e:
+                self.errors += 1
+                print(f"Error archiving transactions: {str(e)}")
+                if not force:
+                    # Retried after another flush_age
+                    with self._lock:
+                        buffered = self._partitions.get(partition, (None, []))[1]
+                        self._partitions[partition] = (time.monotonic(), rows + buffered)
+                        self.pending += len(rows)
+        return keys
+
+    def stats(self):
+        return {
+            'running': self.running,
+            'pending': self.pending,
+            'partitions': len(self._partitions),
+            'archived': self.archived,
+            'dropped': self.dropped,
+            'errors': self.errors
+        }
+
+
+archive_queue = ArchiveQueue()
+# Buffered rows are written before the process exits
+atexit.register(archive_queue.stop)
+
+
+def archive_committed(rows):
+    """Commit hook queueing newly inserted rows for the archive when an archive backend is configured."""
+    if Config.ARCHIVE_BACKEND:
+        archive_queue.add(rows)
@@ -0,0 +1,212 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from sqlalchemy import func, inspect
+
+from app import db
+from app.models import BackfillUnit, Transaction
+from app.utils.block_cache import get_block_timestamps
+from config import Config
+
+
+def block_at_time(w3, timestamp, head_block):
+    """
+    First block mined at or after unix `timestamp`.
+
+    Binary search over block headers, so a date costs about log2(head)
+    header lookups, most of them served by the block cache afterwards.
+    """
+    low, high = 0, head_block + 1
+    while low < high:
+        middle = (low + high) // 2
+        if get_block_timestamps(w3, [middle])[middle] < timestamp:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+def fetch_range_rows(w3, start_block, end_block, tokens=None, decimals=None):
+    """Transaction rows for every monitored Transfer in an inclusive block range."""
+    from app.routes import get_transfer_events, token_decimals, transfers_to_rows
+
+    transfers = get_transfer_events(w3, start_block, end_block, tokens)
+    timestamps = get_block_timestamps(w3, [transfer['block_number'] for transfer in transfers])
+    return transfers_to_rows(transfers, timestamps, decimals or token_decimals(w3, tokens))
+
+
+def plan_units(job, start_block, end_block, unit_size):
+    """
+    Checkpoint rows for a job, returning the units still to load.
+
+    A job that already has units keeps them as planned, so a resumed run
+    only picks up what the crashed one left pending.
+    """
+    if BackfillUnit.query.filter_by(job=job).first() is None:
+        for start in range(start_block, end_block + 1, unit_size):
+            db.session.add(BackfillUnit(job=job, start_block=start, end_block=min(start + unit_size - 1, end_block)))
+        db.session.commit()
+    return (BackfillUnit.query
+            .filter_by(job=job, done=False)
+            .order_by(BackfillUnit.start_block)
+            .all())
+
+
+def unfinished_job(start_block):
+    """
+    Default-named job from `start_block` that still has pending units.
+
+    A backfill run up to the safe head is named after the head at the
+    time it started, so re-running the same command later resolves a
+    different end block; this finds the interrupted job to resume instead.
+    Returns `(job, end_block)` or None.
+    """
+    prefix = f'{start_block}-'
+    jobs = (db.session.query(BackfillUnit.job)
+            .filter(BackfillUnit.job.like(f'{prefix}%'), BackfillUnit.done.is_(False))
+            .group_by(BackfillUnit.job)
+            .order_by(func.max(BackfillUnit.updated_at).desc())
+            .all())
+    for (job,) in jobs:
+        if job[len(prefix):].isdigit():
+            return job, db.session.query(func.max(BackfillUnit.end_block)).filter_by(job=job).scalar()
+    return None
+
+
+def drop_transaction_indexes():
+    """
+    Drop the secondary Transaction indexes before a bulk load.
+
+    The (tx_hash, log_index) key is kept since inserts dedupe on it. If the
+    load dies half way, `ensure_indexes` recreates the indexes at the next
+    start of ingest.py or `python init_db.py`.
+    """
+    existing = {index['name'] for index in inspect(db.engine).get_indexes(Transaction.__tablename__)}
+    for index in Transaction.__table__.indexes:
+        if index.name in existing:
+            index.drop(bind=db.engine)
+
+
+def format_eta(seconds):
+    seconds = int(seconds)
+    return f'{seconds // 3600}h{seconds % 3600 // 60:02d}m{seconds % 60:02d}s'
+
+
+class BackfillProgress:
+    """Blocks/sec and ETA over the blocks loaded by this run."""
+
+    def __init__(self, total_blocks, done_blocks=0):
+        self.total_blocks = total_blocks
+        self.done_blocks = done_blocks
+        self.run_blocks = 0
+        self.transfers = 0
+        self.started = time.monotonic()
+
+    def add(self, blocks, transfers):
+        self.done_blocks += blocks
+        self.run_blocks += blocks
+        self.transfers += transfers
+
+    def rate(self):
+        elapsed = time.monotonic() - self.started
+        return self.run_blocks / elapsed if elapsed > 0 else 0.0
+
+    def __str__(self):
+        rate = self.rate()
+        remaining = self.total_blocks - self.done_blocks
+        eta = format_eta(remaining / rate) if rate else 'unknown'
+        percent = 100.0 * self.done_blocks / self.total_blocks if self.total_blocks else 100.0
+        return (f'{self.done_blocks}/{self.total_blocks} blocks ({percent:.1f}%), '
+                f'{self.transfers} transfers, {rate:.0f} blocks/s, ETA {eta}')
+
+
+def run_backfill(w3, start_block, end_block, job=None, workers=None, unit_size=None, drop_indexes=False,
+                 progress_interval=None):
+    """
+    Load every monitored Transfer of a historical block range.
+
+    The range is split into `unit_size` block units, checkpointed in the
+    `backfill_unit` table. Units are fetched by a pool of `workers`
+    threads (the work is RPC-bound; requests still share the log fetcher's
+    rate limit) and written by the calling thread, at most two units per
+    worker in flight. Each unit is bulk-inserted without the per-chunk
+    rollup hook and then marked done, so a crashed run resumes from its
+    pending units, and a unit replayed after a crash only finds duplicates.
+    Rollups (and, with `drop_indexes`, the secondary indexes) are rebuilt
+    once at the end. Must be called inside an app context.
+
+    Returns
+    -------
+    dict
+        Units and blocks loaded by this run, transfers inserted and the
+        average blocks per second.
+    """
+    from app.routes import monitored_tokens, stored_token_decimals
+    from app.utils.archive import archive_committed
+    from app.utils.bulk_insert import bulk_insert_transactions
+    from app.utils.ingest_cursor import advance_cursors, get_sweep_start
+    from app.utils.migrations import ensure_indexes
+    from app.utils.rollups import rebuild_rollups
+
+    job = job or f'{start_block}-{end_block}'
+    workers = workers or Config.BACKFILL_WORKERS
+    unit_size = unit_size or Config.BACKFILL_UNIT_SIZE
+    progress_interval = Config.BACKFILL_PROGRESS_INTERVAL if progress_interval is None else progress_interval
+    tokens = monitored_tokens()
+    decimals = stored_token_decimals(w3, tokens)
+
+    pending = plan_units(job, start_block, end_block, unit_size)
+    total_blocks = end_block - start_block + 1
+    progress = BackfillProgress(total_blocks, total_blocks - sum(u.end_block - u.start_block + 1 for u in pending))
+    print(f"Backfill {job}: {len(pending)} units pending, {progress}")
+    if drop_indexes and pending:
+        drop_transaction_indexes()
+
+    inserted = 0
+    last_report = time.monotonic()
+    with ThreadPoolExecutor(workers, thread_name_prefix='backfill') as executor:
+        queue = list(reversed(pending))
+        in_flight = {}
+        try:
+            while queue or in_flight:
+                while queue and len(in_flight) < 2 * workers:
+                    unit = queue.pop()
+                    future = executor.submit(fetch_range_rows, w3, unit.start_block, unit.end_block, tokens, decimals)
+                    in_flight[future] = unit
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    unit = in_flight.pop(future)
+                    rows = future.result()
+                    # Only new transfers are archived, by the archive thread
+                    inserted += bulk_insert_transactions(rows, on_commit=archive_committed)[0]
+                    unit.done = True
+                    unit.transfers = len(rows)
+                    db.session.commit()
+                    progress.add(unit.end_block - unit.start_block + 1, len(rows))
+                if time.monotonic() - last_report >= progress_interval:
+                    print(f"Backfill {job}: {progress}")
+                    last_report = time.monotonic()
+        except BaseException:
+            # Pending units stay pending for the next run
+            for future in in_flight:
+                future.cancel()
+            raise
+
+    if drop_indexes:
+        created = ensure_indexes()
+        print(f"Rebuilt indexes: {', '.join(created) or 'none'}")
+    buckets = rebuild_rollups()
+    print(f"Rebuilt {buckets} rollup buckets")
+
+    # Live ingestion may continue from here unless that would skip a gap
+    last_block = get_sweep_start(tokens)
+    if last_block is None or last_block >= start_block - 1:
+        advance_cursors(tokens, end_block)
+    print(f"Backfill {job} done: {progress}")
+    return {
+        'job': job,
+        'units': len(pending),
+        'blocks': progress.run_blocks,
+        'inserted': inserted,
+        'blocks_per_second': progress.rate()
+    }
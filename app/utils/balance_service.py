@@ -0,0 +1,149 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import Config
+from app.utils.metrics import time_rpc
+from app.utils.response_cache import LRUCacheBackend, response_cache
+
+
+def make_session(pool_size=None):
+    """
+    HTTP session with a bounded keep-alive connection pool.
+
+    Reusing connections saves the TCP and TLS handshakes of a cold request;
+    idempotent JSON-RPC reads are retried with backoff on throttling and
+    gateway errors.
+    """
+    pool_size = pool_size or Config.BALANCE_POOL_SIZE
+    retry = Retry(total=2, backoff_factor=0.2, status_forcelist=(429, 502, 503, 504),
+                  allowed_methods=frozenset(['POST']))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class BalanceService:
+    """
+    Token balance lookups through `alchemy_getTokenBalances`.
+
+    Results are cached per `(address, block)`, where block is the last
+    block committed by ingestion, and expire after `ttl` seconds as a
+    backstop. Uncached addresses are fetched together in JSON-RPC batch
+    requests, and every address with a `pageKey` is followed in the next
+    batch, so N addresses cost one round trip per page depth instead of N.
+    """
+
+    def __init__(self, endpoint_uri=None, session=None, cache=None, ttl=None):
+        self.endpoint_uri = endpoint_uri
+        self.session = session or make_session()
+        self.cache = cache or LRUCacheBackend(Config.BALANCE_CACHE_SIZE)
+        self.ttl = Config.BALANCE_CACHE_TTL if ttl is None else ttl
+        self.round_trips = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _post(self, payload):
+        endpoint_uri = self.endpoint_uri or Config.ALCHEMY_API_URL
+        if not endpoint_uri:
+            raise ValueError("ALCHEMY_API_URL not set in environment variables")
+        self.round_trips += 1
+        with time_rpc(payload):
+            response = self.session.post(endpoint_uri, json=payload,
+                                         timeout=(Config.BALANCE_CONNECT_TIMEOUT, Config.BALANCE_READ_TIMEOUT))
+            response.raise_for_status()
+            return response.json()
+
+    def _fetch(self, addresses):
+        """Fetch every page of balances for `addresses`, batching requests per page depth."""
+        balances = {address: [] for address in addresses}
+        errors = {}
+        page_keys = {address: None for address in addresses}
+        while page_keys:
+            pending = list(page_keys.items())
+            page_keys = {}
+            for i in range(0, len(pending), Config.RPC_BATCH_SIZE):
+                chunk = pending[i:i + Config.RPC_BATCH_SIZE]
+                payload = []
+                for request_id, (address, page_key) in enumerate(chunk):
+                    options = {'maxCount': Config.BALANCE_PAGE_SIZE}
+                    if page_key:
+                        options['pageKey'] = page_key
+                    payload.append({
+                        'jsonrpc': '2.0',
+                        'method': 'alchemy_getTokenBalances',
+                        'params': [address, 'erc20', options],
+                        'id': request_id
+                    })
+                replies = self._post(payload)
+                if not isinstance(replies, list):
+                    # Some providers answer a rejected batch with a single error object
+                    raise ValueError(f"Batch request rejected: {replies}")
+                # Error replies may carry `id: null`; every address without a reply of its own fails
+                by_id = {reply.get('id'): reply for reply in replies if isinstance(reply, dict)}
+                for request_id, (address, _) in enumerate(chunk):
+                    reply = by_id.get(request_id)
+                    if reply is None:
+                        errors[address] = 'No reply'
+                        continue
+                    result = reply.get('result')
+                    if not result:
+                        errors[address] = (reply.get('error') or {}).get('message', 'No result')
+                        continue
+                    balances[address].extend(result.get('tokenBalances', []))
+                    if result.get('pageKey'):
+                        page_keys[address] = result['pageKey']
+        return balances, errors
+
+    def get_balances(self, addresses):
+        """
+        Return token balances for several addresses.
+
+        Parameters
+        ----------
+        addresses : list of str
+            Addresses to look up; duplicates are fetched once.
+
+        Returns
+        -------
+        dict
+            Mapping of address to its list of `{contractAddress,
+            tokenBalance}` dicts, or to `{'error': message}` when the
+            provider returned an error for that address. Errors are not
+            cached.
+        """
+        block = response_cache.watermark()['block']
+        result = {}
+        missing = []
+        for address in dict.fromkeys(addresses):
+            cached = self.cache.get((address.lower(), block))
+            if cached is None:
+                missing.append(address)
+            else:
+                result[address] = cached
+        self.hits += len(result)
+        self.misses += len(missing)
+
+        if missing:
+            balances, errors = self._fetch(missing)
+            for address in missing:
+                if address in errors:
+                    result[address] = {'error': errors[address]}
+                else:
+                    result[address] = balances[address]
+                    self.cache.set((address.lower(), block), balances[address], self.ttl)
+        return result
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'round_trips': self.round_trips
+        }
+
+
+balance_service = BalanceService()
@@ -0,0 +1,165 @@
+import threading
+from collections import OrderedDict
+
+import requests
+
+from app.utils.metrics import time_rpc
+from config import Config
+
+_session = requests.Session()
+
+
+class BlockCache:
+    """
+    Bounded LRU cache of block headers keyed by block number.
+
+    Only the fields ingestion needs (number, hash, timestamp) are kept so
+    that tens of thousands of headers fit in a few megabytes. The cache is
+    safe to share between the monitor thread and request threads.
+    """
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._headers = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, block_number):
+        with self._lock:
+            header = self._headers.get(block_number)
+            if header is None:
+                self.misses += 1
+                return None
+            self._headers.move_to_end(block_number)
+            self.hits += 1
+            return header
+
+    def put(self, block_number, header):
+        with self._lock:
+            self._headers[block_number] = header
+            self._headers.move_to_end(block_number)
+            while len(self._headers) > self.max_size:
+                self._headers.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._headers.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._headers),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+    def __len__(self):
+        return len(self._headers)
+
+
+block_cache = BlockCache(Config.BLOCK_CACHE_SIZE)
+
+
+def _to_int(value):
+    if isinstance(value, str):
+        return int(value, 16)
+    return int(value)
+
+
+def _to_header(block):
+    block_hash = block.get('hash')
+    if block_hash is not None and not isinstance(block_hash, str):
+        block_hash = block_hash.hex()
+    return {
+        'number': _to_int(block['number']),
+        'hash': block_hash,
+        'timestamp': _to_int(block['timestamp'])
+    }
+
+
+def _batch_get_blocks(endpoint_uri, block_numbers):
+    """Fetch block headers with one JSON-RPC batch request per chunk."""
+    headers = {}
+    chunk_size = Config.RPC_BATCH_SIZE
+    for i in range(0, len(block_numbers), chunk_size):
+        chunk = block_numbers[i:i + chunk_size]
+        payload = [{
+            'jsonrpc': '2.0',
+            'method': 'eth_getBlockByNumber',
+            'params': [hex(number), False],
+            'id': number
+        } for number in chunk]
+        with time_rpc(payload):
+            response = _session.post(endpoint_uri, json=payload, timeout=Config.RPC_TIMEOUT)
+            response.raise_for_status()
+            replies = response.json()
+        if not isinstance(replies, list):
+            # Some providers answer a rejected batch with a single error object
+            raise ValueError(f"Batch request rejected: {replies}")
+        for reply in replies:
+            if reply.get('result'):
+                header = _to_header(reply['result'])
+                headers[header['number']] = header
+    return headers
+
+
+def fetch_block_headers(w3, block_numbers, cache=None):
+    """
+    Fetch headers for a set of block numbers, using the cache first.
+
+    Parameters
+    ----------
+    w3 : Web3
+        Connected Web3 instance. When it uses an HTTP provider the missing
+        headers are fetched in JSON-RPC batches, otherwise one by one.
+    block_numbers : iterable of int
+        Block numbers to look up; duplicates are ignored.
+    cache : BlockCache, optional
+        Cache to read from and fill, by default the module-level cache.
+
+    Returns
+    -------
+    dict
+        Mapping of block number to header dict with `number`, `hash` and
+        `timestamp` keys.
+    """
+    cache = block_cache if cache is None else cache
+    result = {}
+    missing = []
+    for number in sorted(set(block_numbers)):
+        header = cache.get(number)
+        if header is None:
+            missing.append(number)
+        else:
+            result[number] = header
+
+    if not missing:
+        return result
+
+    endpoint_uri = getattr(w3.provider, 'endpoint_uri', None)
+    fetched = {}
+    if endpoint_uri and len(missing) > 1:
+        try:
+            fetched = _batch_get_blocks(str(endpoint_uri), missing)
+        except Exception as e:
+            print(f"Batched block fetch failed, falling back to single requests: {str(e)}")
+
+    for number in missing:
+        header = fetched.get(number)
+        if header is None:
+            header = _to_header(w3.eth.get_block(number))
+        cache.put(number, header)
+        result[number] = header
+    return result
+
+
+def get_block_timestamps(w3, block_numbers, cache=None):
+    """Return a mapping of block number to unix timestamp."""
+    headers = fetch_block_headers(w3, block_numbers, cache)
+    return {number: header['timestamp'] for number, header in headers.items()}
@@ -0,0 +1,118 @@
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from app.models import Transaction
+from app.utils.metrics import db_rows, db_seconds
+from app.utils.storage import copy_insert, current_storage
+from config import Config
+
+_CONFLICT_INSERTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert
+}
+
+
+def transfer_key(row):
+    """A transfer is identified by its transaction and its log within it."""
+    return row['tx_hash'], row.get('log_index')
+
+
+def dedupe_rows(rows, key=transfer_key):
+    """Drop rows whose key was already seen earlier in the batch."""
+    seen = set()
+    unique_rows = []
+    for row in rows:
+        row_key = key(row)
+        if row_key in seen:
+            continue
+        seen.add(row_key)
+        unique_rows.append(row)
+    return unique_rows
+
+
+def _insert_chunk(table, chunk):
+    """Insert one chunk with a single statement, returning the rows that were new."""
+    # One indexed lookup per chunk tells us exactly which rows are new, so
+    # derived tables can be updated from them in the same transaction
+    hashes = list({row['tx_hash'] for row in chunk})
+    existing = set(db.session.query(table.c.tx_hash, table.c.log_index).filter(table.c.tx_hash.in_(hashes)))
+    # Rows stored before log indexes were recorded match any log of their transaction
+    legacy = {tx_hash for tx_hash, log_index in existing if log_index is None}
+    new_rows = [row for row in chunk if transfer_key(row) not in existing and row['tx_hash'] not in legacy]
+    if not new_rows:
+        return []
+
+    insert = _CONFLICT_INSERTS.get(db.engine.dialect.name)
+    if insert is not None:
+        # Still skip conflicts in case another writer raced us
+        stmt = insert(table).values(new_rows).on_conflict_do_nothing(index_elements=['tx_hash', 'log_index'])
+    else:
+        stmt = table.insert().values(new_rows)
+    db.session.execute(stmt)
+    return new_rows
+
+
+def bulk_insert_transactions(rows, batch_size=None, on_insert=None, on_commit=None):
+    """
+    Insert transaction rows, skipping transfers (tx_hash, log_index) already stored.
+
+    Parameters
+    ----------
+    rows : list
+        A list of dictionaries keyed by `Transaction` column names.
+    batch_size : int, optional
+        Rows per multi-row INSERT statement, by default
+        `Config.INSERT_BATCH_SIZE`. In the 'default' storage mode each
+        chunk is committed on its own so the rollback-journal write lock is
+        held only for one statement at a time; in 'wal' and 'postgresql'
+        mode all chunks are committed as one transaction. On PostgreSQL,
+        at least `Config.COPY_MIN_ROWS` rows are bulk-loaded with COPY.
+    on_insert : callable, optional
+        Called with the list of newly inserted rows of each chunk before it
+        is committed, so derived tables stay consistent with the inserts.
+    on_commit : callable, optional
+        Called with the new rows once they are committed, for side effects
+        that must only see durable data (e.g. pushing events).
+
+    Returns
+    -------
+    tuple
+        `(inserted, skipped)` row counts, where skipped covers duplicates
+        within `rows` as well as rows already present in the database.
+    """
+    batch_size = batch_size or Config.INSERT_BATCH_SIZE
+    unique_rows = dedupe_rows(rows)
+    table = Transaction.__table__
+    storage = current_storage()
+    single_transaction = storage is not None and storage.single_transaction_inserts
+    use_copy = db.engine.dialect.name == 'postgresql' and len(unique_rows) >= Config.COPY_MIN_ROWS
+    if use_copy:
+        batch_size = len(unique_rows)
+    inserted = 0
+    uncommitted = []
+    for i in range(0, len(unique_rows), batch_size):
+        chunk = unique_rows[i:i + batch_size]
+        commit_now = not single_transaction or i + batch_size >= len(unique_rows)
+        try:
+            with db_seconds.time('copy' if use_copy else 'insert'):
+                if use_copy:
+                    new_rows = copy_insert(db.session, table, chunk, ('tx_hash', 'log_index'))
+                else:
+                    new_rows = _insert_chunk(table, chunk)
+                if new_rows and on_insert is not None:
+                    on_insert(new_rows)
+            uncommitted.extend(new_rows)
+            if commit_now:
+                with db_seconds.time('commit'):
+                    db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        if commit_now:
+            inserted += len(uncommitted)
+            if uncommitted and on_commit is not None:
+                on_commit(uncommitted)
+            uncommitted = []
+    db_rows.inc('inserted', amount=inserted)
+    db_rows.inc('skipped', amount=len(rows) - inserted)
+    return inserted, len(rows) - inserted
@@ -0,0 +1,192 @@
+"""
+Feed of transfers committed by another process.
+
+Stream clients, the transfer graph and the response cache watermark are
+fed by `transactions_committed` in the process that ingests. When
+ingestion runs on its own (`ingest.py` next to `INGEST_IN_WEB_PROCESS=false
+python run.py`, or any WSGI server) the API process polls the transaction
+table instead: rows past the last `(block_number, log_index)` it has seen
+are published as `transaction` and `rollup` events, added to the graph
+and bump the watermark. Rows stored without a score are re-checked until
+the ingest process scores them, so newly flagged anomalies reach stream
+clients as well.
+
+Rows stored below the feed's position (backfill, archive replay) and
+flags changed when a retrained model rescores an already scored window
+are not seen.
+"""
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import and_, or_, select
+
+from config import Config
+
+COLUMNS = ('tx_hash', 'log_index', 'token_address', 'from_address', 'to_address', 'amount', 'amount_raw',
+           'block_number', 'timestamp', 'is_anomaly', 'anomaly_score')
+
+
+class ChangeFeed:
+    """
+    Polls for transfers committed by the ingest process and feeds the
+    in-process consumers with them.
+
+    Parameters
+    ----------
+    interval : float, optional
+        Seconds between polls, by default CHANGE_FEED_INTERVAL.
+    batch_size : int, optional
+        Rows read per poll, by default CHANGE_FEED_BATCH_SIZE.
+    max_pending : int, optional
+        Unscored transfers re-checked for their anomaly flag, by default
+        CHANGE_FEED_MAX_PENDING; the oldest are given up beyond that.
+    """
+
+    def __init__(self, interval=None, batch_size=None, max_pending=None):
+        self.interval = interval or Config.CHANGE_FEED_INTERVAL
+        self.batch_size = batch_size or Config.CHANGE_FEED_BATCH_SIZE
+        self.max_pending = max_pending or Config.CHANGE_FEED_MAX_PENDING
+        self.position = None
+        self._pending = OrderedDict()
+        self._stop = threading.Event()
+        self._thread = None
+        self.polls = 0
+        self.rows = 0
+        self.errors = 0
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, app):
+        """Poll on a background thread inside an app context of `app`."""
+        if self.running:
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(app,), name='change-feed', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self, app):
+        from app import db
+
+        with app.app_context():
+            while True:
+                try:
+                    self.poll()
+                except Exception as e:
+                    self.errors += 1
+                    print(f"Error polling for committed transactions: {str(e)}")
+                finally:
+                    db.session.remove()
+                if self._stop.wait(self.interval):
+                    return
+
+    def _head(self, table, db):
+        """Position of the newest stored transfer, or (-1, -1) for an empty table."""
+        row = db.session.execute(
+            select(table.c.block_number, table.c.log_index).where(table.c.log_index.isnot(None))
+            .order_by(table.c.block_number.desc(), table.c.log_index.desc()).limit(1)
+        ).first()
+        return (row.block_number, row.log_index) if row is not None else (-1, -1)
+
+    def poll(self):
+        """
+        Feed the transfers committed since the previous poll.
+
+        The first poll only records the current position and loads the
+        transfer graph up to it, so nothing is replayed or counted twice.
+
+        Returns
+        -------
+        int
+            New transfers fed.
+        """
+        from app import db
+        from app.models import Transaction
+        from app.routes import publish_transactions
+        from app.utils.response_cache import response_cache
+        from app.utils.transfer_graph import transfer_graph
+
+        table = Transaction.__table__
+        self.polls += 1
+        if self.position is None:
+            self.position = self._head(table, db)
+            db.session.commit()
+            transfer_graph.ensure_loaded(until=self.position)
+            return 0
+
+        block, log_index = self.position
+        after = or_(table.c.block_number > block, and_(table.c.block_number == block, table.c.log_index > log_index))
+        result = db.session.execute(
+            select(*[table.c[name] for name in COLUMNS]).where(after)
+            .order_by(table.c.block_number, table.c.log_index).limit(self.batch_size)
+        ).fetchall()
+        rows = [dict(row._mapping) for row in result]
+        scored = self._check_pending(table, db)
+        # End the read transaction so no snapshot is held between polls
+        db.session.commit()
+
+        if rows:
+            self.position = (rows[-1]['block_number'], rows[-1]['log_index'])
+            self.rows += len(rows)
+            transfer_graph.add_rows(rows)
+            publish_transactions(rows)
+            for row in rows:
+                if row['anomaly_score'] is None:
+                    self._pending[(row['tx_hash'], row['log_index'])] = row
+            while len(self._pending) > self.max_pending:
+                self._pending.popitem(last=False)
+        if rows or scored:
+            response_cache.bump_watermark(block=self.position[0])
+        return len(rows)
+
+    def _check_pending(self, table, db):
+        """Publish anomaly events for pending transfers scored since the last poll; returns how many were scored."""
+        from app.utils.event_stream import event_broker
+
+        if not self._pending:
+            return 0
+        scored = 0
+        keys = list(self._pending)
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            result = db.session.execute(
+                select(table.c.tx_hash, table.c.log_index, table.c.is_anomaly, table.c.anomaly_score)
+                .where(table.c.tx_hash.in_({tx_hash for tx_hash, _ in chunk}))
+                .where(table.c.anomaly_score.isnot(None))
+            ).fetchall()
+            for tx_hash, log_index, is_anomaly, anomaly_score in result:
+                row = self._pending.pop((tx_hash, log_index), None)
+                if row is None:
+                    continue
+                scored += 1
+                if is_anomaly:
+                    # The same event the ingest process publishes for a newly flagged transfer
+                    event_broker.publish('anomaly', {
+                        'tx_hash': tx_hash,
+                        'log_index': log_index,
+                        'token_address': row['token_address'],
+                        'timestamp': row['timestamp'].isoformat(),
+                        'is_anomaly': True,
+                        'anomaly_score': float(anomaly_score)
+                    })
+        return scored
+
+    def stats(self):
+        return {
+            'running': self.running,
+            'position': list(self.position) if self.position is not None else None,
+            'pending': len(self._pending),
+            'polls': self.polls,
+            'rows': self.rows,
+            'errors': self.errors
+        }
+
+
+change_feed = ChangeFeed()
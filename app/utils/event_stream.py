@@ -0,0 +1,144 @@
+import json
+import queue
+import threading
+from collections import deque
+
+from config import Config
+
+
+class Subscriber:
+    """One connected SSE client with its own bounded queue."""
+
+    def __init__(self, queue_size):
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = False
+
+    def get(self, timeout=None):
+        """Return the next event, or None on timeout."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+def parse_event_id(event_id):
+    """Split a `block:log_index:sequence` event id into a tuple of ints."""
+    try:
+        block, log_index, sequence = (int(part) for part in event_id.split(':'))
+        return block, log_index, sequence
+    except (AttributeError, ValueError):
+        return None
+
+
+class EventBroker:
+    """
+    Fan-out of ingestion events to server-sent-event clients.
+
+    Event ids are `block:log_index:sequence`, where block and log index are
+    the chain position of the latest transfer published and sequence is a
+    per-process counter. A bounded history lets reconnecting clients resume
+    from their `Last-Event-ID`: by sequence when it is from this process, by
+    chain position otherwise, or with a `reset` event telling the client to
+    refetch when the history no longer reaches back far enough.
+
+    Every client has a bounded queue. A client that falls so far behind
+    that its queue fills up is dropped rather than slowing down ingestion;
+    it reconnects and resumes from history.
+    """
+
+    def __init__(self, queue_size=1000, history_size=10000):
+        self.queue_size = queue_size
+        self._history = deque(maxlen=history_size)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self._position = (0, 0)
+        self.published = 0
+        self.dropped = 0
+
+    def _replay(self, last_event_id):
+        last = parse_event_id(last_event_id)
+        if last is None or not self._history:
+            return []
+        block, log_index, sequence = last
+        first_sequence = self._history[0]['sequence']
+        if first_sequence - 1 <= sequence <= self._sequence:
+            return [event for event in self._history if event['sequence'] > sequence]
+        if self._history[0]['position'] <= (block, log_index):
+            return [event for event in self._history if event['position'] > (block, log_index)]
+        return [{'id': None, 'event': 'reset', 'data': {'reason': 'history exhausted'}}]
+
+    def subscribe(self, last_event_id=None):
+        subscriber = Subscriber(self.queue_size)
+        with self._lock:
+            for event in self._replay(last_event_id)[-self.queue_size:]:
+                subscriber.queue.put_nowait(event)
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event_type, data, position=None):
+        """
+        Send an event to every subscriber.
+
+        Parameters
+        ----------
+        event_type : str
+            SSE event name: 'transaction', 'rollup' or 'anomaly'.
+        data : dict
+            JSON-serializable payload.
+        position : tuple, optional
+            `(block_number, log_index)` of a transfer; other events reuse the
+            position of the latest transfer.
+        """
+        with self._lock:
+            if position is not None and position > self._position:
+                self._position = position
+            self._sequence += 1
+            event = {
+                'id': f'{self._position[0]}:{self._position[1]}:{self._sequence}',
+                'event': event_type,
+                'data': data,
+                'sequence': self._sequence,
+                'position': self._position
+            }
+            self._history.append(event)
+            self.published += 1
+            for subscriber in list(self._subscribers):
+                try:
+                    subscriber.queue.put_nowait(event)
+                except queue.Full:
+                    # Backpressure: drop the slow client instead of blocking ingestion
+                    subscriber.dropped = True
+                    self._subscribers.discard(subscriber)
+                    self.dropped += 1
+
+    def queued(self):
+        """Events waiting in client queues, summed over every client."""
+        with self._lock:
+            return sum(subscriber.queue.qsize() for subscriber in self._subscribers)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': len(self._subscribers),
+                'published': self.published,
+                'dropped_clients': self.dropped,
+                'history': len(self._history)
+            }
+
+
+def format_sse(event):
+    """Serialize an event in text/event-stream format."""
+    lines = []
+    if event.get('id'):
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event['event']}")
+    lines.append(f"data: {json.dumps(event['data'], default=str)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+event_broker = EventBroker(Config.SSE_QUEUE_SIZE, Config.SSE_HISTORY_SIZE)
@@ -0,0 +1,227 @@
+import math
+import os
+import threading
+from collections import Counter, OrderedDict, deque
+from datetime import datetime
+
+import joblib
+import numpy as np
+
+from config import Config
+
+WINDOW_STATS = ('count', 'volume', 'counterparties')
+SNAPSHOT_FIELDS = ('windows', '_addresses', '_recent', 'observed', 'evicted')
+
+
+def feature_names(windows=None):
+    """Names of the per-transfer address features for the configured windows."""
+    windows = windows or Config.FEATURE_WINDOWS
+    return ([f'{side}_{stat}_{label}' for side in ('sender', 'receiver')
+             for label in windows for stat in WINDOW_STATS] +
+            ['sender_idle', 'receiver_idle'])
+
+
+def _seconds(timestamp):
+    """Accept datetimes (as stored) and epoch seconds (as passed to detect_fraud)."""
+    if isinstance(timestamp, datetime):
+        return timestamp.timestamp()
+    return float(timestamp)
+
+
+class RollingWindow:
+    """Count, volume and distinct counterparties of an address over the last `length` seconds."""
+
+    __slots__ = ('length', 'events', 'count', 'volume', 'counterparties')
+
+    def __init__(self, length):
+        self.length = length
+        self.events = deque()
+        self.count = 0
+        self.volume = 0.0
+        self.counterparties = Counter()
+
+    def add(self, at, amount, counterparty):
+        self.events.append((at, amount, counterparty))
+        self.count += 1
+        self.volume += amount
+        self.counterparties[counterparty] += 1
+
+    def expire(self, now):
+        # Every event is appended and popped once, so updates are O(1) amortized
+        cutoff = now - self.length
+        while self.events and self.events[0][0] <= cutoff:
+            _, amount, counterparty = self.events.popleft()
+            self.count -= 1
+            self.volume -= amount
+            self.counterparties[counterparty] -= 1
+            if not self.counterparties[counterparty]:
+                del self.counterparties[counterparty]
+        if not self.events:
+            self.volume = 0.0
+
+
+class AddressState:
+    __slots__ = ('windows', 'last_seen')
+
+    def __init__(self, lengths):
+        self.windows = [RollingWindow(length) for length in lengths]
+        self.last_seen = None
+
+
+class AddressFeatureStore:
+    """
+    In-memory rolling activity of every recently active address.
+
+    Each address keeps, per window (e.g. 1h and 24h), the number of
+    transfers it took part in as sender or receiver, their volume and the
+    number of distinct counterparties, plus when it was last active.
+    Observing a transfer updates both sides in O(1) amortized time, so
+    address-level features cost no SQL at scoring time.
+
+    Addresses are kept in LRU order; the least recently active ones are
+    evicted beyond `max_addresses` or once idle for longer than `ttl`
+    seconds. The feature vector of each observed transfer is taken before
+    the transfer is applied (point-in-time, no leakage) and the last
+    `recent_size` vectors are kept by (tx_hash, log_index) for batch
+    scoring, so transfers of one transaction keep their own vectors.
+    """
+
+    def __init__(self, windows=None, max_addresses=None, ttl=None, recent_size=None):
+        self.windows = dict(windows or Config.FEATURE_WINDOWS)
+        self.max_addresses = max_addresses or Config.FEATURE_STORE_MAX_ADDRESSES
+        self.ttl = ttl or Config.FEATURE_STORE_TTL
+        self.recent_size = recent_size or Config.FEATURE_STORE_RECENT
+        self.feature_names = feature_names(self.windows)
+        self._addresses = OrderedDict()
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+        self.observed = 0
+        self.evicted = 0
+
+    def _side_features(self, state, now):
+        if state is None:
+            return [0.0] * (len(self.windows) * len(WINDOW_STATS)), math.log1p(self.ttl)
+        values = []
+        for window in state.windows:
+            window.expire(now)
+            values += [float(window.count), math.log1p(max(window.volume, 0.0)),
+                       float(len(window.counterparties))]
+        return values, math.log1p(max(now - state.last_seen, 0.0))
+
+    def _transfer_features(self, sender, receiver, now):
+        sender_values, sender_idle = self._side_features(self._addresses.get(sender), now)
+        receiver_values, receiver_idle = self._side_features(self._addresses.get(receiver), now)
+        return sender_values + receiver_values + [sender_idle, receiver_idle]
+
+    def _touch(self, address, now):
+        state = self._addresses.get(address)
+        if state is None:
+            state = self._addresses[address] = AddressState(self.windows.values())
+        else:
+            self._addresses.move_to_end(address)
+        state.last_seen = max(now, state.last_seen or now)
+        return state
+
+    def _evict(self, now):
+        while self._addresses:
+            address, state = next(iter(self._addresses.items()))
+            if len(self._addresses) <= self.max_addresses and state.last_seen > now - self.ttl:
+                break
+            del self._addresses[address]
+            self.evicted += 1
+
+    def observe(self, row):
+        """
+        Record one transfer and return its features as seen just before it.
+
+        Parameters
+        ----------
+        row : dict
+            Transaction row with `from_address`, `to_address`, `amount`,
+            `timestamp`, `tx_hash` and `log_index`.
+
+        Returns
+        -------
+        list
+            Feature values in `feature_names` order.
+        """
+        sender, receiver = row['from_address'], row['to_address']
+        now = _seconds(row['timestamp'])
+        with self._lock:
+            features = self._transfer_features(sender, receiver, now)
+            for address, counterparty in ((sender, receiver), (receiver, sender)):
+                for window in self._touch(address, now).windows:
+                    window.add(now, row['amount'], counterparty)
+            self._evict(now)
+
+            if row.get('tx_hash'):
+                self._recent[(row['tx_hash'], row.get('log_index'))] = features
+                if len(self._recent) > self.recent_size:
+                    self._recent.popitem(last=False)
+            self.observed += 1
+        return features
+
+    def observe_rows(self, rows):
+        """Observe transfers in chronological order."""
+        for row in sorted(rows, key=lambda row: (row['timestamp'], row.get('log_index') or 0)):
+            self.observe(row)
+
+    def features_for(self, rows):
+        """
+        Feature matrix for transfers, without recording them.
+
+        Transfers observed at ingestion get their point-in-time vector;
+        others (e.g. ingested before a restart without a snapshot) fall
+        back to the current state of their addresses.
+
+        Returns
+        -------
+        numpy.ndarray
+            An `(n, len(feature_names))` array.
+        """
+        matrix = np.empty((len(rows), len(self.feature_names)))
+        with self._lock:
+            for i, row in enumerate(rows):
+                features = self._recent.get((row.get('tx_hash'), row.get('log_index')))
+                if features is None:
+                    features = self._transfer_features(row.get('from_address'), row.get('to_address'),
+                                                       _seconds(row['timestamp']))
+                matrix[i] = features
+        return matrix
+
+    def stats(self):
+        with self._lock:
+            return {
+                'addresses': len(self._addresses),
+                'recent_transfers': len(self._recent),
+                'observed': self.observed,
+                'evicted': self.evicted
+            }
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._lock:
+            state = {key: getattr(self, key) for key in SNAPSHOT_FIELDS}
+            tmp_path = path + '.tmp'
+            joblib.dump(state, tmp_path)
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        """Restore state saved by `save`; returns False when there is none or windows changed."""
+        try:
+            state = joblib.load(path)
+        except (OSError, ValueError, EOFError):
+            return False
+        if state.get('windows') != self.windows:
+            return False
+        with self._lock:
+            for key in SNAPSHOT_FIELDS:
+                setattr(self, key, state[key])
+        return True
+
+
+def snapshot_path():
+    return os.path.join(Config.MODEL_DIR, 'feature_store.joblib')
+
+
+feature_store = AddressFeatureStore()
@@ -1,7 +1,15 @@
 from sklearn.ensemble import IsolationForest
 import numpy as np
+from config import Config
+from app.utils.metrics import model_rows, model_seconds
+from app.utils.model_executor import model_executor
+from app.utils.model_registry import model_registry
+from app.utils.feature_store import feature_store as default_feature_store
 
-def detect_fraud(transactions):
+TRANSACTION_FEATURES = ['amount_zscore', 'time_diff'] + default_feature_store.feature_names
+FRAUD_FEATURES = ['amount', 'seconds_of_day'] + default_feature_store.feature_names
+
+def detect_fraud(transactions, registry=None, feature_store=None):
     # Extract features: amount, timestamp (convert to hour)
     """
     Detects fraudulent transactions in a list of transactions.
@@ -9,7 +17,16 @@ def detect_fraud(transactions):
     Parameters
     ----------
     transactions : list
-        A list of transactions, each represented as a dictionary with keys 'amount' and 'timestamp'.
+        A list of transactions, each represented as a dictionary with keys 'amount' and 'timestamp',
+        and optionally 'from_address', 'to_address' and 'tx_hash' for per-address features.
+    registry : ModelRegistry, optional
+        Registry holding the cached model, by default the shared one. The
+        cached model is reused until it is due for retraining or drift is
+        detected, so most calls only score.
+    feature_store : AddressFeatureStore, optional
+        Source of the per-address velocity features, by default the shared
+        one fed by ingestion. Transactions without addresses get the
+        features of unseen addresses.
 
     Returns
     -------
@@ -20,11 +37,61 @@ def detect_fraud(transactions):
     if not features:
         return []
     
-    # Train Isolation Forest
-    model = IsolationForest(contamination=0.1, random_state=42)
-    predictions = model.fit_predict(features)
+    registry = registry or model_registry
+    feature_store = feature_store or default_feature_store
+    features = np.hstack((np.asarray(features, dtype=np.float64), feature_store.features_for(transactions)))
+    retrain, _ = registry.needs_retrain('detect_fraud', FRAUD_FEATURES, features)
+    if retrain:
+        # Train Isolation Forest
+        model = IsolationForest(contamination=0.1, random_state=42)
+        with model_seconds.time('detect_fraud', 'fit'):
+            model = model_executor.fit('detect_fraud', model, features)
+        model_rows.inc('detect_fraud', 'fit', amount=len(features))
+        if len(features) >= Config.MODEL_MIN_TRAINING_ROWS:
+            registry.save('detect_fraud', model, FRAUD_FEATURES, features)
+    else:
+        model, _ = registry.load('detect_fraud')
+    with model_seconds.time('detect_fraud', 'score'):
+        scores = model_executor.score_samples('detect_fraud', model, features)
+    model_rows.inc('detect_fraud', 'score', amount=len(features))
     
-    # Mark transactions as fraud (prediction = -1)
+    # Mark transactions as fraud (what predict() returns as -1)
     for i, tx in enumerate(transactions):
-        tx['is_fraud'] = predictions[i] == -1
-    return transactions
\ No newline at end of file
+        tx['is_fraud'] = bool(scores[i] < model.offset_)
+    return transactions
+
+def compute_features(amounts, block_numbers, amount_mean=None, amount_std=None):
+    """
+    Builds the anomaly feature matrix from raw transaction columns.
+
+    Parameters
+    ----------
+    amounts : numpy.ndarray
+        Transaction amounts, ordered as they should be scored.
+    block_numbers : numpy.ndarray
+        Block numbers in the same order as `amounts`.
+    amount_mean, amount_std : float, optional
+        Normalization for the amount z-score. Pass the values a cached model
+        was trained with; by default they are taken from `amounts`.
+
+    Returns
+    -------
+    numpy.ndarray
+        An `(n, 2)` array with the amount z-score and the absolute block gap
+        to the previous transaction (0 for the first one). Per-address
+        features from the feature store are appended by the caller.
+    """
+    amounts = np.asarray(amounts, dtype=np.float64)
+    block_numbers = np.asarray(block_numbers, dtype=np.float64)
+
+    mean, std = amount_stats(amounts) if amount_mean is None else (amount_mean, amount_std)
+    amount_zscore = (amounts - mean) / std if std > 0 else np.zeros_like(amounts)
+    time_diff = np.abs(np.diff(block_numbers, prepend=block_numbers[:1]))
+    return np.column_stack((amount_zscore, time_diff))
+
+
+def amount_stats(amounts):
+    """Returns the mean and sample standard deviation used for amount z-scores."""
+    amounts = np.asarray(amounts, dtype=np.float64)
+    std = float(amounts.std(ddof=1)) if len(amounts) > 1 else 0.0
+    return float(amounts.mean()), std
@@ -0,0 +1,408 @@
+"""
+In-process columnar copy of the most recent transfers.
+
+The ingesting process already holds every transfer it commits, so the
+last HOT_WINDOW_HOURS are kept in preallocated NumPy columns (time,
+block, amount, interned sender/receiver/token ids, anomaly score and
+flag, transfer key) arranged as a ring buffer. Range sums, histograms
+with any bucket size, top-N transfers and the anomaly feature window are
+then a few vectorized passes over those arrays instead of a query and a
+list of ORM objects.
+
+The window is loaded from the database when ingestion starts in a
+process and is fed by `transactions_committed` from then on; processes
+that do not ingest (e.g. gunicorn workers next to `ingest.py`) never load
+it and always read the database. Every query says whether the window
+holds its whole range; callers fall back to the database when it does
+not. Rows written by other writers (backfill, archive replay) are not
+seen until the window is reloaded.
+"""
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+from flask import current_app, has_app_context
+from sqlalchemy import select
+
+from app.utils.transfer_graph import AddressInterner, from_seconds, to_seconds
+from config import Config
+
+def bucket_totals(times, amounts, anomalies, bucket_seconds):
+    """
+    Volume, count and anomalies per time bucket, vectorized.
+
+    Buckets are aligned to multiples of `bucket_seconds` since the epoch,
+    so hourly buckets start on the hour as rollup buckets do.
+
+    Returns
+    -------
+    tuple
+        `(bucket_starts, volumes, counts, anomaly_counts)` arrays holding
+        only the non-empty buckets, in time order.
+    """
+    if not len(times):
+        empty = np.empty(0)
+        return empty, empty, empty.astype(np.int64), empty.astype(np.int64)
+    buckets = np.floor_divide(times, bucket_seconds).astype(np.int64)
+    first = buckets.min()
+    offsets = buckets - first
+    counts = np.bincount(offsets)
+    volumes = np.bincount(offsets, weights=amounts)
+    anomaly_counts = np.bincount(offsets, weights=anomalies).astype(np.int64)
+    filled = np.flatnonzero(counts)
+    return (first + filled) * float(bucket_seconds), volumes[filled], counts[filled], anomaly_counts[filled]
+
+
+def histogram_dicts(times, amounts, anomalies, bucket_seconds):
+    """`bucket_totals` as a list of JSON-ready dicts."""
+    starts, volumes, counts, anomaly_counts = bucket_totals(times, amounts, anomalies, bucket_seconds)
+    return [{
+        'bucket_start': from_seconds(start).isoformat(),
+        'volume': float(volume),
+        'count': int(count),
+        'anomalies': int(anomaly_count)
+    } for start, volume, count, anomaly_count in zip(starts, volumes, counts, anomaly_counts)]
+
+
+class HotWindow:
+    """
+    Ring buffer of the newest transfers, one preallocated array per column.
+
+    Every transfer with a timestamp at or after `floor` is held: the
+    floor starts at the beginning of the loaded range and moves past the
+    newest transfer overwritten once `capacity` is reached. A query over
+    `[start, end)` is answered from memory only when `start >= floor`.
+    """
+
+    def __init__(self, capacity=None, hours=None, max_addresses=None):
+        self.capacity = capacity or Config.HOT_WINDOW_CAPACITY
+        self.hours = hours or Config.HOT_WINDOW_HOURS
+        self.max_addresses = max_addresses or Config.HOT_WINDOW_MAX_ADDRESSES
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        """Drop every transfer; the window serves nothing until loaded again."""
+        with self._lock:
+            self.app = None
+            self.addresses = AddressInterner()
+            self.tokens = AddressInterner()
+            self._times = np.empty(self.capacity, dtype=np.float64)
+            self._blocks = np.empty(self.capacity, dtype=np.int64)
+            self._amounts = np.empty(self.capacity, dtype=np.float64)
+            self._senders = np.empty(self.capacity, dtype=np.int32)
+            self._receivers = np.empty(self.capacity, dtype=np.int32)
+            self._token_ids = np.empty(self.capacity, dtype=np.int16)
+            self._scores = np.empty(self.capacity, dtype=np.float64)
+            self._anomalies = np.empty(self.capacity, dtype=bool)
+            self._hashes = np.empty(self.capacity, dtype='S66')
+            self._log_indexes = np.empty(self.capacity, dtype=np.int32)
+            self._size = 0
+            self._head = 0
+            self.floor = np.inf
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def live(self):
+        """Whether the window mirrors the database of the current app."""
+        return (self.app is not None and has_app_context() and
+                current_app._get_current_object() is self.app)
+
+    def load(self, now=None, batch_size=10000):
+        """
+        Fill the window with the stored transfers of the last `hours`,
+        keeping the newest `capacity` of them. Legacy rows without a log
+        index (stored before per-log keys) are left out.
+
+        Returns
+        -------
+        int
+            Transfers loaded.
+        """
+        from app import db
+        from app.models import Transaction
+
+        self.clear()
+        now = now or datetime.utcnow()
+        start = now - timedelta(hours=self.hours)
+        table = Transaction.__table__
+        recent = (table.c.timestamp >= start) & table.c.log_index.isnot(None)
+        cutoff = db.session.execute(
+            select(table.c.timestamp, table.c.id).where(recent)
+            .order_by(table.c.timestamp.desc(), table.c.id.desc())
+            .offset(self.capacity - 1).limit(1)
+        ).first()
+        query = select(table.c.tx_hash, table.c.log_index, table.c.token_address, table.c.from_address,
+                       table.c.to_address, table.c.amount, table.c.block_number, table.c.timestamp,
+                       table.c.anomaly_score, table.c.is_anomaly).where(recent)
+        if cutoff is not None:
+            query = query.where((table.c.timestamp > cutoff.timestamp) |
+                                ((table.c.timestamp == cutoff.timestamp) & (table.c.id >= cutoff.id)))
+
+        self.app = current_app._get_current_object()
+        # Rows sharing the cutoff timestamp may have been left out
+        if cutoff is None:
+            self.floor = to_seconds(start)
+        else:
+            self.floor = float(np.nextafter(to_seconds(cutoff.timestamp), np.inf))
+        result = db.session.execute(query.order_by(table.c.timestamp, table.c.id)
+                                    .execution_options(stream_results=True))
+        for rows in result.partitions(batch_size):
+            self.add_rows([row._mapping for row in rows])
+        db.session.commit()
+        return self._size
+
+    def ensure_loaded(self):
+        """Load the window for the current app, once, when ingestion starts in this process."""
+        if not Config.HOT_WINDOW_ENABLED or self.live:
+            return 0
+        loaded = self.load()
+        print(f"Loaded {loaded} transfers into the hot window")
+        return loaded
+
+    def add_rows(self, rows):
+        """Append committed Transaction row dicts; ignored until the window is loaded."""
+        if self.app is None:
+            return
+        rows = [row for row in rows if row.get('log_index') is not None]
+        if not rows:
+            return
+        with self._lock:
+            n = len(rows)
+            times = np.fromiter((to_seconds(row['timestamp']) for row in rows), np.float64, n)
+            columns = (
+                times,
+                np.fromiter((row['block_number'] for row in rows), np.int64, n),
+                np.fromiter((row['amount'] for row in rows), np.float64, n),
+                np.fromiter((self.addresses.intern(row['from_address']) for row in rows), np.int32, n),
+                np.fromiter((self.addresses.intern(row['to_address']) for row in rows), np.int32, n),
+                np.fromiter((self.tokens.intern(row.get('token_address') or Config.USDC_CONTRACT_ADDRESS)
+                             for row in rows), np.int16, n),
+                np.array([np.nan if row.get('anomaly_score') is None else row['anomaly_score'] for row in rows],
+                         dtype=np.float64),
+                np.array([bool(row.get('is_anomaly')) for row in rows], dtype=bool),
+                np.array([row['tx_hash'] for row in rows], dtype='S66'),
+                np.fromiter((row['log_index'] for row in rows), np.int32, n)
+            )
+            # Transfers older than the floor would make it claim a range it does not hold
+            keep = times >= self.floor
+            if not keep.all():
+                columns = tuple(column[keep] for column in columns)
+                n = int(keep.sum())
+            if n > self.capacity:
+                self.floor = max(self.floor, float(np.nextafter(columns[0][:-self.capacity].max(), np.inf)))
+                columns = tuple(column[-self.capacity:] for column in columns)
+                n = self.capacity
+            if not n:
+                return
+
+            slots = (self._head + np.arange(n)) % self.capacity
+            overwritten = slots[slots < self._size]
+            if len(overwritten):
+                self.floor = max(self.floor, float(np.nextafter(self._times[overwritten].max(), np.inf)))
+            for target, column in zip(self._columns(), columns):
+                target[slots] = column
+            self._head = (self._head + n) % self.capacity
+            self._size = min(self._size + n, self.capacity)
+
+            if len(self.addresses) > self.max_addresses:
+                self._compact()
+
+    def _columns(self):
+        return (self._times, self._blocks, self._amounts, self._senders, self._receivers, self._token_ids,
+                self._scores, self._anomalies, self._hashes, self._log_indexes)
+
+    def _compact(self):
+        """Re-intern only the addresses of live transfers."""
+        size = self._size
+        live = np.unique(np.concatenate((self._senders[:size], self._receivers[:size])))
+        remap = np.full(len(self.addresses), -1, dtype=np.int32)
+        remap[live] = np.arange(len(live), dtype=np.int32)
+        addresses = AddressInterner()
+        for address_id in live:
+            addresses.intern(self.addresses.address(address_id))
+        self._senders[:size] = remap[self._senders[:size]]
+        self._receivers[:size] = remap[self._receivers[:size]]
+        self.addresses = addresses
+
+    def covers(self, start):
+        """Whether every transfer at or after `start` is held; counts hits and misses."""
+        covered = start is not None and self.live and to_seconds(start) >= self.floor
+        if covered:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return covered
+
+    def _select(self, start, end=None, token_address=None):
+        """Slots of the live transfers with `start <= time < end`, of one token if given."""
+        size = self._size
+        times = self._times[:size]
+        mask = times >= to_seconds(start)
+        if end is not None:
+            mask &= times < to_seconds(end)
+        if token_address is not None:
+            token_id = self.tokens.lookup(token_address)
+            if token_id is None:
+                return np.empty(0, dtype=np.int64)
+            mask &= self._token_ids[:size] == token_id
+        return np.flatnonzero(mask)
+
+    def range_sum(self, start, end=None, token_address=None):
+        """Volume, count and anomalies in `[start, end)`, or None when not held."""
+        if not self.covers(start):
+            return None
+        with self._lock:
+            slots = self._select(start, end, token_address)
+            return {
+                'volume': float(self._amounts[slots].sum()),
+                'count': int(len(slots)),
+                'anomalies': int(self._anomalies[slots].sum())
+            }
+
+    def histogram(self, start, end=None, bucket_seconds=3600, token_address=None):
+        """Per-bucket totals of `[start, end)` (see `bucket_totals`), or None when not held."""
+        if not self.covers(start):
+            return None
+        with self._lock:
+            slots = self._select(start, end, token_address)
+            return histogram_dicts(self._times[slots], self._amounts[slots], self._anomalies[slots],
+                                   bucket_seconds)
+
+    def summary(self, start, end=None, token_address=None):
+        """
+        The `window_summary` of `[start, end)` computed from memory, or None
+        when not held. Unlike rollups, the first minute only counts
+        transfers from `start` on.
+        """
+        if not self.covers(start):
+            return None
+        with self._lock:
+            slots = self._select(start, end, token_address)
+            times, amounts = self._times[slots], self._amounts[slots]
+            anomalies, token_ids = self._anomalies[slots], self._token_ids[slots]
+            starts, volumes, counts, anomaly_counts = bucket_totals(times, amounts, anomalies, 3600)
+            tokens = {}
+            for token_id in np.unique(token_ids):
+                of_token = token_ids == token_id
+                tokens[self.tokens.address(token_id)] = {
+                    'volume': float(amounts[of_token].sum()),
+                    'count': int(of_token.sum()),
+                    'anomalies': int(anomalies[of_token].sum())
+                }
+        hourly_data = {from_seconds(hour): {'volume': float(volume), 'count': int(count), 'anomalies': int(flagged)}
+                       for hour, volume, count, flagged in zip(starts, volumes, counts, anomaly_counts)}
+        return {
+            'hourly_data': hourly_data,
+            'tokens': tokens,
+            'total_volume': float(amounts.sum()),
+            'total_transactions': int(len(slots)),
+            'anomaly_count': int(anomalies.sum())
+        }
+
+    def top_transfers(self, start, end=None, limit=10, token_address=None):
+        """The `limit` largest transfers of `[start, end)`, largest first, or None when not held."""
+        if not self.covers(start):
+            return None
+        with self._lock:
+            slots = self._select(start, end, token_address)
+            limit = min(limit, len(slots))
+            if limit <= 0:
+                return []
+            top = slots[np.argpartition(-self._amounts[slots], limit - 1)[:limit]]
+            top = top[np.argsort(-self._amounts[top], kind='stable')]
+            return [self._transfer(slot) for slot in top]
+
+    def _transfer(self, slot):
+        score = self._scores[slot]
+        return {
+            'tx_hash': self._hashes[slot].decode(),
+            'log_index': int(self._log_indexes[slot]),
+            'token_address': self.tokens.address(self._token_ids[slot]),
+            'from_address': self.addresses.address(self._senders[slot]),
+            'to_address': self.addresses.address(self._receivers[slot]),
+            'amount': float(self._amounts[slot]),
+            'block_number': int(self._blocks[slot]),
+            'timestamp': from_seconds(self._times[slot]).isoformat(),
+            'is_anomaly': bool(self._anomalies[slot]),
+            'anomaly_score': None if np.isnan(score) else float(score)
+        }
+
+    def latest(self, token_address, count):
+        """
+        Columns of the newest `count` transfers of a token, newest first,
+        for anomaly features; None when the window holds fewer than
+        `count` of them (older ones may only be in the database).
+
+        Returns
+        -------
+        dict or None
+            `amounts`, `block_numbers`, `scores` (NaN when unscored) and
+            `anomalies` arrays, plus `timestamps`, `tx_hashes`,
+            `log_indexes`, `from_addresses` and `to_addresses` lists.
+        """
+        if not self.live:
+            self.misses += 1
+            return None
+        with self._lock:
+            token_id = self.tokens.lookup(token_address)
+            size = self._size
+            slots = np.flatnonzero(self._token_ids[:size] == token_id) if token_id is not None else np.empty(0, int)
+            if len(slots) < count:
+                self.misses += 1
+                return None
+            # Newest first; the ring position breaks ties in insertion order
+            age = (np.arange(size) - self._head) % self.capacity if size == self.capacity else np.arange(size)
+            slots = slots[np.lexsort((-age[slots], -self._times[slots]))][:count]
+            self.hits += 1
+            return {
+                'ids': None,
+                'amounts': self._amounts[slots].copy(),
+                'block_numbers': self._blocks[slots].astype(np.float64),
+                'scores': self._scores[slots].copy(),
+                'anomalies': self._anomalies[slots].copy(),
+                'timestamps': [from_seconds(t) for t in self._times[slots]],
+                'tx_hashes': [h.decode() for h in self._hashes[slots]],
+                'log_indexes': self._log_indexes[slots].tolist(),
+                'from_addresses': [self.addresses.address(i) for i in self._senders[slots]],
+                'to_addresses': [self.addresses.address(i) for i in self._receivers[slots]]
+            }
+
+    def update_scores(self, tx_hashes, log_indexes, scores, anomalies):
+        """Mirror anomaly scores written to the database onto the held transfers."""
+        if self.app is None or not len(tx_hashes):
+            return
+        scores_by_key = {(tx_hash.encode(), log_index): (score, flag)
+                         for tx_hash, log_index, score, flag in zip(tx_hashes, log_indexes, scores, anomalies)
+                         if log_index is not None}
+        with self._lock:
+            size = self._size
+            # One vectorized membership pass narrows the Python work to matching slots
+            candidates = np.flatnonzero(np.isin(self._hashes[:size],
+                                                np.array([key[0] for key in scores_by_key], dtype='S66')))
+            for slot in candidates:
+                update = scores_by_key.get((self._hashes[slot], int(self._log_indexes[slot])))
+                if update is not None:
+                    self._scores[slot], self._anomalies[slot] = update
+
+    def stats(self):
+        with self._lock:
+            oldest = self._times[:self._size].min() if self._size else None
+            return {
+                'loaded': self.app is not None,
+                'transfers': self._size,
+                'capacity': self.capacity,
+                'addresses': len(self.addresses),
+                'covered_since': from_seconds(self.floor).isoformat() if np.isfinite(self.floor) else None,
+                'oldest': from_seconds(oldest).isoformat() if oldest is not None else None,
+                'hits': self.hits,
+                'misses': self.misses,
+                'memory_bytes': int(sum(column.nbytes for column in self._columns()))
+            }
+
+
+hot_window = HotWindow()
@@ -0,0 +1,87 @@
+from app import db
+from app.models import IngestCursor
+from app.utils.storage import writes
+
+
+def get_last_block(contract_address):
+    """Return the last fully ingested block for a contract, or None if never ingested."""
+    cursor = IngestCursor.query.get(contract_address)
+    return cursor.last_block if cursor else None
+
+
+@writes
+def advance_cursor(contract_address, block_number):
+    """
+    Record that every block up to `block_number` has been ingested.
+
+    The cursor only moves forward, so re-running an older range (for
+    example from a backfill) never rewinds incremental ingestion.
+    """
+    _move_cursor(contract_address, block_number)
+    db.session.commit()
+
+
+def _move_cursor(contract_address, block_number):
+    cursor = IngestCursor.query.get(contract_address)
+    if cursor is None:
+        db.session.add(IngestCursor(contract_address=contract_address, last_block=block_number))
+    elif block_number > cursor.last_block:
+        cursor.last_block = block_number
+
+
+def get_sweep_start(contract_addresses):
+    """
+    Return the last block ingested for every contract of a shared log sweep.
+
+    This is the oldest cursor, so a token added to the monitored list later
+    joins the sweep from there and contracts already ahead have the
+    overlap skipped as duplicates. None when no contract has a cursor yet.
+    """
+    blocks = [block for block in map(get_last_block, contract_addresses) if block is not None]
+    return min(blocks) if blocks else None
+
+
+@writes
+def advance_cursors(contract_addresses, block_number):
+    """Advance the cursor of every contract covered by one sweep, in a single commit."""
+    for contract_address in contract_addresses:
+        _move_cursor(contract_address, block_number)
+    db.session.commit()
+
+
+def plan_ranges(last_block, head_block, confirmations, chunk_size, lookback, max_chunks=None):
+    """
+    Split the blocks not yet ingested into inclusive `(start, end)` ranges.
+
+    Parameters
+    ----------
+    last_block : int or None
+        Last ingested block, or None to start `lookback` blocks behind the head.
+    head_block : int
+        Current chain head.
+    confirmations : int
+        Number of most recent blocks to leave alone until they are final.
+    chunk_size : int
+        Maximum number of blocks per range.
+    lookback : int
+        Blocks to scan on the very first run.
+    max_chunks : int, optional
+        Cap on the number of ranges returned, so that catching up after a
+        long outage is spread over several cycles.
+
+    Returns
+    -------
+    list
+        Ordered list of `(start_block, end_block)` tuples, empty when
+        there is nothing new to ingest.
+    """
+    safe_head = head_block - confirmations
+    start = last_block + 1 if last_block is not None else max(safe_head - lookback, 0)
+    ranges = []
+    while start <= safe_head:
+        end = min(start + chunk_size - 1, safe_head)
+        ranges.append((start, end))
+        if max_chunks and len(ranges) >= max_chunks:
+            break
+        start = end + 1
+    return ranges
@@ -0,0 +1,200 @@
+import threading
+import time
+from decimal import Context, Decimal
+from functools import lru_cache
+
+import requests
+from web3 import Web3
+
+from app.utils.metrics import time_rpc
+from config import Config
+
+# keccak256('Transfer(address,address,uint256)')
+TRANSFER_TOPIC = '0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef'
+# decimals() selector
+DECIMALS_SELECTOR = '0x313ce567'
+
+_session = requests.Session()
+_decimals = {}
+_decimals_lock = threading.Lock()
+# Decimals already in the token table, and when it was last read
+_stored = set()
+_stored_read_at = None
+
+
+class RPCError(Exception):
+    """JSON-RPC error response; the message keeps the provider's wording."""
+
+
+@lru_cache(maxsize=100000)
+def checksum_address(topic):
+    """Checksummed address from a 32-byte topic or a plain address; cached since a few addresses dominate."""
+    return Web3.to_checksum_address('0x' + topic[-40:])
+
+
+def decode_transfer_log(log):
+    """
+    Decode one raw ERC-20 Transfer log from `eth_getLogs`.
+
+    Parameters
+    ----------
+    log : dict
+        Raw log with hex `topics`, `data`, `blockNumber`, `logIndex` and
+        `transactionHash`.
+
+    Returns
+    -------
+    dict or None
+        `tx_hash`, `token_address` (the emitting contract), `block_number`,
+        `log_index`, `from_address`, `to_address` and `value` (exact
+        integer in base units), or None for
+        logs that are not ERC-20 transfers (e.g. ERC-721 transfers carry
+        the token id as a fourth topic) or were removed by a reorg.
+    """
+    topics = log['topics']
+    if len(topics) != 3 or topics[0] != TRANSFER_TOPIC or log.get('removed'):
+        return None
+    return {
+        'tx_hash': log['transactionHash'],
+        'token_address': checksum_address(log['address']),
+        'block_number': int(log['blockNumber'], 16),
+        'log_index': int(log['logIndex'], 16),
+        'from_address': checksum_address(topics[1]),
+        'to_address': checksum_address(topics[2]),
+        'value': int(log['data'], 16)
+    }
+
+
+def decode_transfer_logs(logs):
+    return [transfer for transfer in map(decode_transfer_log, logs) if transfer is not None]
+
+
+def transfer_from_event(event):
+    """Same shape as `decode_transfer_log` from a web3-decoded Transfer event."""
+    return {
+        'tx_hash': event['transactionHash'].hex(),
+        'token_address': event['address'],
+        'block_number': event['blockNumber'],
+        'log_index': event['logIndex'],
+        'from_address': event['args']['from'],
+        'to_address': event['args']['to'],
+        'value': int(event['args']['value'])
+    }
+
+
+def _rpc(endpoint_uri, method, params):
+    payload = {'jsonrpc': '2.0', 'method': method, 'params': params, 'id': 1}
+    with time_rpc(payload):
+        response = _session.post(endpoint_uri, json=payload, timeout=Config.RPC_TIMEOUT)
+        response.raise_for_status()
+        reply = response.json()
+        if 'error' in reply:
+            error = reply['error']
+            raise RPCError(f"{error.get('code')}: {error.get('message')}")
+    return reply['result']
+
+
+def fetch_transfer_logs(endpoint_uri, token_addresses, start_block, end_block):
+    """
+    Raw `eth_getLogs` for Transfer logs of one or several tokens, decoded
+    without web3 contract objects.
+
+    Several contracts go into the `address` list of a single filter, so the
+    node scans each block range once however many tokens are monitored.
+    """
+    if isinstance(token_addresses, str):
+        token_addresses = [token_addresses]
+    logs = _rpc(endpoint_uri, 'eth_getLogs', [{
+        'address': list(token_addresses),
+        'topics': [TRANSFER_TOPIC],
+        'fromBlock': hex(start_block),
+        'toBlock': hex(end_block)
+    }])
+    return decode_transfer_logs(logs)
+
+
+def known_decimals(token_address):
+    """
+    Decimals of a token from TOKEN_DECIMALS, an earlier lookup or the token
+    table written by the ingesting process, else None.
+
+    The table is read at most every TOKEN_DECIMALS_REFRESH seconds, and
+    only inside an app context.
+    """
+    key = token_address.lower()
+    for address, decimals in Config.TOKEN_DECIMALS.items():
+        if address.lower() == key:
+            return decimals
+    with _decimals_lock:
+        decimals = _decimals.get(key)
+    if decimals is None and _read_stored_decimals():
+        with _decimals_lock:
+            decimals = _decimals.get(key)
+    return decimals
+
+
+def _read_stored_decimals():
+    """Cache the stored decimals of every token when due; returns whether the table was read."""
+    global _stored_read_at
+    from flask import has_app_context
+
+    now = time.monotonic()
+    if not has_app_context() or (_stored_read_at is not None and now - _stored_read_at < Config.TOKEN_DECIMALS_REFRESH):
+        return False
+    _stored_read_at = now
+    from app import db
+    from app.models import Token
+
+    stored = db.session.query(Token.address, Token.decimals).all()
+    with _decimals_lock:
+        for address, decimals in stored:
+            _decimals.setdefault(address, decimals)
+            _stored.add(address)
+    return True
+
+
+def store_decimals(decimals):
+    """
+    Persist decimals looked up by ingestion (`{token_address: decimals}`)
+    that are not stored yet. Must be called inside an app context.
+    """
+    from app.utils.storage import run_write
+
+    with _decimals_lock:
+        new = {address.lower(): value for address, value in decimals.items() if address.lower() not in _stored}
+    if new:
+        run_write(_insert_decimals, new)
+
+
+def _insert_decimals(decimals):
+    from app import db
+    from app.models import Token
+
+    for address, value in decimals.items():
+        db.session.merge(Token(address=address, decimals=value))
+    db.session.commit()
+    with _decimals_lock:
+        _stored.update(decimals)
+
+
+def get_token_decimals(w3, token_address):
+    """Decimals of a token: from TOKEN_DECIMALS, otherwise read once with `decimals()` and cached."""
+    decimals = known_decimals(token_address)
+    if decimals is not None:
+        return decimals
+    key = token_address.lower()
+    result = w3.eth.call({'to': Web3.to_checksum_address(token_address), 'data': DECIMALS_SELECTOR})
+    decimals = int.from_bytes(bytes(result), 'big')
+    with _decimals_lock:
+        _decimals[key] = decimals
+    return decimals
+
+
+def format_amount(raw, decimals):
+    """Exact decimal string of a base-unit amount, e.g. 1234500 with 6 decimals -> '1.2345'."""
+    if raw is None or decimals is None:
+        return None
+    # uint256 has up to 78 digits, beyond the default 28-digit context
+    value = Decimal(int(raw)).scaleb(-decimals, context=Context(prec=100))
+    text = f'{value:f}'
+    return text.rstrip('0').rstrip('.') if '.' in text else text
@@ -0,0 +1,168 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from config import Config
+
+# Error fragments providers use when an eth_getLogs range returns too much data
+RANGE_TOO_LARGE_ERRORS = (
+    'log response size exceeded',
+    'query returned more than',
+    'response size exceeded',
+    'block range is too wide',
+    'block range too large',
+    'exceed maximum block range',
+    '-32005'
+)
+
+
+def is_range_too_large(error):
+    message = str(error).lower()
+    return any(fragment in message for fragment in RANGE_TOO_LARGE_ERRORS)
+
+
+class RateLimiter:
+    """Token bucket that limits how many requests are started per second."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(rate, 1))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_for = (1 - self._tokens) / self.rate
+            time.sleep(wait_for)
+
+
+class LogRangeFetcher:
+    """
+    Fetches logs for a block range in parallel chunks whose size adapts.
+
+    The chunk size is learned from recent responses: it moves towards the
+    span that would return about `target_logs` entries, and is halved for
+    any range the provider rejects as too large. Rejected ranges are split
+    recursively down to a single block, so no part of the range is dropped.
+    Requests are spread over a bounded thread pool and rate limited, and
+    the merged result is ordered by block number and log index.
+    """
+
+    def __init__(self, initial_chunk=2000, min_chunk=1, max_chunk=100000,
+                 target_logs=5000, max_workers=4, requests_per_second=10):
+        self.chunk_size = initial_chunk
+        self.min_chunk = min_chunk
+        self.max_chunk = max_chunk
+        self.target_logs = target_logs
+        self.max_workers = max_workers
+        self.rate_limiter = RateLimiter(requests_per_second)
+        self._executor = None
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.splits = 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='log-fetcher')
+            return self._executor
+
+    def _learn(self, span, log_count, rejected=False):
+        with self._lock:
+            if rejected:
+                self.splits += 1
+                ideal = min(self.chunk_size, span // 2)
+            else:
+                density = log_count / span
+                ideal = self.target_logs / density if density else self.chunk_size * 2
+                # Smooth the estimate so one quiet range does not blow up the chunk size
+                ideal = (self.chunk_size + ideal) / 2
+            self.chunk_size = int(min(self.max_chunk, max(self.min_chunk, ideal)))
+
+    def _fetch_adaptive(self, get_logs, start_block, end_block):
+        self.rate_limiter.acquire()
+        with self._lock:
+            self.requests += 1
+        try:
+            logs = get_logs(start_block, end_block)
+        except Exception as e:
+            if not is_range_too_large(e) or start_block == end_block:
+                raise
+            span = end_block - start_block + 1
+            self._learn(span, 0, rejected=True)
+            mid_block = (start_block + end_block) // 2
+            return (self._fetch_adaptive(get_logs, start_block, mid_block) +
+                    self._fetch_adaptive(get_logs, mid_block + 1, end_block))
+        self._learn(end_block - start_block + 1, len(logs))
+        return list(logs)
+
+    def fetch(self, get_logs, start_block, end_block, sort_key=None):
+        """
+        Fetch all logs in an inclusive block range.
+
+        Parameters
+        ----------
+        get_logs : callable
+            `get_logs(start_block, end_block)` returning a list of logs with
+            `blockNumber` and `logIndex` keys.
+        start_block : int
+            First block of the range.
+        end_block : int
+            Last block of the range.
+        sort_key : callable, optional
+            Ordering key of the returned entries, by default their web3
+            `(blockNumber, logIndex)`.
+
+        Returns
+        -------
+        list
+            Logs from every chunk, ordered by block number and log index.
+        """
+        executor = self._get_executor()
+        results = []
+        pending = set()
+        next_start = start_block
+        try:
+            while next_start <= end_block or pending:
+                # Carve chunks lazily so later chunks use the size learned from earlier ones
+                while next_start <= end_block and len(pending) < self.max_workers:
+                    chunk_end = min(next_start + self.chunk_size - 1, end_block)
+                    pending.add(executor.submit(self._fetch_adaptive, get_logs, next_start, chunk_end))
+                    next_start = chunk_end + 1
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results.extend(future.result())
+        except Exception:
+            for future in pending:
+                future.cancel()
+            raise
+        results.sort(key=sort_key or (lambda log: (log['blockNumber'], log['logIndex'])))
+        return results
+
+    def stats(self):
+        with self._lock:
+            return {
+                'chunk_size': self.chunk_size,
+                'requests': self.requests,
+                'splits': self.splits,
+                'max_workers': self.max_workers
+            }
+
+
+log_fetcher = LogRangeFetcher(
+    initial_chunk=Config.LOG_CHUNK_SIZE,
+    target_logs=Config.LOG_TARGET_PER_REQUEST,
+    max_workers=Config.LOG_FETCH_WORKERS,
+    requests_per_second=Config.RPC_RATE_LIMIT
+)
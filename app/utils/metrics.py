@@ -0,0 +1,349 @@
+"""
+In-process counters, gauges and latency histograms, exposed in the
+Prometheus text format by `/metrics`.
+
+Recording is a dict lookup, a bisect over the bucket bounds and a few
+additions under a per-metric lock, about a microsecond, so the hot paths
+(RPC calls, DB batches, model steps, HTTP requests) stay instrumented in
+production. Values that other components already track, such as cache
+hit rates and queue depths, are read through callbacks at scrape time
+instead of being updated on every operation.
+"""
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import Config
+
+# Upper bounds, in seconds, of the latency histogram buckets
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, registry, name, documentation, labelnames=(), function=None):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.function = function
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def set_function(self, function):
+        """
+        Read the values from `function` at scrape time instead.
+
+        `function` returns a number for an unlabelled metric, otherwise a
+        dict keyed by tuples of label values.
+        """
+        self.function = function
+
+    def _samples(self):
+        if self.function is None:
+            with self._lock:
+                return list(self._values.items())
+        value = self.function()
+        if not isinstance(value, dict):
+            return [((), value)]
+        return list(value.items())
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for labels, value in self._samples():
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}')
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        with self._lock:
+            return self._values.get(labels, 0)
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, *labels):
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            self._values[labels] = value
+
+    def value(self, *labels):
+        with self._lock:
+            return self._values.get(labels)
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket latency histogram; per label set a bucket count list, a sum and a count."""
+
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        if not self.registry.enabled:
+            return
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, *labels):
+        """Context manager observing the duration of its block."""
+        return _Timer(self, labels)
+
+    def snapshot(self, *labels):
+        """`(count, sum)` observed for a label set."""
+        with self._lock:
+            state = self._values.get(labels)
+            return (state[2], state[1]) if state else (0, 0.0)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            states = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._values.items()]
+        for labels, counts, total, count in states:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = _format_labels(self.labelnames, labels, f'le="{_format_value(bound)}"')
+                lines.append(f'{self.name}_bucket{le} {cumulative}')
+            suffix = _format_labels(self.labelnames, labels)
+            lines.append(f'{self.name}_sum{suffix} {_format_value(total)}')
+            lines.append(f'{self.name}_count{suffix} {count}')
+        return lines
+
+
+class MetricsRegistry:
+    """
+    The set of metrics rendered by `/metrics`.
+
+    With `enabled` false every recording call returns immediately and
+    `/metrics` is not served.
+    """
+
+    def __init__(self, enabled=True, prefix='stablecoin_monitor_'):
+        self.enabled = enabled
+        self.prefix = prefix
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=(), function=None):
+        return self._add(Counter(self, self.prefix + name, documentation, labelnames, function))
+
+    def gauge(self, name, documentation, labelnames=(), function=None):
+        return self._add(Gauge(self, self.prefix + name, documentation, labelnames, function))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(self, self.prefix + name, documentation, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                # A failing callback must not take the whole scrape down
+                print(f"Error collecting metric {metric.name}: {str(e)}")
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry(enabled=Config.METRICS_ENABLED)
+
+rpc_seconds = metrics.histogram('rpc_request_seconds', 'JSON-RPC HTTP round trips by method', ['method'])
+rpc_calls = metrics.counter('rpc_calls_total', 'JSON-RPC calls by method, counting each call of a batch', ['method'])
+rpc_errors = metrics.counter('rpc_errors_total', 'Failed JSON-RPC requests by method', ['method'])
+db_seconds = metrics.histogram('db_operation_seconds', 'Transaction batch inserts and commits', ['operation'])
+db_rows = metrics.counter('db_rows_total', 'Transaction rows inserted or skipped as duplicates', ['result'])
+model_seconds = metrics.histogram('model_step_seconds', 'Anomaly model fit and score steps', ['detector', 'step'])
+model_rows = metrics.counter('model_rows_total', 'Rows fitted or scored by anomaly models', ['detector', 'step'])
+http_seconds = metrics.histogram('http_request_seconds', 'HTTP request handling time by route',
+                                 ['method', 'route'])
+http_requests = metrics.counter('http_requests_total', 'HTTP responses by route and status',
+                                ['method', 'route', 'status'])
+stage_seconds = metrics.histogram('pipeline_stage_seconds', 'Ingestion pipeline stage time per batch', ['stage'])
+head_block = metrics.gauge('ingest_head_block', 'Latest chain head seen by ingestion')
+committed_block = metrics.gauge('ingest_committed_block', 'Last block whose transfers are committed')
+lag_blocks = metrics.gauge('ingest_lag_blocks', 'Blocks between the chain head and the last committed block')
+queue_depth = metrics.gauge('queue_depth', 'Items waiting in internal queues', ['queue'])
+cache_hit_ratio = metrics.gauge('cache_hit_ratio', 'Hit rate of in-process caches since start', ['cache'])
+cache_size = metrics.gauge('cache_entries', 'Entries held by in-process caches', ['cache'])
+
+
+_queues = {}
+_caches = {}
+
+
+def register_queue(name, depth):
+    """Report `depth()` as the `queue_depth` of `name` at each scrape."""
+    _queues[name] = depth
+
+
+def register_cache(name, stats):
+    """Report the `hit_rate` and `size` of a cache's `stats()` dict at each scrape."""
+    _caches[name] = stats
+
+
+def _cache_values(key):
+    values = {}
+    for name, stats in list(_caches.items()):
+        value = stats().get(key)
+        if value is not None:
+            values[(name,)] = value
+    return values
+
+
+queue_depth.set_function(lambda: {(name,): depth() for name, depth in list(_queues.items())})
+cache_hit_ratio.set_function(lambda: _cache_values('hit_rate'))
+cache_size.set_function(lambda: _cache_values('size'))
+
+
+class _RPCTimer:
+    __slots__ = ('method', 'calls', 'started')
+
+    def __init__(self, method, calls):
+        self.method = method
+        self.calls = calls
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        rpc_seconds.observe(time.perf_counter() - self.started, self.method)
+        rpc_calls.inc(self.method, amount=self.calls)
+        if exc_type is not None:
+            rpc_errors.inc(self.method)
+
+
+def time_rpc(payload):
+    """
+    Context manager timing one JSON-RPC HTTP request (a single call or a
+    batch, labelled by the method of its first call); an exception leaving
+    the block counts as an error.
+    """
+    if isinstance(payload, list):
+        return _RPCTimer(payload[0]['method'] if payload else 'batch', len(payload))
+    return _RPCTimer(payload['method'], 1)
+
+
+def rpc_middleware(make_request, w3):
+    """web3 middleware timing every request made through a `Web3` instance."""
+    def middleware(method, params):
+        with time_rpc({'method': method}):
+            response = make_request(method, params)
+        if 'error' in response:
+            rpc_errors.inc(method)
+        return response
+    return middleware
+
+
+def record_ingest_position(head=None, committed=None):
+    """Update the head, committed block and lag gauges from whichever is known."""
+    if head is not None:
+        head_block.set(head)
+    if committed is not None:
+        committed_block.set(committed)
+    head, committed = head_block.value(), committed_block.value()
+    if head is not None and committed is not None:
+        lag_blocks.set(max(head - committed, 0))
+
+
+def instrument_app(app):
+    """Time every request of a Flask app, labelled by route pattern rather than raw path."""
+    from flask import g, request
+
+    @app.before_request
+    def start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def observe_request(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            http_seconds.observe(time.perf_counter() - started, request.method, route)
+            http_requests.inc(request.method, route, str(response.status_code))
+        return response
+
+    return app
+
+
+def serve_metrics(port, host='0.0.0.0'):
+    """
+    Serve `/metrics` from a background thread, for processes without the
+    Flask app's HTTP server such as `ingest.py`.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = metrics.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    return server
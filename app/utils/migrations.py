@@ -0,0 +1,168 @@
+from sqlalchemy import inspect, text
+
+from app import db
+
+
+def ensure_columns():
+    """
+    Add nullable columns declared on the models but missing from existing tables.
+
+    New columns are always added as nullable so old rows stay valid; the
+    names of the added columns are returned as `table.column`.
+    """
+    inspector = inspect(db.engine)
+    added = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            with db.engine.begin() as connection:
+                connection.execute(text(
+                    f'ALTER TABLE {db.engine.dialect.identifier_preparer.quote(table.name)} '
+                    f'ADD COLUMN {db.engine.dialect.identifier_preparer.quote(column.name)} {column_type}'
+                ))
+            added.append(f'{table.name}.{column.name}')
+    return added
+
+
+def ensure_indexes():
+    """
+    Create any index declared on the models that the database is missing.
+
+    `db.create_all()` only creates indexes together with new tables, so
+    databases created before an index was added (such as an existing
+    `stablecoin_monitor.db`) are upgraded here. Returns the created names.
+    """
+    inspector = inspect(db.engine)
+    created = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=db.engine)
+                created.append(index.name)
+    return created
+
+
+def _unique_column_sets(inspector, table_name):
+    sets = [tuple(constraint['column_names']) for constraint in inspector.get_unique_constraints(table_name)]
+    sets += [tuple(index['column_names']) for index in inspector.get_indexes(table_name) if index['unique']]
+    return sets
+
+
+def _rebuild_sqlite_table(table):
+    """
+    Recreate a SQLite table from its model definition, keeping its rows.
+
+    SQLite cannot drop a constraint in place, so the table is renamed,
+    recreated with the current constraints and indexes, and the shared
+    columns copied over in one transaction.
+    """
+    inspector = inspect(db.engine)
+    quote = db.engine.dialect.identifier_preparer.quote
+    old_name = f'{table.name}_old'
+    existing = {column['name'] for column in inspector.get_columns(table.name)}
+    columns = ', '.join(quote(column.name) for column in table.columns if column.name in existing)
+    with db.engine.begin() as connection:
+        for index in inspector.get_indexes(table.name):
+            connection.execute(text(f'DROP INDEX {quote(index["name"])}'))
+        connection.execute(text(f'ALTER TABLE {quote(table.name)} RENAME TO {quote(old_name)}'))
+        table.create(connection)
+        connection.execute(text(f'INSERT INTO {quote(table.name)} ({columns}) '
+                                f'SELECT {columns} FROM {quote(old_name)}'))
+        connection.execute(text(f'DROP TABLE {quote(old_name)}'))
+
+
+def ensure_transfer_key():
+    """
+    Replace the legacy unique `tx_hash` key of Transaction by `(tx_hash, log_index)`.
+
+    A transaction can emit several Transfer logs (several tokens, or a
+    batch transfer), which the old key silently dropped. Returns True when
+    the table was migrated.
+    """
+    from app.models import Transaction
+
+    table = Transaction.__table__
+    inspector = inspect(db.engine)
+    if not inspector.has_table(table.name) or ('tx_hash',) not in _unique_column_sets(inspector, table.name):
+        return False
+    if db.engine.dialect.name == 'sqlite':
+        _rebuild_sqlite_table(table)
+        return True
+    quote = db.engine.dialect.identifier_preparer.quote
+    with db.engine.begin() as connection:
+        for constraint in inspector.get_unique_constraints(table.name):
+            if constraint['column_names'] == ['tx_hash']:
+                connection.execute(text(f'ALTER TABLE {quote(table.name)} DROP CONSTRAINT {quote(constraint["name"])}'))
+        for index in inspector.get_indexes(table.name):
+            if index['unique'] and index['column_names'] == ['tx_hash']:
+                connection.execute(text(f'DROP INDEX {quote(index["name"])}'))
+        connection.execute(text(f'ALTER TABLE {quote(table.name)} ADD CONSTRAINT uq_transaction_log '
+                                f'UNIQUE (tx_hash, log_index)'))
+    return True
+
+
+def backfill_token_address(default_token):
+    """Attribute transactions stored before multi-token monitoring to `default_token`."""
+    from app.models import Transaction
+
+    updated = Transaction.query.filter(Transaction.token_address.is_(None)).update(
+        {Transaction.token_address: default_token}, synchronize_session=False)
+    db.session.commit()
+    return updated
+
+
+def ensure_rollup_tokens():
+    """
+    Drop a rollup table that predates the token dimension.
+
+    Rollups are derived data: the table is recreated empty and rebuilt
+    from transactions by `ensure_rollups`. Returns True when dropped.
+    """
+    from app.models import TransactionRollup
+
+    table = TransactionRollup.__table__
+    inspector = inspect(db.engine)
+    if not inspector.has_table(table.name):
+        return False
+    if 'token_address' in {column['name'] for column in inspector.get_columns(table.name)}:
+        return False
+    table.drop(db.engine)
+    table.create(db.engine)
+    return True
+
+
+def migrate_database(default_token):
+    """
+    Upgrade an existing database to the current models.
+
+    Run by the ingesting entry points (`ingest.py`, `run.py` when it
+    ingests, `init_db.py` and the scripts) inside an app context rather than
+    by every `create_app`, so API workers and tests never rewrite the
+    database file. `default_token` is the token legacy transactions are
+    attributed to.
+    """
+    from app.utils.rollups import ensure_rollups
+
+    db.create_all()
+    if ensure_transfer_key():
+        print("Migrated transaction key to (tx_hash, log_index)")
+    if ensure_rollup_tokens():
+        print("Recreated rollup table with a token dimension")
+    added = ensure_columns()
+    if added:
+        print(f"Added missing columns: {', '.join(added)}")
+    backfilled = backfill_token_address(default_token)
+    if backfilled:
+        print(f"Attributed {backfilled} existing transactions to USDC")
+    created = ensure_indexes()
+    if created:
+        print(f"Created missing indexes: {', '.join(created)}")
+    ensure_rollups()
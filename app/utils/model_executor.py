@@ -0,0 +1,352 @@
+"""
+Model training and bulk scoring in a separate worker process.
+
+IsolationForest fits hold the GIL for their whole duration, so running
+them in the ingestion thread stalls both the next ingest cycle and every
+Flask request thread of the process. With MODEL_EXECUTOR='process' fits
+and `score_samples` calls run in one long-lived worker process instead:
+
+- Feature matrices are handed over in shared memory (one copy into a
+  `SharedMemory` block, no pickling of the array); scores come back
+  the same way. Only the estimator itself is pickled, and a fitted model
+  stays cached in the worker, so scoring with it again sends no model.
+- Every job is time-bounded (MODEL_FIT_TIMEOUT / MODEL_SCORE_TIMEOUT) and
+  can be cancelled; both terminate the worker, which is restarted on the
+  next job. The caller gets `ModelJobCancelled` and keeps using the
+  model it had, so a fitted model is only ever swapped in once complete.
+- Whole detection passes can be queued with `submit` on a background
+  thread, so the ingestion cycle hands them off and moves on.
+
+MODEL_EXECUTOR='inline' keeps the previous behaviour of fitting and
+scoring in the calling thread (without timeouts).
+"""
+import itertools
+import multiprocessing
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from config import Config
+
+EXECUTOR_MODES = ('process', 'inline')
+# Seconds between checks for cancellation while waiting on the worker
+POLL_INTERVAL = 0.05
+
+
+class ModelJobError(Exception):
+    """A model job failed inside the worker process."""
+
+
+class ModelJobCancelled(ModelJobError):
+    """A model job was cancelled or ran past its timeout; the worker was terminated."""
+
+
+def _share(array):
+    """Copy `array` into a new shared memory block; returns the block and its descriptor."""
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+    return block, (block.name, array.shape, array.dtype.str)
+
+
+def _release(block):
+    block.close()
+    block.unlink()
+
+
+def _attach(descriptor):
+    name, shape, dtype = descriptor
+    block = shared_memory.SharedMemory(name=name)
+    return block, np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+
+def _worker_main(connection, max_models):
+    """Worker process loop: fit and score jobs read from `connection` until it closes."""
+    models = {}
+    while True:
+        try:
+            job_id, op, payload = connection.recv()
+        except EOFError:
+            return
+        try:
+            if op == 'fit':
+                name, estimator, descriptor = payload
+                block, features = _attach(descriptor)
+                try:
+                    estimator.fit(features)
+                finally:
+                    del features
+                    block.close()
+                models.pop(name, None)
+                models[name] = estimator
+                while len(models) > max_models:
+                    models.pop(next(iter(models)))
+                result = estimator
+            elif op == 'score':
+                name, model, descriptor, out_descriptor = payload
+                if model is None:
+                    model = models[name]
+                else:
+                    models.pop(name, None)
+                    models[name] = model
+                block, features = _attach(descriptor)
+                out_block, out = _attach(out_descriptor)
+                try:
+                    out[...] = model.score_samples(features)
+                finally:
+                    del features, out
+                    block.close()
+                    out_block.close()
+                result = None
+            else:
+                raise ValueError(f"Unknown model job {op!r}")
+        except Exception as e:
+            connection.send((job_id, False, f'{type(e).__name__}: {e}'))
+        else:
+            connection.send((job_id, True, result))
+
+
+class ModelExecutor:
+    """
+    Runs fits and bulk scoring in a worker process, one job at a time.
+
+    Parameters
+    ----------
+    mode : str, optional
+        'process' or 'inline', by default `Config.MODEL_EXECUTOR`.
+    """
+
+    def __init__(self, mode=None):
+        self.mode = (mode or Config.MODEL_EXECUTOR).lower()
+        if self.mode not in EXECUTOR_MODES:
+            raise ValueError(f"Unknown MODEL_EXECUTOR {self.mode!r}, expected one of {', '.join(EXECUTOR_MODES)}")
+        self._context = multiprocessing.get_context('spawn')
+        self._process = None
+        self._connection = None
+        # Models the worker holds, by name; the identity check tells whether to resend
+        self._worker_models = {}
+        self._job_lock = threading.Lock()
+        self._job_ids = itertools.count(1)
+        self._running = None
+        self._cancel = threading.Event()
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.workers_started = 0
+
+        self._background = queue.Queue()
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        self._background_running = None
+        self._dispatcher = None
+
+    @property
+    def in_process(self):
+        return self.mode == 'process'
+
+    def _ensure_worker(self):
+        if self._process is not None and self._process.is_alive():
+            return
+        parent, child = self._context.Pipe()
+        self._process = self._context.Process(target=_worker_main, args=(child, Config.MODEL_EXECUTOR_CACHE_SIZE),
+                                              name='model-worker', daemon=True)
+        self._process.start()
+        child.close()
+        self._connection = parent
+        self._worker_models = {}
+        self.workers_started += 1
+
+    def _terminate(self):
+        if self._process is not None and self._process.is_alive():
+            self._process.terminate()
+            self._process.join()
+        if self._connection is not None:
+            self._connection.close()
+        self._process = None
+        self._connection = None
+        self._worker_models = {}
+
+    def start(self):
+        """Start the worker ahead of the first job; it takes seconds to import scikit-learn."""
+        if self.in_process:
+            with self._job_lock:
+                self._ensure_worker()
+        return self
+
+    def _remember(self, name, model):
+        # Mirrors the worker's cache, including its eviction order
+        self._worker_models.pop(name, None)
+        self._worker_models[name] = model
+        while len(self._worker_models) > Config.MODEL_EXECUTOR_CACHE_SIZE:
+            self._worker_models.pop(next(iter(self._worker_models)))
+
+    def _call(self, op, name, make_payload, timeout, model=None):
+        """
+        Send one job to the worker and wait for its result, the timeout or a
+        cancel. `make_payload` builds the job once the worker is running;
+        `model` is the model a score job leaves cached in the worker.
+        """
+        with self._job_lock:
+            self._ensure_worker()
+            self._cancel.clear()
+            self._running = (op, name)
+            job_id = next(self._job_ids)
+            deadline = time.monotonic() + timeout if timeout else None
+            try:
+                payload = make_payload()
+                self._connection.send((job_id, op, payload))
+                while not self._connection.poll(POLL_INTERVAL):
+                    if self._cancel.is_set():
+                        reason = 'cancelled'
+                    elif deadline is not None and time.monotonic() > deadline:
+                        reason = f'timed out after {timeout}s'
+                    elif not self._process.is_alive():
+                        reason = f'worker exited with code {self._process.exitcode}'
+                    else:
+                        continue
+                    self._terminate()
+                    self.cancelled += 1
+                    raise ModelJobCancelled(f"Model {op} of {name} {reason}")
+                _, ok, result = self._connection.recv()
+                if ok and op == 'fit':
+                    self._remember(name, result)
+                elif ok and payload[1] is not None:
+                    self._remember(name, model)
+            except (EOFError, OSError) as e:
+                self._terminate()
+                self.failed += 1
+                raise ModelJobError(f"Model worker failed during {op} of {name}: {e}")
+            finally:
+                self._running = None
+        if not ok:
+            self.failed += 1
+            raise ModelJobError(f"Model {op} of {name} failed: {result}")
+        self.completed += 1
+        return result
+
+    def fit(self, name, estimator, features, timeout=None):
+        """
+        Fit `estimator` on `features` and return the fitted estimator.
+
+        Parameters
+        ----------
+        name : str
+            Model name; the worker keeps the fitted model under it for
+            later `score_samples` calls.
+        estimator : object
+            Unfitted scikit-learn estimator.
+        features : numpy.ndarray
+            Training matrix, shared with the worker rather than pickled.
+        timeout : float, optional
+            Seconds before the fit is abandoned, by default MODEL_FIT_TIMEOUT.
+
+        Raises
+        ------
+        ModelJobCancelled
+            When the fit was cancelled or timed out.
+        """
+        features = np.ascontiguousarray(features, dtype=np.float64)
+        if not self.in_process:
+            return estimator.fit(features)
+        block, descriptor = _share(features)
+        try:
+            return self._call('fit', name, lambda: (name, estimator, descriptor),
+                              timeout or Config.MODEL_FIT_TIMEOUT)
+        finally:
+            _release(block)
+
+    def score_samples(self, name, model, features, timeout=None):
+        """`model.score_samples(features)`, computed in the worker."""
+        features = np.ascontiguousarray(features, dtype=np.float64)
+        if not self.in_process:
+            return model.score_samples(features)
+        block, descriptor = _share(features)
+        out_block, out_descriptor = _share(np.empty(len(features)))
+        # Only ship the model when the worker does not hold this very object
+        make_payload = lambda: (name, None if self._worker_models.get(name) is model else model,
+                                descriptor, out_descriptor)
+        try:
+            self._call('score', name, make_payload, timeout or Config.MODEL_SCORE_TIMEOUT, model)
+            return np.ndarray(len(features), dtype=np.float64, buffer=out_block.buf).copy()
+        finally:
+            _release(block)
+            _release(out_block)
+
+    def cancel(self):
+        """Cancel the running job, if any; returns whether one was running."""
+        if self._running is None:
+            return False
+        self._cancel.set()
+        return True
+
+    def submit(self, name, func, *args, **kwargs):
+        """
+        Queue `func` to run on the background thread inside an app context.
+
+        Submissions are coalesced by `name`: while a job of that name is
+        still queued another one is not added. A job already running does
+        not block a new submission, so work arriving meanwhile is picked
+        up by the next run.
+
+        Returns
+        -------
+        bool
+            Whether the job was queued.
+        """
+        from flask import current_app
+
+        with self._pending_lock:
+            if name in self._pending:
+                return False
+            self._pending.add(name)
+            if self._dispatcher is None or not self._dispatcher.is_alive():
+                self._dispatcher = threading.Thread(target=self._dispatch, name='model-executor', daemon=True)
+                self._dispatcher.start()
+        self._background.put((current_app._get_current_object(), name, func, args, kwargs))
+        return True
+
+    def _dispatch(self):
+        while True:
+            app, name, func, args, kwargs = self._background.get()
+            with self._pending_lock:
+                self._pending.discard(name)
+            self._background_running = name
+            try:
+                with app.app_context():
+                    func(*args, **kwargs)
+            except Exception as e:
+                print(f"Error in background model job {name}: {str(e)}")
+            finally:
+                self._background_running = None
+                self._background.task_done()
+
+    def join(self):
+        """Wait until every queued background job has finished."""
+        self._background.join()
+
+    def depth(self):
+        return self._background.qsize()
+
+    def shutdown(self):
+        """Terminate the worker process; it is started again by the next job."""
+        with self._job_lock:
+            self._terminate()
+
+    def stats(self):
+        running = self._running
+        return {
+            'mode': self.mode,
+            'worker_pid': self._process.pid if self._process is not None else None,
+            'running': f'{running[0]} {running[1]}' if running else None,
+            'background_running': self._background_running,
+            'background_queued': self.depth(),
+            'completed': self.completed,
+            'failed': self.failed,
+            'cancelled': self.cancelled,
+            'workers_started': self.workers_started
+        }
+
+
+model_executor = ModelExecutor()
@@ -0,0 +1,167 @@
+import json
+import os
+import threading
+from datetime import datetime
+
+import joblib
+import numpy as np
+
+from config import Config
+
+
+class ModelRegistry:
+    """
+    Versioned on-disk store of fitted anomaly models.
+
+    Each model name gets its own directory holding one `v<N>.joblib` file
+    per version (the last MODEL_KEEP_VERSIONS) and a `latest.json` metadata file with the version, the
+    feature schema, when it was trained, the training window and the
+    feature statistics used for drift checks. The latest version of every
+    model is also kept in memory so scoring never touches the disk.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _model_dir(self, name):
+        return os.path.join(self.directory, name.replace(':', '_'))
+
+    def _metadata_path(self, name):
+        return os.path.join(self._model_dir(name), 'latest.json')
+
+    def save(self, name, model, feature_names, features, window=None, extra=None):
+        """
+        Persist a newly fitted model as the next version of `name`.
+
+        Parameters
+        ----------
+        name : str
+            Model name, e.g. 'transactions'.
+        model : object
+            Fitted estimator.
+        feature_names : list
+            Names of the feature columns, in order.
+        features : numpy.ndarray
+            The training matrix, used to record drift statistics.
+        window : dict, optional
+            Description of the training window (row count, block range...).
+        extra : dict, optional
+            Additional metadata needed to score with this model.
+
+        Returns
+        -------
+        dict
+            The metadata written for the new version.
+        """
+        _, current = self.load(name)
+        version = current['version'] + 1 if current else 1
+        features = np.asarray(features, dtype=np.float64)
+        metadata = {
+            'name': name,
+            'version': version,
+            'feature_names': list(feature_names),
+            'trained_at': datetime.utcnow().isoformat(),
+            'training_window': window or {'rows': int(len(features))},
+            'feature_mean': features.mean(axis=0).tolist(),
+            'feature_std': features.std(axis=0).tolist()
+        }
+        metadata.update(extra or {})
+
+        model_dir = self._model_dir(name)
+        os.makedirs(model_dir, exist_ok=True)
+        joblib.dump(model, os.path.join(model_dir, f'v{version}.joblib'))
+        tmp_path = self._metadata_path(name) + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(metadata, f)
+        os.replace(tmp_path, self._metadata_path(name))
+        self._prune(model_dir, version)
+
+        with self._lock:
+            self._models[name] = (model, metadata)
+        return metadata
+
+    def _prune(self, model_dir, version):
+        """Delete model files older than the last MODEL_KEEP_VERSIONS versions."""
+        oldest = version - max(Config.MODEL_KEEP_VERSIONS, 1)
+        for entry in os.listdir(model_dir):
+            stem, ext = os.path.splitext(entry)
+            if ext == '.joblib' and stem[1:].isdigit() and int(stem[1:]) <= oldest:
+                try:
+                    os.remove(os.path.join(model_dir, entry))
+                except OSError:
+                    pass
+
+    def load(self, name):
+        """Return `(model, metadata)` for the latest version, or `(None, None)`."""
+        with self._lock:
+            if name in self._models:
+                return self._models[name]
+        try:
+            with open(self._metadata_path(name)) as f:
+                metadata = json.load(f)
+            model = joblib.load(os.path.join(self._model_dir(name), f"v{metadata['version']}.joblib"))
+        except (OSError, ValueError, KeyError):
+            return None, None
+        with self._lock:
+            self._models[name] = (model, metadata)
+        return model, metadata
+
+    def clear(self):
+        """Forget the in-memory models; they are reloaded from disk on demand."""
+        with self._lock:
+            self._models.clear()
+
+    def warm_load(self):
+        """Load the latest version of every model on disk into memory."""
+        if not os.path.isdir(self.directory):
+            return []
+        loaded = []
+        for entry in os.listdir(self.directory):
+            if os.path.exists(os.path.join(self.directory, entry, 'latest.json')):
+                model, metadata = self.load(entry)
+                if model is not None:
+                    loaded.append(metadata['name'])
+        return loaded
+
+    def needs_retrain(self, name, feature_names, features, now=None):
+        """
+        Decide whether the cached model for `name` should be refit.
+
+        Returns
+        -------
+        tuple
+            `(bool, reason)` where reason is one of 'missing', 'schema',
+            'schedule', 'drift' or None.
+        """
+        model, metadata = self.load(name)
+        if model is None:
+            return True, 'missing'
+        if metadata['feature_names'] != list(feature_names):
+            return True, 'schema'
+        now = now or datetime.utcnow()
+        age = (now - datetime.fromisoformat(metadata['trained_at'])).total_seconds()
+        if age > Config.MODEL_RETRAIN_INTERVAL:
+            return True, 'schedule'
+        if detect_drift(metadata, features):
+            return True, 'drift'
+        return False, None
+
+
+def detect_drift(metadata, features, threshold=None):
+    """
+    Flag drift when any feature mean moved more than `threshold` training
+    standard deviations away from its training mean.
+    """
+    threshold = Config.MODEL_DRIFT_THRESHOLD if threshold is None else threshold
+    features = np.asarray(features, dtype=np.float64)
+    if len(features) == 0:
+        return False
+    train_mean = np.asarray(metadata['feature_mean'])
+    train_std = np.asarray(metadata['feature_std'])
+    shift = np.abs(features.mean(axis=0) - train_mean) / np.where(train_std > 0, train_std, 1.0)
+    return bool((shift > threshold).any())
+
+
+model_registry = ModelRegistry(Config.MODEL_DIR)
@@ -0,0 +1,120 @@
+"""
+Sampling profiler that can be switched on and off in a running process.
+
+A background thread snapshots the stacks of every other thread with
+`sys._current_frames()` every `interval` seconds and counts identical
+stacks. Nothing is hooked into the profiled code, so the cost is one stack
+walk per thread per sample while running and zero while stopped. Output is
+the collapsed-stack format read by flamegraph.pl and speedscope.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from config import Config
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f'{os.path.basename(code.co_filename)}:{code.co_name}'
+
+
+class SamplingProfiler:
+    def __init__(self, interval=None, max_stacks=None):
+        self.interval = interval or Config.PROFILER_INTERVAL
+        self.max_stacks = max_stacks or Config.PROFILER_MAX_STACKS
+        self._stacks = Counter()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.samples = 0
+        self.truncated = 0
+        self.started_at = None
+        self.stops_at = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval=None, duration=None, reset=True):
+        """
+        Start sampling, for `duration` seconds or until `stop()`.
+
+        Returns False if the profiler was already running.
+        """
+        if interval is not None and not interval > 0:
+            raise ValueError(f"Sampling interval must be positive, got {interval}")
+        with self._lock:
+            if self.running:
+                return False
+            if reset:
+                self._stacks.clear()
+                self.samples = self.truncated = 0
+            self.interval = interval or self.interval
+            self.started_at = time.time()
+            self.stops_at = time.monotonic() + duration if duration else None
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def _sample(self, own_id):
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            names = []
+            while frame is not None:
+                names.append(_frame_name(frame))
+                frame = frame.f_back
+            stack = ';'.join(reversed(names))
+            with self._lock:
+                if stack in self._stacks or len(self._stacks) < self.max_stacks:
+                    self._stacks[stack] += 1
+                else:
+                    self.truncated += 1
+        self.samples += 1
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            if self.stops_at is not None and time.monotonic() >= self.stops_at:
+                break
+            self._sample(own_id)
+
+    def collapsed(self):
+        """`stack count` lines, root frame first, most sampled stacks first."""
+        with self._lock:
+            return ''.join(f'{stack} {count}\n' for stack, count in self._stacks.most_common())
+
+    def top(self, limit=20):
+        """Functions by the share of samples they were on top of the stack (self time)."""
+        leaves = Counter()
+        with self._lock:
+            for stack, count in self._stacks.items():
+                leaves[stack.rsplit(';', 1)[-1]] += count
+        total = sum(leaves.values())
+        return [{'function': name, 'samples': count, 'share': count / total}
+                for name, count in leaves.most_common(limit)]
+
+    def stats(self):
+        with self._lock:
+            stacks = len(self._stacks)
+        return {
+            'running': self.running,
+            'interval': self.interval,
+            'samples': self.samples,
+            'stacks': stacks,
+            'truncated': self.truncated,
+            'started_at': self.started_at
+        }
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,156 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, request
+
+from config import Config
+
+WATERMARK_KEY = '__ingest_watermark__'
+
+
+class CacheBackend:
+    """
+    Storage interface for the response cache.
+
+    The default in-process LRU is enough for a single worker. Multi-worker
+    deployments can implement these three methods on a shared store (for
+    example Redis) so every worker sees the same entries and watermark.
+    """
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class LRUCacheBackend(CacheBackend):
+    """Thread-safe in-process LRU with optional per-entry TTL."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class ResponseCache:
+    """
+    Caches JSON endpoint responses until ingestion or scoring commits.
+
+    Entries are keyed by endpoint, query string and the ingest watermark
+    (last committed block and scoring version). Bumping the watermark makes
+    every existing key unreachable, which is how commits invalidate the
+    cache. The ETag is derived from the same key, so a conditional request
+    whose `If-None-Match` still matches is answered 304 before any DB work.
+    """
+
+    def __init__(self, backend=None, ttl=None):
+        self.backend = backend or LRUCacheBackend(Config.RESPONSE_CACHE_SIZE)
+        self.ttl = Config.RESPONSE_CACHE_TTL if ttl is None else ttl
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self._lock = threading.Lock()
+
+    def watermark(self):
+        return self.backend.get(WATERMARK_KEY) or {'block': None, 'scoring_version': 0, 'sequence': 0}
+
+    def bump_watermark(self, block=None, scoring_version=None):
+        """Record a commit by ingestion (`block`) or anomaly scoring (`scoring_version`)."""
+        with self._lock:
+            watermark = dict(self.watermark())
+            if block is not None:
+                watermark['block'] = block
+            if scoring_version is not None:
+                watermark['scoring_version'] = scoring_version
+            # The sequence also changes on commits that keep block and version,
+            # such as scoring new rows with an unchanged model
+            watermark['sequence'] += 1
+            self.backend.set(WATERMARK_KEY, watermark)
+
+    def _key(self, endpoint, args):
+        watermark = self.watermark()
+        # Time-relative windows (e.g. "last 24h") drift even without commits,
+        # so keys and ETags also roll over once per TTL period
+        epoch = int(time.time() // self.ttl) if self.ttl else 0
+        raw = json.dumps([endpoint, sorted(args.items(multi=True)), watermark, epoch], default=str)
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_modified': self.not_modified,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'watermark': self.watermark()
+            }
+
+    def cached(self, view):
+        """Decorator for GET endpoints whose output only changes on commits."""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = self._key(request.endpoint, request.args)
+            if request.if_none_match.contains(key):
+                with self._lock:
+                    self.not_modified += 1
+                response = Response(status=304)
+                response.set_etag(key)
+                return response
+
+            entry = self.backend.get(key)
+            with self._lock:
+                if entry is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+            if entry is None:
+                response = view(*args, **kwargs)
+                # Errors and streamed exports are passed through uncached
+                if isinstance(response, tuple) or response.status_code != 200 or response.is_streamed:
+                    return response
+                entry = {'body': response.get_data(), 'mimetype': response.mimetype,
+                         'headers': {k: v for k, v in response.headers.items()
+                                     if k in ('X-Next-Cursor', 'Link')}}
+                self.backend.set(key, entry, self.ttl)
+
+            response = Response(entry['body'], mimetype=entry['mimetype'], headers=entry['headers'])
+            response.set_etag(key)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+
+
+response_cache = ResponseCache()
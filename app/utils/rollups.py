@@ -0,0 +1,217 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from app.models import Transaction, TransactionRollup
+from app.utils.storage import writes
+from config import Config
+
+GRANULARITIES = ('minute', 'hour', 'day')
+
+_CONFLICT_INSERTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert
+}
+
+
+def truncate(timestamp, granularity):
+    """Return the start of the bucket `timestamp` falls into."""
+    if granularity == 'minute':
+        return timestamp.replace(second=0, microsecond=0)
+    if granularity == 'hour':
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    if granularity == 'day':
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"Unknown rollup granularity: {granularity}")
+
+
+def _new_delta():
+    return [0.0, 0, 0]
+
+
+def _token(token_address):
+    # Rows stored before multi-token monitoring are USDC transfers
+    return token_address or Config.USDC_CONTRACT_ADDRESS
+
+
+def deltas_for_rows(rows):
+    """
+    Aggregate inserted Transaction rows into per-bucket deltas.
+
+    Returns
+    -------
+    dict
+        Mapping of `(granularity, bucket_start, token_address)` to
+        `[volume, count, anomalies]`.
+    """
+    deltas = defaultdict(_new_delta)
+    for row in rows:
+        token = _token(row.get('token_address'))
+        for granularity in GRANULARITIES:
+            delta = deltas[(granularity, truncate(row['timestamp'], granularity), token)]
+            delta[0] += row['amount']
+            delta[1] += 1
+            delta[2] += 1 if row.get('is_anomaly') else 0
+    return deltas
+
+
+def deltas_for_anomaly_changes(changes):
+    """
+    Build anomaly-count deltas from `(timestamp, token_address, was_anomaly,
+    is_anomaly)` tuples.
+    """
+    deltas = defaultdict(_new_delta)
+    for timestamp, token_address, was_anomaly, is_anomaly in changes:
+        change = int(bool(is_anomaly)) - int(bool(was_anomaly))
+        if not change:
+            continue
+        token = _token(token_address)
+        for granularity in GRANULARITIES:
+            deltas[(granularity, truncate(timestamp, granularity), token)][2] += change
+    return deltas
+
+
+def apply_deltas(deltas):
+    """
+    Add deltas to the rollup table in the current transaction.
+
+    Uses multi-row `INSERT ... ON CONFLICT DO UPDATE` statements on SQLite
+    and PostgreSQL; the caller commits.
+    """
+    if not deltas:
+        return
+    table = TransactionRollup.__table__
+    values = [{
+        'granularity': granularity,
+        'bucket_start': bucket_start,
+        'token_address': token_address,
+        'volume': volume,
+        'count': count,
+        'anomaly_count': anomalies
+    } for (granularity, bucket_start, token_address), (volume, count, anomalies) in deltas.items()]
+
+    insert = _CONFLICT_INSERTS.get(db.engine.dialect.name)
+    if insert is not None:
+        for i in range(0, len(values), Config.INSERT_BATCH_SIZE):
+            stmt = insert(table).values(values[i:i + Config.INSERT_BATCH_SIZE])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['granularity', 'bucket_start', 'token_address'],
+                set_={
+                    'volume': table.c.volume + stmt.excluded.volume,
+                    'count': table.c.count + stmt.excluded.count,
+                    'anomaly_count': table.c.anomaly_count + stmt.excluded.anomaly_count
+                }
+            )
+            db.session.execute(stmt)
+        return
+
+    for value in values:
+        result = db.session.execute(
+            table.update()
+            .where(table.c.granularity == value['granularity'])
+            .where(table.c.bucket_start == value['bucket_start'])
+            .where(table.c.token_address == value['token_address'])
+            .values(volume=table.c.volume + value['volume'],
+                    count=table.c.count + value['count'],
+                    anomaly_count=table.c.anomaly_count + value['anomaly_count'])
+        )
+        if not result.rowcount:
+            db.session.execute(table.insert().values(value))
+
+
+def update_rollups(rows):
+    """Add newly inserted Transaction rows to their buckets."""
+    apply_deltas(deltas_for_rows(rows))
+
+
+@writes
+def prune_minute_buckets(now=None):
+    """Drop minute buckets older than ROLLUP_MINUTE_RETENTION hours."""
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(hours=Config.ROLLUP_MINUTE_RETENTION)
+    TransactionRollup.query.filter(
+        TransactionRollup.granularity == 'minute',
+        TransactionRollup.bucket_start < cutoff
+    ).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def rebuild_rollups():
+    """
+    Recompute every rollup bucket from the Transaction table.
+
+    Used to seed rollups for an existing database and after bulk loads that
+    bypass incremental updates. Rows are streamed so memory stays flat.
+    """
+    TransactionRollup.query.delete(synchronize_session=False)
+    query = db.session.query(Transaction.timestamp, Transaction.token_address, Transaction.amount,
+                             Transaction.is_anomaly)
+    deltas = deltas_for_rows(
+        {'timestamp': timestamp, 'token_address': token_address, 'amount': amount, 'is_anomaly': is_anomaly}
+        for timestamp, token_address, amount, is_anomaly in query.yield_per(10000)
+    )
+    apply_deltas(deltas)
+    db.session.commit()
+    return len(deltas)
+
+
+def ensure_rollups():
+    """Seed the rollup table when transactions exist but no rollups have been built."""
+    if TransactionRollup.query.first() is None and Transaction.query.first() is not None:
+        buckets = rebuild_rollups()
+        print(f"Built {buckets} rollup buckets from existing transactions")
+
+
+def window_summary(start, end=None, token_address=None):
+    """
+    Summarize transactions with `timestamp >= start` from rollups.
+
+    Whole hours come from hourly buckets and the partial first hour from
+    minute buckets, so the cost depends on the number of buckets only.
+    `token_address` restricts the summary to one token.
+
+    Returns
+    -------
+    dict
+        `hourly_data` keyed by hour start, plus `total_volume`,
+        `total_transactions`, `anomaly_count` and the same totals per
+        token address under `tokens`.
+    """
+    first_hour = truncate(start, 'hour')
+    first_full_hour = first_hour if start == first_hour else first_hour + timedelta(hours=1)
+    rollup = TransactionRollup
+
+    minute_query = rollup.query.filter(
+        rollup.granularity == 'minute',
+        rollup.bucket_start >= truncate(start, 'minute'),
+        rollup.bucket_start < first_full_hour
+    )
+    hour_query = rollup.query.filter(
+        rollup.granularity == 'hour',
+        rollup.bucket_start >= first_full_hour
+    )
+    if end is not None:
+        hour_query = hour_query.filter(rollup.bucket_start < end)
+    if token_address is not None:
+        minute_query = minute_query.filter(rollup.token_address == token_address)
+        hour_query = hour_query.filter(rollup.token_address == token_address)
+
+    hourly_data = {}
+    tokens = {}
+    for bucket in minute_query.all() + hour_query.order_by(rollup.bucket_start).all():
+        hour = truncate(bucket.bucket_start, 'hour')
+        for data in (hourly_data.setdefault(hour, {'volume': 0, 'count': 0, 'anomalies': 0}),
+                     tokens.setdefault(bucket.token_address, {'volume': 0, 'count': 0, 'anomalies': 0})):
+            data['volume'] += bucket.volume
+            data['count'] += bucket.count
+            data['anomalies'] += bucket.anomaly_count
+
+    return {
+        'hourly_data': hourly_data,
+        'tokens': tokens,
+        'total_volume': sum(data['volume'] for data in hourly_data.values()),
+        'total_transactions': sum(data['count'] for data in hourly_data.values()),
+        'anomaly_count': sum(data['anomalies'] for data in hourly_data.values())
+    }
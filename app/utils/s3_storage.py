@@ -1,10 +1,13 @@
-import boto3
-import json
-import os
+from config import Config
+from app.utils.archive import ArchiveWriter, S3Backend
 
 def store_transactions_to_s3(transactions, bucket_name):
     """
-    Stores a list of transactions in an S3 bucket as a JSON file.
+    Stores a list of transactions in the S3 archive of an S3 bucket.
+
+    Transactions are streamed into hour-partitioned, compressed files
+    (Parquet, or gzipped NDJSON without pyarrow) through multipart
+    uploads; see `app.utils.archive.ArchiveWriter`.
 
     Parameters
     ----------
@@ -15,16 +18,8 @@ def store_transactions_to_s3(transactions, bucket_name):
 
     Returns
     -------
-    str
-        The key of the stored JSON file in the S3 bucket.
+    list
+        The keys of the archive files written, one per hour of transactions.
     """
-
-    s3 = boto3.client('s3')
-    timestamp = transactions[0]['timestamp'] if transactions else 'default'
-    key = f'transactions/{timestamp}.json'
-    s3.put_object(
-        Bucket=bucket_name,
-        Key=key,
-        Body=json.dumps(transactions)
-    )
-    return key
\ No newline at end of file
+    writer = ArchiveWriter(S3Backend(bucket_name), prefix=Config.ARCHIVE_PREFIX)
+    return writer.write(transactions)
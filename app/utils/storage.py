@@ -0,0 +1,320 @@
+"""
+Storage modes: engine tuning, read/write routing and bulk loading.
+
+- 'wal' (SQLite files): WAL journal and tuned pragmas on every connection,
+  all ingestion writes funnelled through one writer thread, and GET
+  requests served from a separate pool of read-only connections, so
+  readers never take locks the writer has to wait for.
+- 'postgresql': a sized connection pool with pre-ping, recycling and a
+  statement timeout, and large transaction batches bulk-loaded with COPY.
+- 'default': the plain engine (in-memory SQLite, or STORAGE_MODE=default).
+
+In 'wal' and 'postgresql' mode a bulk insert is committed as one
+transaction instead of one per INSERT_BATCH_SIZE chunk; the per-chunk
+commits only existed to keep the rollback-journal write lock short.
+"""
+import csv
+import io
+import queue
+import threading
+from concurrent.futures import Future
+from datetime import datetime
+from functools import wraps
+
+from flask import current_app, has_app_context, has_request_context, request
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from sqlalchemy import create_engine, event, orm
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+from config import Config
+
+STORAGE_MODES = ('auto', 'default', 'wal', 'postgresql')
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def resolve_mode(uri, mode=None):
+    """The storage mode for a database URI; 'auto' picks one from the backend."""
+    mode = (mode or 'auto').lower()
+    if mode not in STORAGE_MODES:
+        raise ValueError(f"Unknown STORAGE_MODE {mode!r}, expected one of {', '.join(STORAGE_MODES)}")
+    url = make_url(uri)
+    backend = url.get_backend_name()
+    in_memory = backend == 'sqlite' and url.database in (None, '', ':memory:')
+    if mode == 'auto':
+        if backend == 'postgresql':
+            return 'postgresql'
+        return 'wal' if backend == 'sqlite' and not in_memory else 'default'
+    if mode == 'wal' and (backend != 'sqlite' or in_memory):
+        raise ValueError("STORAGE_MODE 'wal' needs a file-backed SQLite database")
+    if mode == 'postgresql' and backend != 'postgresql':
+        raise ValueError("STORAGE_MODE 'postgresql' needs a postgresql:// database URL")
+    return mode
+
+
+def engine_options(mode, options=None):
+    """Engine options of a storage mode, on top of `SQLALCHEMY_ENGINE_OPTIONS`."""
+    options = dict(options or {})
+    connect_args = dict(options.get('connect_args') or {})
+    if mode == 'wal':
+        # One pooled connection per thread that writes; reads have their own engine
+        options.update(poolclass=QueuePool, pool_size=Config.SQLITE_WRITE_POOL_SIZE, max_overflow=0)
+        connect_args.update(check_same_thread=False, timeout=Config.SQLITE_BUSY_TIMEOUT)
+    elif mode == 'postgresql':
+        options.update(pool_size=Config.POSTGRES_POOL_SIZE, max_overflow=Config.POSTGRES_MAX_OVERFLOW,
+                       pool_timeout=Config.POSTGRES_POOL_TIMEOUT, pool_pre_ping=True,
+                       pool_recycle=Config.POSTGRES_POOL_RECYCLE, executemany_mode='values_plus_batch')
+        # The SQLite busy timeout of the shared defaults means nothing to psycopg2
+        connect_args.pop('timeout', None)
+        connect_args.setdefault('connect_timeout', Config.POSTGRES_CONNECT_TIMEOUT)
+        connect_args.setdefault('options', f'-c statement_timeout={Config.POSTGRES_STATEMENT_TIMEOUT_MS}')
+        connect_args.setdefault('application_name', 'stablecoin_monitor')
+    else:
+        return options
+    options['connect_args'] = connect_args
+    return options
+
+
+def sqlite_pragma_listener(pragmas):
+    """A `connect` event listener setting `pragmas` on every new SQLite connection."""
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+    return set_pragmas
+
+
+class RoutingSession(SignallingSession):
+    """Session sending the queries of read-only HTTP requests to the storage's reader engine."""
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        storage = self.app.extensions.get('storage')
+        if storage is not None and storage.reads_from_reader():
+            return storage.reader
+        return SignallingSession.get_bind(self, mapper, clause)
+
+
+class StorageSQLAlchemy(SQLAlchemy):
+    """Flask-SQLAlchemy with read routing and per-mode engine setup."""
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def create_engine(self, sa_url, engine_opts):
+        engine = create_engine(sa_url, **engine_opts)
+        if sa_url.get_backend_name() == 'sqlite' and engine_opts.get('poolclass') is QueuePool:
+            # Only 'wal' mode pools file connections; flask-sqlalchemy's defaults use NullPool
+            event.listen(engine, 'connect', sqlite_pragma_listener(Config.SQLITE_PRAGMAS))
+        return engine
+
+
+class WriteQueue:
+    """
+    Single writer thread running write jobs in submission order.
+
+    Jobs run inside one long-lived app context and are committed when they
+    return (most commit themselves already); a job that raises is rolled
+    back and its exception handed to the caller. The bounded queue makes producers wait
+    when writes fall behind instead of buffering without limit.
+    """
+
+    def __init__(self, app, queue_size=None):
+        self.app = app
+        self._jobs = queue.Queue(queue_size or Config.WRITE_QUEUE_SIZE)
+        self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+        self.completed = 0
+        self.failed = 0
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def in_writer(self):
+        return threading.current_thread() is self._thread
+
+    def submit(self, func, *args, **kwargs):
+        future = Future()
+        self._jobs.put((future, func, args, kwargs))
+        return future
+
+    def run(self, func, *args, **kwargs):
+        """Run `func` on the writer thread and wait for its result."""
+        if self.in_writer():
+            return func(*args, **kwargs)
+        return self.submit(func, *args, **kwargs).result()
+
+    def stop(self):
+        if self._thread.is_alive():
+            self._jobs.put(None)
+            self._thread.join()
+
+    def depth(self):
+        return self._jobs.qsize()
+
+    def _run(self):
+        from app import db
+
+        with self.app.app_context():
+            while True:
+                job = self._jobs.get()
+                if job is None:
+                    db.session.remove()
+                    return
+                future, func, args, kwargs = job
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    result = func(*args, **kwargs)
+                    # As when the caller's own session would have committed later
+                    db.session.commit()
+                except BaseException as e:
+                    db.session.rollback()
+                    self.failed += 1
+                    future.set_exception(e)
+                else:
+                    self.completed += 1
+                    future.set_result(result)
+                finally:
+                    # Hand the connection back so no read snapshot outlives the job
+                    db.session.close()
+
+
+class Storage:
+    """Per-app storage state, kept in `app.extensions['storage']`."""
+
+    def __init__(self, app, mode):
+        self.app = app
+        self.mode = mode
+        self.reader = None
+        self.writer = None
+
+    def start(self, engine):
+        """Create the reader engine and writer thread of 'wal' mode, once the schema exists."""
+        if self.mode != 'wal':
+            return self
+        database = engine.url.database
+        self.reader = create_engine(f'sqlite:///file:{database}?mode=ro&uri=true', poolclass=QueuePool,
+                                    pool_size=Config.SQLITE_READ_POOL_SIZE, max_overflow=0,
+                                    connect_args={'check_same_thread': False, 'timeout': Config.SQLITE_BUSY_TIMEOUT})
+        read_pragmas = {name: value for name, value in Config.SQLITE_PRAGMAS.items() if name != 'journal_mode'}
+        read_pragmas['query_only'] = 'ON'
+        event.listen(self.reader, 'connect', sqlite_pragma_listener(read_pragmas))
+        self.writer = WriteQueue(self.app).start()
+        return self
+
+    def stop(self):
+        if self.writer is not None:
+            self.writer.stop()
+        if self.reader is not None:
+            self.reader.dispose()
+
+    @property
+    def single_transaction_inserts(self):
+        return self.mode in ('wal', 'postgresql')
+
+    def reads_from_reader(self):
+        return (self.reader is not None and has_request_context() and request.method in READ_METHODS
+                and not self.writer.in_writer())
+
+    def stats(self):
+        stats = {'mode': self.mode}
+        if self.writer is not None:
+            stats.update(write_queue=self.writer.depth(), writes_completed=self.writer.completed,
+                         writes_failed=self.writer.failed)
+        return stats
+
+
+def init_storage(app):
+    """Resolve the storage mode of `app` and tune its engine options; call before `db.init_app`."""
+    mode = resolve_mode(app.config['SQLALCHEMY_DATABASE_URI'], app.config.get('STORAGE_MODE'))
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(mode, app.config.get('SQLALCHEMY_ENGINE_OPTIONS'))
+    storage = app.extensions['storage'] = Storage(app, mode)
+    return storage
+
+
+def current_storage():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('storage')
+
+
+def run_write(func, *args, **kwargs):
+    """Run a write on the app's writer thread in 'wal' mode, otherwise right here."""
+    storage = current_storage()
+    if storage is None or storage.writer is None:
+        return func(*args, **kwargs)
+    return storage.writer.run(func, *args, **kwargs)
+
+
+def writes(func):
+    """Decorator funnelling every call of a write entry point through `run_write`."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        return run_write(func, *args, **kwargs)
+    return wrapper
+
+
+def _copy_value(value):
+    if value is None:
+        return r'\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    return value
+
+
+def copy_insert(session, table, rows, conflict_columns, exclude_legacy=True):
+    """
+    Bulk-load rows into a PostgreSQL table with COPY.
+
+    Rows are streamed as CSV into a temporary staging table, then moved
+    with one `INSERT ... SELECT ... ON CONFLICT DO NOTHING RETURNING`, which
+    tells which rows were new. With `exclude_legacy`, rows whose tx_hash
+    is already stored without a log index are skipped as well, as the
+    multi-row INSERT path does.
+
+    Returns
+    -------
+    list
+        The rows that were inserted.
+    """
+    if not rows:
+        return []
+    names = [column.name for column in table.columns if any(column.name in row for row in rows)]
+    dialect = session.get_bind().dialect
+    preparer = dialect.identifier_preparer
+    target = preparer.format_table(table)
+    columns = ', '.join(preparer.quote(name) for name in names)
+    stage = preparer.quote(f'{table.name}_stage')
+
+    # Column types convert values as they would for an INSERT (e.g. exact amounts to NUMERIC)
+    processors = [(name, table.columns[name].type.bind_processor(dialect)) for name in names]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([_copy_value(processor(row.get(name)) if processor else row.get(name))
+                         for name, processor in processors])
+    buffer.seek(0)
+
+    legacy = ''
+    if exclude_legacy:
+        legacy = (f'WHERE NOT EXISTS (SELECT 1 FROM {target} t WHERE t.tx_hash = s.tx_hash '
+                  f'AND t.log_index IS NULL) ')
+    conflict = ', '.join(preparer.quote(name) for name in conflict_columns)
+    returning = ', '.join(preparer.quote(name) for name in conflict_columns)
+
+    cursor = session.connection().connection.cursor()
+    try:
+        cursor.execute(f'CREATE TEMP TABLE {stage} AS SELECT {columns} FROM {target} WITH NO DATA')
+        cursor.copy_expert(f"COPY {stage} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer)
+        cursor.execute(f'INSERT INTO {target} ({columns}) SELECT {columns} FROM {stage} s {legacy}'
+                       f'ON CONFLICT ({conflict}) DO NOTHING RETURNING {returning}')
+        inserted = set(cursor.fetchall())
+        cursor.execute(f'DROP TABLE {stage}')
+    finally:
+        cursor.close()
+    return [row for row in rows if tuple(row.get(name) for name in conflict_columns) in inserted]
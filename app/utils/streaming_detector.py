@@ -0,0 +1,240 @@
+import math
+import os
+import threading
+
+import joblib
+import numpy as np
+
+from app.utils.metrics import model_rows, model_seconds
+from config import Config
+
+STREAMING_FEATURES = ['log_amount_zscore', 'block_gap_zscore']
+
+
+class EWMAStats:
+    """Exponentially weighted running mean and variance of one feature."""
+
+    def __init__(self, alpha=0.01):
+        self.alpha = alpha
+        self.mean = None
+        self.var = 0.0
+
+    def update(self, value):
+        if self.mean is None:
+            self.mean = value
+            return
+        diff = value - self.mean
+        increment = self.alpha * diff
+        self.mean += increment
+        self.var = (1 - self.alpha) * (self.var + diff * increment)
+
+    def zscore(self, value):
+        if self.mean is None or self.var <= 0:
+            return 0.0
+        return (value - self.mean) / math.sqrt(self.var)
+
+
+class HalfSpaceTrees:
+    """
+    Streaming ensemble of random half-space trees (Tan, Ting & Liu, 2011).
+
+    Features are expected in [0, 1]. Each tree is a complete binary tree
+    stored in flat arrays, so scoring and updating one point costs
+    O(n_trees * depth) regardless of how many points were seen. Mass
+    profiles are counted in the latest window and swapped into the
+    reference profile every `window_size` points. Low mass means anomaly.
+    """
+
+    def __init__(self, n_features, n_trees=25, depth=8, window_size=250, seed=42):
+        rng = np.random.RandomState(seed)
+        n_nodes = 2 ** (depth + 1) - 1
+        self.n_trees = n_trees
+        self.depth = depth
+        self.window_size = window_size
+        self.split_feature = rng.randint(n_features, size=(n_trees, n_nodes))
+        self.split_value = np.empty((n_trees, n_nodes))
+        self.reference = np.zeros((n_trees, n_nodes))
+        self.latest = np.zeros((n_trees, n_nodes))
+        self.seen = 0
+        self.windows_completed = 0
+
+        # Each tree works in a randomly perturbed copy of the unit workspace
+        for t in range(n_trees):
+            s = rng.uniform(size=n_features)
+            span = 2 * np.maximum(s, 1 - s)
+            low, high = s - span, s + span
+            self._build(t, 0, low.copy(), high.copy())
+
+    def _build(self, tree, node, low, high):
+        if node >= self.split_value.shape[1]:
+            return
+        feature = self.split_feature[tree, node]
+        mid = (low[feature] + high[feature]) / 2
+        self.split_value[tree, node] = mid
+        left_high = high.copy()
+        left_high[feature] = mid
+        right_low = low.copy()
+        right_low[feature] = mid
+        self._build(tree, 2 * node + 1, low, left_high)
+        self._build(tree, 2 * node + 2, right_low, high)
+
+    def _paths(self, x):
+        """Node indices visited in every tree, shape (n_trees, depth + 1)."""
+        nodes = np.zeros(self.n_trees, dtype=np.int64)
+        trees = np.arange(self.n_trees)
+        paths = [nodes]
+        for _ in range(self.depth):
+            go_right = x[self.split_feature[trees, nodes]] >= self.split_value[trees, nodes]
+            nodes = 2 * nodes + 1 + go_right
+            paths.append(nodes)
+        return np.stack(paths, axis=1)
+
+    @property
+    def max_score(self):
+        return self.n_trees * self.window_size * 2 ** self.depth
+
+    def score_and_update(self, x):
+        """Return the mass score of `x` (before learning it), then learn it."""
+        x = np.asarray(x, dtype=np.float64)
+        paths = self._paths(x)
+        trees = np.arange(self.n_trees)
+        score = float(self.reference[trees, paths[:, -1]].sum() * 2.0 ** self.depth)
+
+        self.latest[trees[:, None], paths] += 1
+        self.seen += 1
+        if self.seen % self.window_size == 0:
+            self.reference = self.latest
+            self.latest = np.zeros_like(self.reference)
+            self.windows_completed += 1
+        return score
+
+
+class StreamingDetector:
+    """
+    O(1) per-transfer anomaly scorer used when ANOMALY_DETECTOR is 'streaming'.
+
+    Each transfer is turned into EWMA z-scores of its log amount and of the
+    block gap since the previous transfer, squashed into [0, 1] and scored
+    by half-space trees. Scores follow the IsolationForest convention of
+    `score_samples`: they lie in [-1, 0] and lower means more anomalous.
+    A transfer is flagged when its score falls `threshold` EWMA standard
+    deviations below the running mean score.
+    """
+
+    def __init__(self, n_trees=25, depth=8, window_size=250, threshold=3.0, alpha=0.01, seed=42):
+        self.trees = HalfSpaceTrees(len(STREAMING_FEATURES), n_trees, depth, window_size, seed)
+        self.amount_stats = EWMAStats(alpha)
+        self.gap_stats = EWMAStats(alpha)
+        self.score_stats = EWMAStats(alpha)
+        self.threshold = threshold
+        self.last_block = None
+        self._lock = threading.Lock()
+
+    @property
+    def warmed_up(self):
+        return self.trees.windows_completed > 0
+
+    def score(self, amount, block_number):
+        """
+        Score one transfer and learn from it.
+
+        Returns
+        -------
+        tuple
+            `(anomaly_score, is_anomaly)`, with anomaly_score None until the
+            first reference window has been filled.
+        """
+        with self._lock:
+            log_amount = math.log1p(max(amount, 0.0))
+            gap = float(block_number - self.last_block) if self.last_block is not None else 0.0
+            self.last_block = max(block_number, self.last_block or block_number)
+
+            z = np.array([self.amount_stats.zscore(log_amount), self.gap_stats.zscore(gap)])
+            self.amount_stats.update(log_amount)
+            self.gap_stats.update(gap)
+            x = 1.0 / (1.0 + np.exp(-z / 2.0))
+
+            warmed_up = self.warmed_up
+            mass = self.trees.score_and_update(x)
+            if not warmed_up:
+                return None, False
+
+            anomaly_score = mass / self.trees.max_score - 1.0
+            is_anomaly = (self.score_stats.var > 0 and
+                          self.score_stats.zscore(anomaly_score) < -self.threshold)
+            self.score_stats.update(anomaly_score)
+            return anomaly_score, bool(is_anomaly)
+
+    def score_rows(self, rows):
+        """Set `anomaly_score` and `is_anomaly` on Transaction row dicts in place."""
+        for row in rows:
+            row['anomaly_score'], row['is_anomaly'] = self.score(row['amount'], row['block_number'])
+        return rows
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._lock:
+            state = {key: value for key, value in self.__dict__.items() if key != '_lock'}
+        tmp_path = path + '.tmp'
+        joblib.dump(state, tmp_path)
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        """Restore state saved by `save`; returns False when there is none."""
+        try:
+            state = joblib.load(path)
+        except (OSError, ValueError, EOFError):
+            return False
+        with self._lock:
+            self.__dict__.update(state)
+        return True
+
+
+def snapshot_path(token_address=None):
+    """Snapshot file of a token's detector; USDC keeps the original file name."""
+    if token_address is None or token_address.lower() == Config.USDC_CONTRACT_ADDRESS.lower():
+        return os.path.join(Config.MODEL_DIR, 'streaming_detector.joblib')
+    return os.path.join(Config.MODEL_DIR, f'streaming_detector_{token_address.lower()}.joblib')
+
+
+def _new_detector():
+    return StreamingDetector(window_size=Config.STREAMING_WINDOW_SIZE, threshold=Config.STREAMING_THRESHOLD)
+
+
+streaming_detector = _new_detector()
+
+# One detector per token: amounts and transfer gaps of different tokens
+# have unrelated baselines
+_detectors = {Config.USDC_CONTRACT_ADDRESS.lower(): streaming_detector}
+_detectors_lock = threading.Lock()
+
+
+def detector_for(token_address=None):
+    """Streaming detector of a token, created on first use."""
+    key = (token_address or Config.USDC_CONTRACT_ADDRESS).lower()
+    with _detectors_lock:
+        detector = _detectors.get(key)
+        if detector is None:
+            detector = _detectors[key] = _new_detector()
+        return detector
+
+
+def score_rows(rows):
+    """Score Transaction row dicts in place, each with the detector of its token."""
+    with model_seconds.time('streaming', 'score'):
+        for row in rows:
+            row['anomaly_score'], row['is_anomaly'] = detector_for(row.get('token_address')).score(
+                row['amount'], row['block_number'])
+    model_rows.inc('streaming', 'score', amount=len(rows))
+    return rows
+
+
+def save_detectors(token_addresses):
+    for token_address in token_addresses:
+        detector_for(token_address).save(snapshot_path(token_address))
+
+
+def load_detectors(token_addresses):
+    """Restore the snapshot of every token's detector; returns the tokens restored."""
+    return [token_address for token_address in token_addresses
+            if detector_for(token_address).load(snapshot_path(token_address))]
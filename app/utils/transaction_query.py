@@ -0,0 +1,143 @@
+import base64
+import csv
+import io
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, or_, select
+
+from app import db
+from app.models import Transaction
+from app.utils.log_decoder import format_amount, known_decimals
+from config import Config
+
+EXPORT_COLUMNS = ['id', 'tx_hash', 'from_address', 'to_address', 'amount', 'amount_raw', 'timestamp',
+                  'block_number', 'is_anomaly', 'anomaly_score', 'token_address']
+
+
+def encode_cursor(timestamp, tx_id):
+    """Opaque keyset cursor for the `(timestamp, id)` position of a row."""
+    raw = f"{timestamp.isoformat()}|{tx_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, tx_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return datetime.fromisoformat(timestamp), int(tx_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def build_query(filters, cursor=None, limit=None):
+    """
+    Build a newest-first select over Transaction with server-side filters.
+
+    Parameters
+    ----------
+    filters : dict
+        Optional keys `min_amount`, `max_amount`, `is_anomaly`, `address`
+        (either side), `from_address`, `to_address`, `token_address`,
+        `start` and `end`.
+    cursor : str, optional
+        Cursor returned with the previous page; rows strictly after it in
+        `(timestamp desc, id desc)` order are returned. Seeking on the
+        `(timestamp, id)` index keeps every page O(page size), unlike OFFSET.
+    limit : int, optional
+        Maximum number of rows.
+
+    Returns
+    -------
+    sqlalchemy.sql.Select
+    """
+    table = Transaction.__table__
+    c = table.c
+    query = select(*[c[name] for name in EXPORT_COLUMNS])
+
+    if filters.get('min_amount') is not None:
+        query = query.where(c.amount >= filters['min_amount'])
+    if filters.get('max_amount') is not None:
+        query = query.where(c.amount <= filters['max_amount'])
+    if filters.get('is_anomaly') is not None:
+        query = query.where(c.is_anomaly.is_(filters['is_anomaly']))
+    if filters.get('address'):
+        query = query.where(or_(c.from_address == filters['address'], c.to_address == filters['address']))
+    if filters.get('from_address'):
+        query = query.where(c.from_address == filters['from_address'])
+    if filters.get('to_address'):
+        query = query.where(c.to_address == filters['to_address'])
+    if filters.get('token_address'):
+        query = query.where(c.token_address == filters['token_address'])
+    if filters.get('start') is not None:
+        query = query.where(c.timestamp >= filters['start'])
+    if filters.get('end') is not None:
+        query = query.where(c.timestamp < filters['end'])
+
+    if cursor:
+        cursor_timestamp, cursor_id = decode_cursor(cursor)
+        query = query.where(or_(
+            c.timestamp < cursor_timestamp,
+            and_(c.timestamp == cursor_timestamp, c.id < cursor_id)
+        ))
+
+    query = query.order_by(c.timestamp.desc(), c.id.desc())
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
+def row_to_dict(row):
+    data = dict(row._mapping)
+    data['timestamp'] = data['timestamp'].isoformat()
+    # Exact amounts go out as strings; JSON numbers lose precision past 2**53
+    raw = data['amount_raw']
+    data['amount_raw'] = str(raw) if raw is not None else None
+    data['amount_formatted'] = format_amount(raw, known_decimals(data['token_address'] or Config.USDC_CONTRACT_ADDRESS))
+    return data
+
+
+def fetch_page(filters, cursor=None, limit=50):
+    """
+    Return one page of transactions and the cursor of the next page.
+
+    Returns
+    -------
+    tuple
+        `(rows, next_cursor)` where next_cursor is None on the last page.
+    """
+    rows = db.session.execute(build_query(filters, cursor, limit + 1)).fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].id)
+    return [row_to_dict(row) for row in rows], next_cursor
+
+
+def iter_export(filters, fmt, limit=None, chunk_size=1000):
+    """
+    Yield an export as NDJSON lines or CSV text, a chunk of rows at a time.
+
+    Rows are read through a streaming (server-side where supported) cursor
+    and serialized chunk by chunk, so memory does not grow with the export.
+    """
+    query = build_query(filters, limit=limit).execution_options(stream_results=True)
+    result = db.session.execute(query)
+    try:
+        if fmt == 'csv':
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(EXPORT_COLUMNS)
+            yield buffer.getvalue()
+            for rows in result.partitions(chunk_size):
+                buffer.seek(0)
+                buffer.truncate()
+                for row in rows:
+                    data = row_to_dict(row)
+                    writer.writerow([data[name] for name in EXPORT_COLUMNS])
+                yield buffer.getvalue()
+        else:
+            for rows in result.partitions(chunk_size):
+                yield ''.join(json.dumps(row_to_dict(row)) + '\n' for row in rows)
+    finally:
+        result.close()
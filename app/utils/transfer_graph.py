@@ -0,0 +1,476 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import numpy as np
+from flask import current_app, has_app_context
+from sqlalchemy import and_, or_
+
+from config import Config
+
+EPOCH = datetime(1970, 1, 1)
+# Compaction leaves the interner at most this full, so it is not repeated on every batch
+COMPACT_LOW_WATER = 0.75
+
+
+def to_seconds(timestamp):
+    """Naive datetime (as stored) to float seconds; None passes through."""
+    if timestamp is None:
+        return None
+    return (timestamp - EPOCH).total_seconds()
+
+
+def from_seconds(seconds):
+    return EPOCH + timedelta(seconds=float(seconds))
+
+
+class AddressInterner:
+    """Two-way mapping between addresses and dense integer ids."""
+
+    def __init__(self):
+        self._ids = {}
+        self._addresses = []
+
+    def __len__(self):
+        return len(self._addresses)
+
+    def intern(self, address):
+        address_id = self._ids.get(address)
+        if address_id is None:
+            address_id = self._ids[address] = len(self._addresses)
+            self._addresses.append(address)
+        return address_id
+
+    def lookup(self, address):
+        return self._ids.get(address)
+
+    def address(self, address_id):
+        return self._addresses[address_id]
+
+
+class CSR:
+    """Compressed sparse rows of a set of edges, grouped by source id."""
+
+    def __init__(self, sources, targets, n_nodes, *columns):
+        order = np.argsort(sources, kind='stable')
+        self.indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=n_nodes), out=self.indptr[1:])
+        self.targets = targets[order]
+        self.columns = [column[order] for column in columns]
+
+    def neighbor_slots(self, nodes):
+        """Indices into `targets` of every edge leaving `nodes`, without a Python loop."""
+        starts = self.indptr[nodes]
+        lengths = self.indptr[nodes + 1] - starts
+        total = int(lengths.sum())
+        if not total:
+            return np.empty(0, dtype=np.int64)
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        return offsets + np.arange(total)
+
+
+class EdgeWindow:
+    """
+    Copy of the edges in a time window, taken under the graph's lock with
+    the interner and first-seen times of the same id space. CSR adjacency
+    is built on first use.
+    """
+
+    def __init__(self, sources, targets, times, amounts, interner, first_seen):
+        self.sources = sources
+        self.targets = targets
+        self.times = times
+        self.amounts = amounts
+        self.interner = interner
+        # Compaction replaces the interner; until then it only grows, so ids below n_nodes stay valid
+        self.n_nodes = len(interner)
+        self.first_seen = first_seen
+        self._csr = {}
+
+    def lookup(self, address):
+        address_id = self.interner.lookup(address)
+        return address_id if address_id is not None and address_id < self.n_nodes else None
+
+    def csr(self, reverse=False):
+        if reverse not in self._csr:
+            sources, targets = (self.targets, self.sources) if reverse else (self.sources, self.targets)
+            self._csr[reverse] = CSR(sources, targets, self.n_nodes, self.times, self.amounts)
+        return self._csr[reverse]
+
+
+class TransferGraph:
+    """
+    Incrementally maintained `from_address -> to_address` transfer graph.
+
+    Addresses are interned to dense int32 ids and every transfer is one
+    edge in fixed-size NumPy ring buffers (source, target, time, amount),
+    about 24 bytes per edge. Once `max_edges` is reached the oldest edges
+    are overwritten, so memory stays bounded no matter how long ingestion
+    runs; the interner is compacted to the addresses of live edges when it
+    grows past `max_addresses` (and past a third more than the live
+    addresses of the previous compaction).
+
+    The buffers are allocated by the first added batch, and the graph is
+    loaded from the database by `ensure_loaded` when ingestion starts or a
+    graph endpoint is first used in a process.
+
+    Queries take a `[start, end)` time window. Adjacency for a window is
+    built lazily as CSR arrays with one sort and cached until the next
+    ingested batch, so k-hop expansion and degree counts are vectorized.
+    """
+
+    def __init__(self, max_edges=None, max_addresses=None):
+        self.max_edges = max_edges or Config.GRAPH_MAX_EDGES
+        self.max_addresses = max_addresses or Config.GRAPH_MAX_ADDRESSES
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        """Drop every edge and release the buffers."""
+        with self._lock:
+            self.app = None
+            self.interner = AddressInterner()
+            self._sources = np.empty(0, dtype=np.int32)
+            self._targets = np.empty(0, dtype=np.int32)
+            self._times = np.empty(0, dtype=np.float64)
+            self._amounts = np.empty(0, dtype=np.float64)
+            self._first_seen = np.empty(0, dtype=np.float64)
+            self._size = 0
+            self._head = 0
+            self._compact_at = self.max_addresses
+            self.version = 0
+            self._window_cache = OrderedDict()
+
+    def _allocate(self):
+        self._sources = np.empty(self.max_edges, dtype=np.int32)
+        self._targets = np.empty(self.max_edges, dtype=np.int32)
+        self._times = np.empty(self.max_edges, dtype=np.float64)
+        self._amounts = np.empty(self.max_edges, dtype=np.float64)
+
+    @property
+    def live(self):
+        """Whether the graph was loaded from the database of the current app."""
+        return (self.app is not None and has_app_context() and
+                current_app._get_current_object() is self.app)
+
+    def ensure_loaded(self, until=None):
+        """Load the graph for the current app, once per process, before its first use."""
+        with self._load_lock:
+            if self.live:
+                return 0
+            loaded = load_recent_edges(self, until=until)
+        if loaded:
+            print(f"Loaded {loaded} transfers into the transfer graph")
+        return loaded
+
+    def __len__(self):
+        return self._size
+
+    def add_rows(self, rows):
+        """Append Transaction row dicts as edges."""
+        if not rows:
+            return
+        with self._lock:
+            if not len(self._sources):
+                self._allocate()
+            n = len(rows)
+            sources = np.fromiter((self.interner.intern(row['from_address']) for row in rows), np.int32, n)
+            targets = np.fromiter((self.interner.intern(row['to_address']) for row in rows), np.int32, n)
+            times = np.fromiter((to_seconds(row['timestamp']) for row in rows), np.float64, n)
+            amounts = np.fromiter((row['amount'] for row in rows), np.float64, n)
+
+            if len(self.interner) > len(self._first_seen):
+                grown = np.full(max(len(self.interner), 2 * len(self._first_seen)), np.inf)
+                grown[:len(self._first_seen)] = self._first_seen
+                self._first_seen = grown
+            np.minimum.at(self._first_seen, sources, times)
+            np.minimum.at(self._first_seen, targets, times)
+
+            # Keep only the newest max_edges of an oversized batch
+            if n > self.max_edges:
+                sources, targets, times, amounts = (a[-self.max_edges:] for a in (sources, targets, times, amounts))
+                n = self.max_edges
+            slots = (self._head + np.arange(n)) % self.max_edges
+            self._sources[slots] = sources
+            self._targets[slots] = targets
+            self._times[slots] = times
+            self._amounts[slots] = amounts
+            self._head = (self._head + n) % self.max_edges
+            self._size = min(self._size + n, self.max_edges)
+            self.version += 1
+            self._window_cache.clear()
+
+            if len(self.interner) > self._compact_at:
+                self._compact()
+
+    def _compact(self):
+        """Re-intern only the addresses referenced by live edges."""
+        size = self._size
+        live = np.unique(np.concatenate((self._sources[:size], self._targets[:size])))
+        remap = np.full(len(self.interner), -1, dtype=np.int32)
+        remap[live] = np.arange(len(live), dtype=np.int32)
+
+        interner = AddressInterner()
+        for address_id in live:
+            interner.intern(self.interner.address(address_id))
+        self._sources[:size] = remap[self._sources[:size]]
+        self._targets[:size] = remap[self._targets[:size]]
+        self._first_seen = self._first_seen[live]
+        self.interner = interner
+        self._compact_at = max(self.max_addresses, int(len(live) / COMPACT_LOW_WATER))
+
+    def _window(self, start, end):
+        """The `EdgeWindow` of live edges with `start <= time < end`, cached until the next batch."""
+        key = (start, end)
+        with self._lock:
+            version = self.version
+            window = self._window_cache.get((version, key))
+            if window is not None:
+                self._window_cache.move_to_end((version, key))
+                return window
+            size = self._size
+            sources, targets = self._sources[:size], self._targets[:size]
+            times, amounts = self._times[:size], self._amounts[:size]
+            mask = np.ones(size, dtype=bool)
+            if start is not None:
+                mask &= times >= to_seconds(start)
+            if end is not None:
+                mask &= times < to_seconds(end)
+            # Boolean indexing copies, so the window is unaffected by later batches and compaction
+            window = EdgeWindow(sources[mask], targets[mask], times[mask], amounts[mask],
+                                self.interner, self._first_seen)
+            self._window_cache[(version, key)] = window
+            while len(self._window_cache) > 8:
+                self._window_cache.popitem(last=False)
+            return window
+
+    def neighborhood(self, address, hops=2, start=None, end=None, direction='out', max_nodes=None):
+        """
+        Addresses within `hops` transfers of `address`.
+
+        Parameters
+        ----------
+        direction : str
+            'out' follows funds forward (e.g. peel chains), 'in' backward,
+            'both' ignores direction.
+        max_nodes : int, optional
+            Expansion stops once this many addresses were reached.
+
+        Returns
+        -------
+        dict or None
+            `nodes` with their hop distance and the aggregated `edges`
+            (count and volume per address pair) among them; None when the
+            address has no edges in the graph.
+        """
+        max_nodes = max_nodes or Config.GRAPH_MAX_NODES
+        # Ids, adjacency and addresses all come from one snapshot
+        window = self._window(start, end)
+        origin = window.lookup(address)
+        if origin is None:
+            return None
+        graphs = []
+        if direction in ('out', 'both'):
+            graphs.append(window.csr())
+        if direction in ('in', 'both'):
+            graphs.append(window.csr(reverse=True))
+
+        distance = np.full(window.n_nodes, -1, dtype=np.int16)
+        distance[origin] = 0
+        frontier = np.array([origin])
+        truncated = False
+        reached = 1
+        for hop in range(1, hops + 1):
+            neighbors = np.unique(np.concatenate([graph.targets[graph.neighbor_slots(frontier)] for graph in graphs]))
+            neighbors = neighbors[distance[neighbors] < 0]
+            if reached + len(neighbors) > max_nodes:
+                neighbors = neighbors[:max_nodes - reached]
+                truncated = True
+            distance[neighbors] = hop
+            reached += len(neighbors)
+            frontier = neighbors
+            if truncated or not len(frontier):
+                break
+
+        nodes = np.flatnonzero(distance >= 0)
+        sources, targets, amounts = window.sources, window.targets, window.amounts
+        inside = (distance[sources] >= 0) & (distance[targets] >= 0)
+        pairs, inverse = np.unique(np.stack((sources[inside], targets[inside]), axis=1), axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        counts = np.bincount(inverse, minlength=len(pairs))
+        volumes = np.bincount(inverse, weights=amounts[inside], minlength=len(pairs))
+        return {
+            'address': address,
+            'hops': hops,
+            'direction': direction,
+            'truncated': truncated,
+            'nodes': [{'address': window.interner.address(node), 'hop': int(distance[node])}
+                      for node in nodes[np.argsort(distance[nodes], kind='stable')]],
+            'edges': [{'from': window.interner.address(source), 'to': window.interner.address(target),
+                       'count': int(count), 'volume': float(volume)}
+                      for (source, target), count, volume in zip(pairs, counts, volumes)]
+        }
+
+    def top_fan(self, direction='out', start=None, end=None, limit=10):
+        """
+        Addresses with the most distinct counterparties in the window.
+
+        `fresh_counterparties` counts counterparties first seen inside the
+        window, the signature of funds fanned out to new addresses.
+        """
+        window = self._window(start, end)
+        sources, targets, amounts, n_nodes = window.sources, window.targets, window.amounts, window.n_nodes
+        if direction == 'in':
+            sources, targets = targets, sources
+        if not len(sources):
+            return []
+
+        pairs = np.unique(sources.astype(np.int64) * n_nodes + targets)
+        pair_nodes, pair_others = pairs // n_nodes, pairs % n_nodes
+        counterparties = np.bincount(pair_nodes, minlength=n_nodes)
+        fresh = window.first_seen[pair_others] >= (to_seconds(start) if start is not None else -np.inf)
+        fresh_counterparties = np.bincount(pair_nodes, weights=fresh, minlength=n_nodes)
+        transfers = np.bincount(sources, minlength=n_nodes)
+        volumes = np.bincount(sources, weights=amounts, minlength=n_nodes)
+
+        limit = min(limit, int((counterparties > 0).sum()))
+        if limit <= 0:
+            return []
+        top = np.argpartition(-counterparties, limit - 1)[:limit]
+        top = top[np.lexsort((-volumes[top], -counterparties[top]))]
+        return [{
+            'address': window.interner.address(node),
+            'counterparties': int(counterparties[node]),
+            'fresh_counterparties': int(fresh_counterparties[node]),
+            'transfers': int(transfers[node]),
+            'volume': float(volumes[node])
+        } for node in top]
+
+    def cycles(self, address=None, start=None, end=None, max_length=None, limit=100):
+        """
+        Short time-respecting cycles: funds that come back to their origin.
+
+        A path may only follow a pair of addresses whose last transfer is no
+        earlier than the first usable transfer of the previous hop. Without
+        `address`, origins are the most connected addresses that both send
+        and receive in the window. The search is bounded by
+        GRAPH_CYCLE_MAX_STEPS expansions.
+
+        Returns
+        -------
+        list
+            Dicts with the `path` of addresses (origin first), its `length`
+            and the `start`/`end` time of the first transfers used.
+        """
+        max_length = max_length or Config.GRAPH_CYCLE_MAX_LENGTH
+        window = self._window(start, end)
+        sources, targets, times, n_nodes = window.sources, window.targets, window.times, window.n_nodes
+        if not len(sources):
+            return []
+        # Collapse parallel transfers into one edge with first and last time
+        keys = sources.astype(np.int64) * n_nodes + targets
+        order = np.lexsort((times, keys))
+        keys, times = keys[order], times[order]
+        boundaries = np.flatnonzero(np.diff(keys, prepend=-1))
+        pair_keys = keys[boundaries]
+        first_times = times[boundaries]
+        last_times = np.maximum.reduceat(times, boundaries)
+        graph = CSR(pair_keys // n_nodes, pair_keys % n_nodes, n_nodes, first_times, last_times)
+        pair_first, pair_last = graph.columns
+
+        if address is not None:
+            origin = window.lookup(address)
+            if origin is None:
+                return []
+            origins = [origin]
+        else:
+            out_degree = np.diff(graph.indptr)
+            in_degree = np.bincount(graph.targets, minlength=n_nodes)
+            candidates = np.flatnonzero((out_degree > 0) & (in_degree > 0))
+            candidates = candidates[np.argsort(-(out_degree[candidates] + in_degree[candidates]), kind='stable')]
+            origins = candidates[:Config.GRAPH_CYCLE_ORIGINS].tolist()
+
+        found = []
+        seen = set()
+        steps = 0
+        for origin in origins:
+            # Depth-first over (node, path, earliest time, start time)
+            stack = [(origin, [origin], -np.inf, None)]
+            while stack and len(found) < limit and steps < Config.GRAPH_CYCLE_MAX_STEPS:
+                node, path, earliest, started = stack.pop()
+                for slot in range(graph.indptr[node], graph.indptr[node + 1]):
+                    steps += 1
+                    if pair_last[slot] < earliest:
+                        continue
+                    target = int(graph.targets[slot])
+                    arrival = max(earliest, pair_first[slot])
+                    first = arrival if started is None else started
+                    if target == origin and len(path) > 1:
+                        # The same cycle is found from each of its members
+                        rotation = path.index(min(path))
+                        canonical = tuple(path[rotation:] + path[:rotation])
+                        if canonical not in seen:
+                            seen.add(canonical)
+                            found.append({
+                                'path': [window.interner.address(n) for n in path + [origin]],
+                                'length': len(path),
+                                'start': from_seconds(first).isoformat(),
+                                'end': from_seconds(arrival).isoformat()
+                            })
+                    elif target not in path and len(path) < max_length:
+                        stack.append((target, path + [target], arrival, first))
+            if len(found) >= limit or steps >= Config.GRAPH_CYCLE_MAX_STEPS:
+                break
+        return found[:limit]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'loaded': self.app is not None,
+                'edges': self._size,
+                'max_edges': self.max_edges,
+                'addresses': len(self.interner),
+                'memory_bytes': int(self._sources.nbytes + self._targets.nbytes + self._times.nbytes +
+                                    self._amounts.nbytes + self._first_seen.nbytes)
+            }
+
+
+def load_recent_edges(graph, batch_size=10000, until=None):
+    """
+    Rebuild `graph` from the newest `max_edges` stored transfers of the
+    current app, oldest first; with `until`, only those at or before that
+    `(block_number, log_index)` position.
+    """
+    from app import db
+    from app.models import Transaction
+
+    graph.clear()
+    graph.app = current_app._get_current_object()
+    stored = db.session.query(Transaction.id)
+    query = db.session.query(Transaction.from_address, Transaction.to_address,
+                             Transaction.timestamp, Transaction.amount)
+    if until is not None:
+        block, log_index = until
+        upto = or_(Transaction.block_number < block,
+                   and_(Transaction.block_number == block,
+                        or_(Transaction.log_index.is_(None), Transaction.log_index <= log_index)))
+        stored, query = stored.filter(upto), query.filter(upto)
+    newest = (stored.order_by(Transaction.timestamp.desc(), Transaction.id.desc())
+              .offset(graph.max_edges - 1).limit(1).scalar())
+    if newest is not None:
+        cutoff = db.session.get(Transaction, newest)
+        query = query.filter((Transaction.timestamp > cutoff.timestamp) |
+                             ((Transaction.timestamp == cutoff.timestamp) & (Transaction.id >= cutoff.id)))
+    batch = []
+    for from_address, to_address, timestamp, amount in query.order_by(Transaction.timestamp, Transaction.id).yield_per(batch_size):
+        batch.append({'from_address': from_address, 'to_address': to_address,
+                      'timestamp': timestamp, 'amount': amount})
+        if len(batch) >= batch_size:
+            graph.add_rows(batch)
+            batch = []
+    graph.add_rows(batch)
+    return len(graph)
+
+
+transfer_graph = TransferGraph()
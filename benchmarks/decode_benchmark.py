@@ -0,0 +1,77 @@
+"""
+Transfer log decode throughput: raw decoder vs. the web3 contract-event path.
+
+Usage:
+    python benchmarks/decode_benchmark.py [--logs 50000] [--repeat 3]
+
+Both paths start from the raw JSON of an `eth_getLogs` response and end
+with the same transfer dicts, so the numbers compare everything ingestion
+does per log after the HTTP round trip.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web3 import Web3  # noqa: E402
+from web3._utils.events import get_event_data  # noqa: E402
+from web3._utils.method_formatters import log_entry_formatter  # noqa: E402
+
+from app.utils.log_decoder import decode_transfer_logs, transfer_from_event  # noqa: E402
+from benchmarks.synthetic import synthetic_transfers  # noqa: E402
+
+TRANSFER_ABI = json.loads('{"anonymous":false,"inputs":[{"indexed":true,"name":"from","type":"address"},'
+                          '{"indexed":true,"name":"to","type":"address"},'
+                          '{"indexed":false,"name":"value","type":"uint256"}],"name":"Transfer","type":"event"}')
+
+
+def synthetic_logs(count, n_addresses=2000, seed=42):
+    """Raw eth_getLogs response body with a realistic skew towards a few hot addresses."""
+    return json.dumps(synthetic_transfers(count, n_addresses=n_addresses, seed=seed))
+
+
+def web3_path(payload, codec):
+    return [transfer_from_event(get_event_data(codec, TRANSFER_ABI, log_entry_formatter(log)))
+            for log in json.loads(payload)]
+
+
+def raw_path(payload):
+    return decode_transfer_logs(json.loads(payload))
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def run(n_logs=50000, repeat=3):
+    payload = synthetic_logs(n_logs)
+    codec = Web3().codec
+    web3_seconds, web3_result = best_of(lambda: web3_path(payload, codec), repeat)
+    raw_seconds, raw_result = best_of(lambda: raw_path(payload), repeat)
+    assert raw_result == web3_result, "decoders disagree"
+    return {
+        'logs': n_logs,
+        'web3_logs_per_second': round(n_logs / web3_seconds),
+        'raw_logs_per_second': round(n_logs / raw_seconds),
+        'speedup': round(web3_seconds / raw_seconds, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--logs', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    print(json.dumps(run(args.logs, args.repeat), indent=2))
+
+
+if __name__ == '__main__':
+    main()
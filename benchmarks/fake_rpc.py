@@ -0,0 +1,179 @@
+"""
+Local stand-in for an Ethereum JSON-RPC node, serving a synthetic chain.
+
+Supports `eth_blockNumber`, `eth_getLogs` (address list and topic
+filters), `eth_getBlockByNumber`, `eth_chainId` and JSON-RPC batches, with
+a configurable per-request latency and the response-size and block-range
+limits providers enforce, so ingestion can be exercised and timed offline:
+
+    with FakeRPCServer(FakeChain(synthetic_transfers(10000)), latency=0.02) as server:
+        Web3(Web3.HTTPProvider(server.url))
+"""
+import json
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.synthetic import BLOCK_TIME, FIRST_BLOCK, block_header
+
+
+class RPCError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+class FakeChain:
+    """
+    Synthetic logs indexed by block.
+
+    The head is the last block with logs plus `confirmations`, so that
+    every log is old enough to be ingested. Unless `first_timestamp` is
+    given, block times are laid out so that the head is mined now, which
+    keeps the synthetic history inside the dashboard's 24 hour window.
+    """
+
+    def __init__(self, logs, first_block=FIRST_BLOCK, confirmations=3, first_timestamp=None):
+        self.first_block = first_block
+        self._by_block = defaultdict(list)
+        for log in logs:
+            self._by_block[int(log['blockNumber'], 16)].append(log)
+        last_block = max(self._by_block) if self._by_block else first_block
+        self.head = last_block + confirmations
+        self.log_count = len(logs)
+        if first_timestamp is None:
+            first_timestamp = int(time.time()) - BLOCK_TIME * (self.head - first_block)
+        self.first_timestamp = first_timestamp
+
+    def get_logs(self, start_block, end_block, addresses=None, topic0=None):
+        addresses = {address.lower() for address in addresses} if addresses else None
+        logs = []
+        for block in range(max(start_block, self.first_block), min(end_block, self.head) + 1):
+            for log in self._by_block.get(block, ()):
+                if addresses is not None and log['address'] not in addresses:
+                    continue
+                if topic0 is not None and log['topics'][0] != topic0:
+                    continue
+                logs.append(log)
+        return logs
+
+    def header(self, number):
+        if number > self.head:
+            return None
+        return block_header(number, self.first_block, self.first_timestamp)
+
+
+class FakeRPCServer:
+    """
+    Threaded HTTP JSON-RPC server over a `FakeChain`, run in the background.
+
+    Parameters
+    ----------
+    chain : FakeChain
+    latency : float
+        Seconds slept per HTTP request (a batch counts once), to model the
+        network round trip.
+    max_logs : int
+        Larger `eth_getLogs` results are rejected with the -32005 error
+        most providers use, as the adaptive log fetcher expects.
+    max_block_range : int, optional
+        Wider `eth_getLogs` ranges are rejected as well.
+    """
+
+    def __init__(self, chain, latency=0.0, max_logs=10000, max_block_range=None, host='127.0.0.1', port=0):
+        self.chain = chain
+        self.latency = latency
+        self.max_logs = max_logs
+        self.max_block_range = max_block_range
+        self.requests = 0
+        self.calls = defaultdict(int)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-rpc', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _eth_getLogs(self, params):
+        criteria = params[0]
+        start_block = int(criteria.get('fromBlock', '0x0'), 16)
+        end_block = int(criteria.get('toBlock', hex(self.chain.head)), 16)
+        if self.max_block_range and end_block - start_block + 1 > self.max_block_range:
+            raise RPCError(-32005, f'block range too large, max is {self.max_block_range}')
+        addresses = criteria.get('address')
+        if isinstance(addresses, str):
+            addresses = [addresses]
+        topics = criteria.get('topics') or [None]
+        logs = self.chain.get_logs(start_block, end_block, addresses, topics[0])
+        if len(logs) > self.max_logs:
+            raise RPCError(-32005, f'query returned more than {self.max_logs} results')
+        return logs
+
+    def _call(self, request):
+        method = request.get('method')
+        params = request.get('params') or []
+        with self._lock:
+            self.calls[method] += 1
+        try:
+            if method == 'eth_blockNumber':
+                result = hex(self.chain.head)
+            elif method == 'eth_chainId':
+                result = hex(11155111)
+            elif method == 'eth_getLogs':
+                result = self._eth_getLogs(params)
+            elif method == 'eth_getBlockByNumber':
+                number = self.chain.head if params[0] == 'latest' else int(params[0], 16)
+                result = self.chain.header(number)
+            else:
+                raise RPCError(-32601, f'the method {method} does not exist/is not available')
+        except RPCError as e:
+            return {'jsonrpc': '2.0', 'id': request.get('id'), 'error': {'code': e.code, 'message': str(e)}}
+        return {'jsonrpc': '2.0', 'id': request.get('id'), 'result': result}
+
+    def handle(self, payload):
+        with self._lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if isinstance(payload, list):
+            return [self._call(request) for request in payload]
+        return self._call(payload)
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                reply = json.dumps(server.handle(json.loads(body))).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(reply)))
+                self.end_headers()
+                self.wfile.write(reply)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,288 @@
+"""
+Offline benchmark suite: ingestion, anomaly scoring and API latency.
+
+Usage:
+    python -m benchmarks.run_benchmarks [--sizes 1000 10000 50000] [--output results.json]
+    python -m benchmarks.run_benchmarks --compare baseline.json [--threshold 0.2]
+
+Each size runs in a fresh process against a local fake JSON-RPC node
+(benchmarks/fake_rpc.py) serving synthetic USDC Transfer logs, with a
+temporary SQLite database and model directory, so nothing touches the
+network or the app's own data. Per size it measures:
+
+- `fetch_transactions` end to end (eth_getLogs, block headers, inserts,
+  rollups and the scoring pass that closes the cycle), in transfers/s;
+- `detect_anomalies` with no cached model (fit and score the window) and
+  with a cached one;
+- p50/p99 of `/api/dashboard-data` and `/api/transactions`, computed on
+  every request and served from the response cache.
+
+Results are JSON, tagged with the git commit and Python version. With
+`--compare`, metrics that got worse than the given earlier run by more than
+`--threshold` are reported and the exit status is 1.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FORMAT_VERSION = 1
+DEFAULT_SIZES = (1000, 10000, 50000)
+ENDPOINTS = {
+    'dashboard_data': '/api/dashboard-data',
+    'transactions': '/api/transactions',
+    'transactions_filtered': '/api/transactions?min_amount=1000&limit=100'
+}
+
+
+def percentiles(samples):
+    """p50/p99/mean of a list of durations in seconds, in milliseconds."""
+    ordered = sorted(samples)
+
+    def at(fraction):
+        return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+    return {
+        'p50_ms': round(at(0.50) * 1000, 3),
+        'p99_ms': round(at(0.99) * 1000, 3),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3)
+    }
+
+
+def time_call(func):
+    started = time.perf_counter()
+    result = func()
+    return time.perf_counter() - started, result
+
+
+def time_endpoint(client, url, requests, cached):
+    from app.utils.response_cache import response_cache
+
+    client.get(url)  # Warm-up, so first-request setup is not counted
+    samples = []
+    for _ in range(requests):
+        if not cached:
+            response_cache.backend.clear()
+        seconds, response = time_call(lambda: client.get(url))
+        assert response.status_code == 200, f'{url} returned {response.status_code}'
+        samples.append(seconds)
+    return percentiles(samples)
+
+
+def bench_size(size, settings):
+    """
+    Run every benchmark over `size` synthetic transfers, in a fresh process.
+
+    The app and its module-level caches (block cache, feature store, model
+    registry) only ever see this size's data.
+    """
+    output = sys.stderr if settings['verbose'] else open(os.devnull, 'w')
+    with contextlib.redirect_stdout(output), tempfile.TemporaryDirectory() as tmp:
+        from app import create_app
+        from app.routes import detect_anomalies, fetch_transactions, monitored_tokens
+        from app.utils.ingest_cursor import advance_cursors
+        from app.utils.log_fetcher import RateLimiter, log_fetcher
+        from app.utils.model_executor import model_executor
+        from app.utils.model_registry import model_registry
+        from benchmarks.fake_rpc import FakeChain, FakeRPCServer
+        from benchmarks.synthetic import FIRST_BLOCK, synthetic_transfers
+        from config import Config
+
+        class BenchmarkConfig(Config):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tmp, 'benchmark.db')
+            SQLALCHEMY_ENGINE_OPTIONS = {}
+            ANOMALY_DETECTOR = 'batch'
+
+        # Code paths read Config directly, not the app config
+        Config.MODEL_DIR = model_registry.directory = os.path.join(tmp, 'models')
+        Config.ANOMALY_DETECTOR = 'batch'
+        Config.ARCHIVE_BACKEND = ''
+        Config.MONITORED_TOKENS = {'USDC': Config.USDC_CONTRACT_ADDRESS}
+        log_fetcher.rate_limiter = RateLimiter(settings['rate_limit'])
+
+        chain = FakeChain(synthetic_transfers(size, transfers_per_block=settings['transfers_per_block'],
+                                              seed=settings['seed']))
+        server = FakeRPCServer(chain, latency=settings['latency'], max_logs=settings['max_logs'])
+        with server:
+            Config.ALCHEMY_API_URL = server.url
+            app = create_app(BenchmarkConfig)
+            with app.app_context():
+                # Start the sweep at the first synthetic block
+                advance_cursors(monitored_tokens(), FIRST_BLOCK - 1)
+                ingest_seconds, _ = time_call(fetch_transactions)
+                # Let the scoring pass queued by the ingest cycle finish (and the model worker start)
+                model_executor.join()
+
+                cold = []
+                for i in range(settings['repeat']):
+                    model_registry.clear()
+                    model_registry.directory = os.path.join(tmp, f'models-{i}')
+                    cold.append(time_call(detect_anomalies)[0])
+                warm = [time_call(detect_anomalies)[0] for _ in range(settings['repeat'])]
+
+                client = app.test_client()
+                endpoints = {}
+                for name, url in ENDPOINTS.items():
+                    endpoints[name] = {
+                        'uncached': time_endpoint(client, url, settings['requests'], cached=False),
+                        'cached': time_endpoint(client, url, settings['requests'], cached=True)
+                    }
+
+    return {
+        'transfers': size,
+        'blocks': chain.head - chain.first_block + 1,
+        'ingest': {
+            'seconds': round(ingest_seconds, 3),
+            'transfers_per_second': round(size / ingest_seconds, 1),
+            'rpc_requests': server.requests,
+            'rpc_calls': dict(server.calls)
+        },
+        'detect_anomalies': {
+            'cold_ms': round(min(cold) * 1000, 3),
+            'warm_ms': round(min(warm) * 1000, 3)
+        },
+        'endpoints': endpoints
+    }
+
+
+def bench_decode(logs, repeat):
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        from benchmarks.decode_benchmark import run
+        return run(logs, repeat)
+
+
+def isolated(func, *args):
+    """Run `func(*args)` in a freshly spawned interpreter."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+        return executor.submit(func, *args).result()
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten(results, prefix=''):
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f'{prefix}{key}.'))
+        else:
+            flat[f'{prefix}{key}'] = value
+    return flat
+
+
+def regressions(baseline, current, threshold):
+    """
+    Metrics of `current` worse than `baseline` by more than `threshold`.
+
+    Throughputs (`*_per_second`) regress when they drop, durations (`*_ms`,
+    `*seconds`) when they grow; counts are informational only. Metrics
+    missing from either run are skipped.
+
+    Returns
+    -------
+    list
+        `(metric, baseline value, current value, relative change)` tuples.
+    """
+    old, new = flatten(baseline['results']), flatten(current['results'])
+    found = []
+    for metric in sorted(old.keys() & new.keys()):
+        before, after = old[metric], new[metric]
+        if not before or not isinstance(before, (int, float)) or not isinstance(after, (int, float)):
+            continue
+        change = (after - before) / before
+        if metric.endswith('_per_second'):
+            worse = change < -threshold
+        elif metric.endswith('_ms') or metric.endswith('seconds'):
+            worse = change > threshold
+        else:
+            continue
+        if worse:
+            found.append((metric, before, after, change))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help='Transfers per run')
+    parser.add_argument('--transfers-per-block', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every RPC request')
+    parser.add_argument('--max-logs', type=int, default=10000, help='Largest eth_getLogs response allowed')
+    parser.add_argument('--rate-limit', type=float, default=0,
+                        help='RPC requests per second of the log fetcher, 0 to measure the code alone')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint measurement')
+    parser.add_argument('--repeat', type=int, default=3, help='Repeats of the scoring measurements (best kept)')
+    parser.add_argument('--decode-logs', type=int, default=50000, help='Logs of the decoder benchmark, 0 to skip')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Write the JSON results here instead of stdout')
+    parser.add_argument('--compare', help='Earlier results to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Relative change counted as a regression')
+    parser.add_argument('--verbose', action='store_true', help="Show the app's own output on stderr")
+    args = parser.parse_args()
+
+    settings = {
+        'transfers_per_block': args.transfers_per_block,
+        'latency': args.latency,
+        'max_logs': args.max_logs,
+        'rate_limit': args.rate_limit,
+        'requests': args.requests,
+        'repeat': args.repeat,
+        'seed': args.seed,
+        'verbose': args.verbose
+    }
+    results = {}
+    for size in args.sizes:
+        result = results[str(size)] = isolated(bench_size, size, settings)
+        print(f"{size} transfers: ingest {result['ingest']['transfers_per_second']:.0f}/s, "
+              f"detect_anomalies {result['detect_anomalies']['cold_ms']:.0f} ms cold "
+              f"/ {result['detect_anomalies']['warm_ms']:.0f} ms warm, "
+              f"/api/transactions p99 {result['endpoints']['transactions']['uncached']['p99_ms']:.1f} ms",
+              file=sys.stderr)
+    if args.decode_logs:
+        results['decode'] = isolated(bench_decode, args.decode_logs, args.repeat)
+
+    report = {
+        'format': FORMAT_VERSION,
+        'commit': git_commit(),
+        'created_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': {key: value for key, value in settings.items() if key != 'verbose'},
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get('settings') != report['settings']:
+            print(f"Warning: {args.compare} was run with different settings: {baseline.get('settings')}",
+                  file=sys.stderr)
+        found = regressions(baseline, report, args.threshold)
+        for metric, before, after, change in found:
+            print(f"REGRESSION {metric}: {before} -> {after} ({change:+.0%})", file=sys.stderr)
+        print(f"{len(found)} regressions against {args.compare} (commit {baseline.get('commit')})", file=sys.stderr)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
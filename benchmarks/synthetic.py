@@ -0,0 +1,86 @@
+"""
+Synthetic ERC-20 Transfer logs shaped like real stablecoin traffic.
+
+Senders follow a Pareto distribution over the address pool, so a few hot
+addresses (exchanges, bridges) dominate as on mainnet, while receivers are
+uniform. Amounts are log-normal around ~100 tokens with rare outliers.
+Everything is derived from `seed`, so two runs produce the same chain.
+"""
+import math
+import random
+
+from app.utils.log_decoder import TRANSFER_TOPIC
+from config import Config
+
+FIRST_BLOCK = 5000000
+FIRST_TIMESTAMP = 1700000000
+BLOCK_TIME = 12
+
+
+def _topic(address):
+    return '0x' + '0' * 24 + address
+
+
+def synthetic_transfers(count, transfers_per_block=20, n_addresses=2000, tokens=None, decimals=6,
+                        first_block=FIRST_BLOCK, outlier_rate=0.001, seed=42):
+    """
+    Raw `eth_getLogs` entries for `count` Transfer logs.
+
+    Parameters
+    ----------
+    count : int
+        Number of logs.
+    transfers_per_block : int
+        Logs per block; blocks are consecutive from `first_block`.
+    n_addresses : int
+        Size of the sender/receiver pool.
+    tokens : list of str, optional
+        Emitting contracts, picked uniformly, by default USDC.
+    decimals : int
+        Token decimals used to scale amounts to base units.
+    outlier_rate : float
+        Share of transfers with an amount a thousand times larger.
+
+    Returns
+    -------
+    list
+        Log dicts with hex fields, as a node returns them.
+    """
+    rng = random.Random(seed)
+    tokens = [token.lower() for token in (tokens or [Config.USDC_CONTRACT_ADDRESS])]
+    addresses = ['%040x' % rng.getrandbits(160) for _ in range(n_addresses)]
+    unit = 10 ** decimals
+    logs = []
+    for i in range(count):
+        sender = addresses[min(int(rng.paretovariate(1.2)) - 1, n_addresses - 1)]
+        receiver = rng.choice(addresses)
+        amount = math.exp(rng.gauss(math.log(100), 1.5))
+        if rng.random() < outlier_rate:
+            amount *= 1000
+        block = first_block + i // transfers_per_block
+        logs.append({
+            'address': rng.choice(tokens),
+            'topics': [TRANSFER_TOPIC, _topic(sender), _topic(receiver)],
+            'data': '0x%064x' % int(amount * unit),
+            'blockNumber': hex(block),
+            'transactionHash': '0x%064x' % rng.getrandbits(256),
+            'transactionIndex': hex(i % transfers_per_block),
+            'blockHash': '0x%064x' % block,
+            'logIndex': hex(i % transfers_per_block),
+            'removed': False
+        })
+    return logs
+
+
+def block_header(number, first_block=FIRST_BLOCK, first_timestamp=FIRST_TIMESTAMP):
+    """Minimal `eth_getBlockByNumber` result (without transactions) for a synthetic block."""
+    return {
+        'number': hex(number),
+        'hash': '0x%064x' % number,
+        'parentHash': '0x%064x' % (number - 1),
+        'timestamp': hex(first_timestamp + BLOCK_TIME * (number - first_block)),
+        'miner': '0x' + '0' * 40,
+        'gasLimit': hex(30000000),
+        'gasUsed': hex(0),
+        'transactions': []
+    }
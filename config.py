@@ -15,18 +15,32 @@ print("Environment variables after loading:")
 print(f"ALCHEMY_API_URL: {os.getenv('ALCHEMY_API_URL')}")
 print(f"SECRET_KEY: {os.getenv('SECRET_KEY')}")
 
+def parse_tokens(value, default):
+    """Parse 'SYMBOL:address,...' into an ordered {symbol: address} dict."""
+    if not value:
+        return dict(default)
+    tokens = {}
+    for item in value.split(','):
+        symbol, _, address = item.strip().partition(':')
+        tokens[symbol.strip().upper()] = address.strip()
+    return tokens
+
 class Config:
     # Flask settings
     SECRET_KEY = 'dev-key-for-demo'
     
     # Database settings
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///stablecoin_monitor.db'
+    # DATABASE_URL selects PostgreSQL in deployments (.ebextensions/02_postgres.config)
+    SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite:///stablecoin_monitor.db').replace(
+        'postgres://', 'postgresql://', 1)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ENGINE_OPTIONS = {
         'pool_pre_ping': True,
         'pool_recycle': 300,
         'connect_args': {'timeout': 30}  # Increase timeout for SQLite
     }
+    # Database of the test suite; a scratch PostgreSQL URL runs the suite there (its tables are dropped)
+    TEST_DATABASE_URL = os.getenv('TEST_DATABASE_URL', 'sqlite://').replace('postgres://', 'postgresql://', 1)
     
     # Alchemy API settings
     ALCHEMY_API_KEY = 'rfwQB8OillDjzA2Jmn5xD7yELbxf1oiI'
@@ -34,7 +48,165 @@ class Config:
     
     # USDC Contract address on Sepolia
     USDC_CONTRACT_ADDRESS = '0x1c7D4B196Cb0C7B01d743Fbc6116a902379C7238'
+    # Tokens whose Transfer logs are fetched together in one eth_getLogs sweep,
+    # e.g. MONITORED_TOKENS="USDC:0x1c7D...,PYUSD:0xCaC5..."
+    MONITORED_TOKENS = parse_tokens(os.getenv('MONITORED_TOKENS'), {'USDC': USDC_CONTRACT_ADDRESS})
+    # Known token decimals; other tokens are read once with decimals()
+    TOKEN_DECIMALS = {USDC_CONTRACT_ADDRESS: 6}
+    TOKEN_DECIMALS_REFRESH = 60  # Seconds between reads of the decimals other tokens have stored
+    RAW_LOG_DECODER = True  # Decode raw eth_getLogs output instead of web3 contract events
     
     # Monitoring settings
     TRANSACTION_BATCH_SIZE = 100  # Number of transactions to fetch per request
-    UPDATE_INTERVAL = 60  # Seconds between updates
\ No newline at end of file
+    UPDATE_INTERVAL = 60  # Seconds between updates
+    INSERT_BATCH_SIZE = 500  # Rows per multi-row INSERT statement
+
+    # Incremental ingestion settings
+    CONFIRMATION_DEPTH = 3  # Blocks behind the head before a block is ingested
+    INGEST_CHUNK_SIZE = 10000  # Blocks fetched and committed per cursor advance
+    INITIAL_LOOKBACK_BLOCKS = 2000  # Blocks scanned when a contract has no cursor yet
+    MAX_CATCHUP_CHUNKS = 10  # Chunks processed per cycle when catching up after downtime
+
+    # Ingestion pipeline settings
+    HEAD_POLL_INTERVAL = 2  # Seconds between chain head checks
+    PIPELINE_QUEUE_SIZE = 4  # Batches buffered between two stages before upstream waits
+    PIPELINE_FETCH_WORKERS = 2  # Block ranges fetched concurrently
+    PIPELINE_RETRIES = 3  # Retries of a failed RPC stage call before the pipeline stops
+    PIPELINE_MAINTENANCE_INTERVAL = 60  # Minimum seconds between prune/snapshot/scoring passes
+    PIPELINE_STATS_INTERVAL = 60  # Seconds between throughput reports
+    PIPELINE_RESTART_DELAY = 30  # Seconds before a failed pipeline is restarted
+    INGEST_IN_WEB_PROCESS = os.getenv('INGEST_IN_WEB_PROCESS', 'true').lower() in ('1', 'true', 'yes')
+
+    # Change feed settings (API processes next to a separate ingest process)
+    CHANGE_FEED_INTERVAL = 1.0  # Seconds between polls for transfers committed by the ingest process
+    CHANGE_FEED_BATCH_SIZE = 5000  # Transfers read per poll
+    CHANGE_FEED_MAX_PENDING = 10000  # Unscored transfers re-checked for anomaly flags
+
+    # eth_getLogs range splitting
+    LOG_CHUNK_SIZE = 2000  # Initial blocks per eth_getLogs request, adapted at runtime
+    LOG_TARGET_PER_REQUEST = 5000  # Logs per response the chunk size aims for
+    LOG_FETCH_WORKERS = 4  # Concurrent eth_getLogs requests
+    RPC_RATE_LIMIT = 10  # Max RPC requests started per second by the log fetcher
+
+    # Anomaly detection settings
+    ANOMALY_WINDOW = 1000  # Most recent transactions scored per pass
+    ANOMALY_CONTAMINATION = 0.05  # Expected share of anomalies
+    # 'batch' refits/scores IsolationForest after each cycle, 'streaming' scores each transfer as it is decoded
+    ANOMALY_DETECTOR = os.getenv('ANOMALY_DETECTOR', 'batch')
+    STREAMING_WINDOW_SIZE = 250  # Transfers per half-space-tree reference window
+    STREAMING_THRESHOLD = 3.0  # Std deviations below the running mean score that flag an anomaly
+
+    # Per-address feature store settings
+    FEATURE_WINDOWS = {'1h': 3600, '24h': 86400}  # Rolling windows of address activity, in seconds
+    FEATURE_STORE_MAX_ADDRESSES = 100000  # Least recently active addresses are evicted beyond this
+    FEATURE_STORE_TTL = 7 * 86400  # Seconds of inactivity before an address is evicted
+    FEATURE_STORE_RECENT = 5000  # Point-in-time feature vectors kept for batch scoring
+
+    # Hot window settings
+    HOT_WINDOW_ENABLED = os.getenv('HOT_WINDOW_ENABLED', 'true').lower() in ('1', 'true', 'yes')  # Serve recent data from memory
+    HOT_WINDOW_HOURS = 24  # Hours of transfers loaded into memory when ingestion starts (the dashboard's day)
+    HOT_WINDOW_CAPACITY = 500000  # Transfers held in the ring buffer (~120 bytes each)
+    HOT_WINDOW_MAX_ADDRESSES = 1000000  # Interned addresses before compacting to live ones
+    RECENT_MAX_BUCKETS = 10000  # Most buckets one /api/recent/histogram response may hold
+    RECENT_MAX_SPAN = 7 * 86400  # Most seconds between start and end of one /api/recent/histogram request
+
+    # Transfer graph settings
+    GRAPH_MAX_EDGES = 2000000  # Newest transfers kept in the in-memory graph (~24 bytes each)
+    GRAPH_MAX_ADDRESSES = 1000000  # Interned addresses before compacting to live ones
+    GRAPH_MAX_HOPS = 3  # Deepest neighborhood expansion allowed by the API
+    GRAPH_MAX_NODES = 2000  # Addresses returned by a neighborhood query before truncating
+    GRAPH_CYCLE_MAX_LENGTH = 4  # Longest cycle searched for
+    GRAPH_CYCLE_ORIGINS = 100  # Most connected addresses searched when no origin is given
+    GRAPH_CYCLE_MAX_STEPS = 200000  # Edge expansions per cycle query
+
+    # Dashboard settings
+    ROLLUP_MINUTE_RETENTION = 48  # Hours of per-minute rollup buckets to keep
+    DASHBOARD_TABLE_ROWS = 100  # Latest transactions listed on /dashboard
+    API_PAGE_SIZE = 50  # Default page size of /api/transactions
+    API_MAX_PAGE_SIZE = 1000  # Largest page a client may request
+    EXPORT_CHUNK_SIZE = 1000  # Rows fetched and serialized per chunk of a streaming export
+    RESPONSE_CACHE_SIZE = 256  # Cached endpoint responses kept in the in-process LRU
+    RESPONSE_CACHE_TTL = 60  # Seconds before a cached response expires even without new commits
+
+    # Server-sent events settings
+    SSE_QUEUE_SIZE = 1000  # Events buffered per client before a slow client is dropped
+    SSE_HISTORY_SIZE = 10000  # Recent events kept for Last-Event-ID resume
+    SSE_HEARTBEAT_INTERVAL = 15  # Seconds between keep-alive comments
+    SSE_RETRY_MS = 5000  # Reconnect delay suggested to clients
+
+    # Model registry settings
+    MODEL_DIR = os.getenv('MODEL_DIR', os.path.join(app_dir, 'instance', 'models'))
+    MODEL_RETRAIN_INTERVAL = 3600  # Seconds before a cached model is refit
+    MODEL_DRIFT_THRESHOLD = 0.5  # Feature mean shift, in training std units, that forces a refit
+    MODEL_MIN_TRAINING_ROWS = 100  # Smaller training sets are used once but never cached
+    MODEL_KEEP_VERSIONS = 3  # Saved versions kept per model; older model files are deleted
+
+    # Model executor settings
+    # 'process' fits and bulk-scores anomaly models in a worker process, 'inline' in the calling thread
+    MODEL_EXECUTOR = os.getenv('MODEL_EXECUTOR', 'process')
+    MODEL_FIT_TIMEOUT = 300  # Seconds before a fit is abandoned and the worker restarted
+    MODEL_SCORE_TIMEOUT = 60  # Seconds before a bulk scoring call is abandoned
+    MODEL_EXECUTOR_CACHE_SIZE = 16  # Fitted models kept in the worker, so scoring does not resend them
+
+    # RPC settings
+    RPC_TIMEOUT = 30  # Seconds before an RPC request is abandoned
+    RPC_BATCH_SIZE = 100  # Calls per JSON-RPC batch request
+    BLOCK_CACHE_SIZE = 10000  # Block headers kept in the LRU cache
+
+    # Token balance settings
+    BALANCE_POOL_SIZE = 10  # Keep-alive connections to the balance provider
+    BALANCE_CONNECT_TIMEOUT = 3  # Seconds to establish a connection
+    BALANCE_READ_TIMEOUT = 10  # Seconds to wait for a balance response
+    BALANCE_PAGE_SIZE = 100  # Token balances requested per page
+    BALANCE_CACHE_SIZE = 10000  # Addresses whose balances are cached
+    BALANCE_CACHE_TTL = 60  # Seconds a cached balance is served within the same block
+    BALANCE_MAX_ADDRESSES = 100  # Addresses accepted by one batch request
+
+    # Transaction archive settings
+    ARCHIVE_BACKEND = os.getenv('ARCHIVE_BACKEND', '')  # 'local' or 's3' archives every newly stored transfer; empty disables
+    ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', os.path.join(app_dir, 'instance', 'archive'))  # Root of the local backend
+    ARCHIVE_BUCKET = os.getenv('AWS_S3_BUCKET')  # Bucket of the s3 backend
+    ARCHIVE_PREFIX = 'transactions'  # Key prefix of the date=/hour= partitions
+    ARCHIVE_FORMAT = os.getenv('ARCHIVE_FORMAT', 'parquet')  # 'parquet' (needs pyarrow) or 'ndjson' (gzipped)
+    ARCHIVE_ROW_GROUP_SIZE = 50000  # Rows per Parquet row group or NDJSON write
+    ARCHIVE_PART_SIZE = 8 * 1024 * 1024  # Bytes per S3 multipart part (S3 minimum is 5 MiB)
+    ARCHIVE_FLUSH_ROWS = 50000  # Buffered rows of one hour partition that are written as a file
+    ARCHIVE_FLUSH_AGE = 300  # Seconds before a partition's buffered rows are written anyway
+    ARCHIVE_MAX_PENDING = 500000  # Buffered rows beyond which new ones are left out of the archive
+
+    # Historical backfill settings
+    BACKFILL_UNIT_SIZE = 5000  # Blocks per checkpointed work unit
+    BACKFILL_WORKERS = 4  # Units fetched concurrently
+    BACKFILL_PROGRESS_INTERVAL = 10  # Seconds between blocks/sec and ETA reports
+
+    # Metrics and profiling settings
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')  # Record and serve /metrics
+    METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))  # Port of ingest.py's own /metrics server; 0 disables
+    PROFILER_ENABLED = os.getenv('PROFILER_ENABLED', 'false').lower() in ('1', 'true', 'yes')  # Allow /api/profiler
+    PROFILER_INTERVAL = 0.01  # Seconds between stack samples
+    PROFILER_MAX_DURATION = 3600  # Seconds a profiler started over the API runs at most
+    PROFILER_MAX_STACKS = 10000  # Distinct stacks kept; samples of newer ones are only counted
+
+    # Storage mode settings
+    # 'auto' uses 'wal' for SQLite files, 'postgresql' for PostgreSQL and 'default' otherwise
+    STORAGE_MODE = os.getenv('STORAGE_MODE', 'auto')
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',  # Readers and the writer no longer block each other
+        'synchronous': 'NORMAL',  # fsync at checkpoints only; durable in WAL except on power loss
+        'busy_timeout': 30000,  # Milliseconds to wait for another process's write lock
+        'cache_size': -65536,  # Page cache per connection, in KiB when negative
+        'temp_store': 'MEMORY',
+        'mmap_size': 268435456,  # Bytes of the DB file read through mmap
+        'wal_autocheckpoint': 10000  # Pages in the WAL before it is checkpointed
+    }
+    SQLITE_BUSY_TIMEOUT = 30  # Seconds the sqlite3 driver waits on a locked database
+    SQLITE_WRITE_POOL_SIZE = 4  # Pooled read-write connections in 'wal' mode
+    SQLITE_READ_POOL_SIZE = 8  # Pooled read-only connections serving GET requests in 'wal' mode
+    WRITE_QUEUE_SIZE = 64  # Write jobs waiting for the writer thread before callers block
+    POSTGRES_POOL_SIZE = 10  # Persistent connections per process
+    POSTGRES_MAX_OVERFLOW = 10  # Extra connections opened under load
+    POSTGRES_POOL_TIMEOUT = 10  # Seconds to wait for a free connection
+    POSTGRES_POOL_RECYCLE = 1800  # Seconds before a connection is replaced
+    POSTGRES_CONNECT_TIMEOUT = 10  # Seconds to establish a connection
+    POSTGRES_STATEMENT_TIMEOUT_MS = 60000  # Server-side limit per statement
+    COPY_MIN_ROWS = 1000  # Bulk inserts of at least this many rows use COPY on PostgreSQL
@@ -14,6 +14,8 @@ import Statistics from './Statistics';
 import Charts from './Charts';
 import api from '../services/api';
 
+const MAX_TRANSACTIONS = 100;
+
 const DashboardPaper = styled(Paper)(({ theme }) => ({
     padding: theme.spacing(3),
     display: 'flex',
@@ -118,9 +120,40 @@ const Dashboard = () => {
         };
 
         fetchData();
-        // Refresh data every 30 seconds
-        const interval = setInterval(fetchData, 30000);
-        return () => clearInterval(interval);
+
+        // Apply pushed updates instead of polling every endpoint
+        const unsubscribe = api.subscribe({
+            transaction: (tx) => setDashboardData((data) => {
+                const transactionCount = data.transaction_count + 1;
+                const totalVolume = data.total_volume + Number(tx.amount || 0);
+                return {
+                    ...data,
+                    total_volume: totalVolume,
+                    transaction_count: transactionCount,
+                    avg_transaction: totalVolume / transactionCount,
+                    fraud_count: data.fraud_count + (tx.is_anomaly ? 1 : 0),
+                    transactions: [tx, ...data.transactions].slice(0, MAX_TRANSACTIONS)
+                };
+            }),
+            anomaly: (update) => setDashboardData((data) => ({
+                ...data,
+                fraud_count: data.fraud_count + (update.is_anomaly ? 1 : -1),
+                transactions: data.transactions.map((tx) => (
+                    // One transaction can emit several transfers; only the flagged log changes
+                    tx.tx_hash === update.tx_hash && (tx.log_index ?? null) === (update.log_index ?? null)
+                        ? { ...tx, is_anomaly: update.is_anomaly, anomaly_score: update.anomaly_score }
+                        : tx
+                ))
+            })),
+            // The server no longer has the events we missed: start over
+            reset: fetchData
+        });
+        // Slow refresh to correct drift, e.g. transactions leaving the 24h window
+        const interval = setInterval(fetchData, 300000);
+        return () => {
+            unsubscribe();
+            clearInterval(interval);
+        };
     }, []);
 
     if (loading) {
@@ -52,6 +52,19 @@ const api = {
         }
     },
 
+    // Subscribe to live transactions, rollup deltas and anomaly flags.
+    // EventSource reconnects on its own and resends Last-Event-ID.
+    subscribe: (handlers) => {
+        const source = new EventSource(`${API_BASE_URL}/api/stream`);
+        ['transaction', 'rollup', 'anomaly', 'reset'].forEach((type) => {
+            if (handlers[type]) {
+                source.addEventListener(type, (event) => handlers[type](JSON.parse(event.data)));
+            }
+        });
+        source.onerror = (error) => console.error('Event stream error:', error);
+        return () => source.close();
+    },
+
     // Get token balances for an address
     getTokenBalances: async (address) => {
         try {
@@ -61,6 +74,17 @@ const api = {
             console.error('Error fetching token balances:', error);
             throw error;
         }
+    },
+
+    // Get token balances for several addresses in one request
+    getTokenBalancesBatch: async (addresses) => {
+        try {
+            const response = await axios.post(`${API_BASE_URL}/api/token-balances`, { addresses });
+            return response.data;
+        } catch (error) {
+            console.error('Error fetching token balances:', error);
+            throw error;
+        }
     }
 };
 
@@ -0,0 +1,47 @@
+"""
+Standalone ingestion process.
+
+Runs the staged asyncio ingestion pipeline outside the web server:
+
+    INGEST_IN_WEB_PROCESS=false python run.py   # API only
+    python ingest.py                             # ingestion only
+
+The API process follows the transfers committed here by polling the
+database (see `app.utils.change_feed`).
+
+SIGINT/SIGTERM flush the batches in flight and exit; a second signal
+exits immediately. With METRICS_PORT set, the process serves its own
+Prometheus `/metrics` on that port.
+"""
+import time
+
+from app import create_app
+from app.pipeline import run_pipeline
+from app.utils.metrics import serve_metrics
+from app.utils.migrations import migrate_database
+from app.utils.model_executor import model_executor
+from config import Config
+
+
+def main():
+    app = create_app()
+    with app.app_context():
+        migrate_database(Config.USDC_CONTRACT_ADDRESS)
+    model_executor.start()
+    if Config.METRICS_PORT:
+        serve_metrics(Config.METRICS_PORT)
+        print(f"Serving /metrics on port {Config.METRICS_PORT}")
+    while True:
+        try:
+            pipeline = run_pipeline(app, install_signal_handlers=True)
+        except Exception as e:
+            print(f"Ingestion pipeline failed, restarting in {Config.PIPELINE_RESTART_DELAY}s: {e}")
+            time.sleep(Config.PIPELINE_RESTART_DELAY)
+            continue
+        if pipeline.error is None:
+            # Stopped by a signal
+            return
+
+
+if __name__ == '__main__':
+    main()
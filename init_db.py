@@ -1,11 +1,13 @@
 from app import create_app, db
 from app.models import Transaction
+from app.utils.migrations import migrate_database
+from config import Config
 
 def init_db():
     app = create_app()
     with app.app_context():
-        # Create all tables
-        db.create_all()
+        # Create all tables and upgrade an existing database to the current models
+        migrate_database(Config.USDC_CONTRACT_ADDRESS)
         print("Database initialized successfully!")
 
 if __name__ == '__main__':
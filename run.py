@@ -1,23 +1,40 @@
 from app import create_app
 import threading
 import time
-from app.routes import fetch_transactions
+from app.pipeline import run_pipeline
+from app.utils.change_feed import change_feed
+from app.utils.migrations import migrate_database
+from app.utils.model_executor import model_executor
+from config import Config
 
-app = create_app()
+# The model executor's worker process re-imports this script as __mp_main__;
+# it must not build an app of its own
+app = create_app() if __name__ != '__mp_main__' else None
 
 def monitor_transactions():
-    with app.app_context():
-        while True:
-            try:
-                fetch_transactions()
-            except Exception as e:
-                print(f"Error fetching transactions: {e}")
-            time.sleep(60)  # Wait for 1 minute before next fetch
+    # Ingestion is driven by new block heads; restart the pipeline after a failure
+    while True:
+        try:
+            run_pipeline(app)
+        except Exception as e:
+            print(f"Error fetching transactions: {e}")
+        time.sleep(Config.PIPELINE_RESTART_DELAY)
 
 if __name__ == '__main__':
-    # Start transaction monitoring in a separate thread
-    monitor_thread = threading.Thread(target=monitor_transactions, daemon=True)
-    monitor_thread.start()
+    # Start transaction monitoring in a separate thread, unless ingest.py runs it
+    # as its own process (INGEST_IN_WEB_PROCESS=false)
+    if Config.INGEST_IN_WEB_PROCESS:
+        with app.app_context():
+            migrate_database(Config.USDC_CONTRACT_ADDRESS)
+        model_executor.start()
+        monitor_thread = threading.Thread(target=monitor_transactions, daemon=True)
+        monitor_thread.start()
+    else:
+        # Stream events, graph edges and cache invalidation follow ingest.py's commits
+        change_feed.start(app)
     
     # Start Flask application
-    app.run(host='0.0.0.0', port=5006, debug=True)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=5006, debug=True)
+elif app is not None:
+    # Served by a WSGI server (gunicorn run:app), which never ingests itself
+    change_feed.start(app)
\ No newline at end of file
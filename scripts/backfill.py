@@ -0,0 +1,69 @@
+"""
+Load the Transfer history of every monitored token over a block or date range.
+
+    python -m scripts.backfill --from-block 5000000 --to-block 5600000 --workers 8
+    python -m scripts.backfill --from-date 2025-01-01 --to-date 2025-04-01 --drop-indexes
+
+Progress is checkpointed per work unit: re-running the same command after a
+crash or Ctrl+C resumes with the units that were not loaded yet.
+"""
+import argparse
+from datetime import datetime, timezone
+
+from app import create_app
+from app.routes import get_web3
+from app.utils.backfill import block_at_time, run_backfill, unfinished_job
+from app.utils.migrations import migrate_database
+from config import Config
+
+
+def utc_timestamp(value):
+    return value.replace(tzinfo=value.tzinfo or timezone.utc).timestamp()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--from-block', type=int)
+    parser.add_argument('--to-block', type=int, help='Last block to load, by default the last confirmed block')
+    parser.add_argument('--from-date', type=datetime.fromisoformat, help='ISO-8601 date or time (UTC)')
+    parser.add_argument('--to-date', type=datetime.fromisoformat, help='Load blocks mined before this (UTC)')
+    parser.add_argument('--workers', type=int, default=Config.BACKFILL_WORKERS)
+    parser.add_argument('--unit-size', type=int, default=Config.BACKFILL_UNIT_SIZE, help='Blocks per work unit')
+    parser.add_argument('--job', help='Checkpoint name, by default the block range; without an end '
+                                      'block an unfinished job from the same start is resumed')
+    parser.add_argument('--drop-indexes', action='store_true',
+                        help='Drop secondary indexes during the load and rebuild them at the end')
+    args = parser.parse_args()
+    if (args.from_block is None) == (args.from_date is None):
+        parser.error('exactly one of --from-block and --from-date is required')
+
+    app = create_app()
+    with app.app_context():
+        migrate_database(Config.USDC_CONTRACT_ADDRESS)
+        w3 = get_web3()
+        head = w3.eth.block_number
+        safe_head = head - Config.CONFIRMATION_DEPTH
+        start_block = args.from_block
+        if start_block is None:
+            start_block = block_at_time(w3, utc_timestamp(args.from_date), head)
+        end_block = args.to_block
+        if end_block is None and args.to_date is not None:
+            end_block = block_at_time(w3, utc_timestamp(args.to_date), head) - 1
+        job = args.job
+        resumed = unfinished_job(start_block) if end_block is None and job is None else None
+        if resumed is not None:
+            # Up to the head it was started at, or the same command would plan a new job
+            job, end_block = resumed
+            print(f"Resuming backfill {job}")
+        end_block = min(end_block if end_block is not None else safe_head, safe_head)
+        if end_block < start_block:
+            parser.error(f'empty block range {start_block}-{end_block}')
+
+        result = run_backfill(w3, start_block, end_block, job=job, workers=args.workers,
+                              unit_size=args.unit_size, drop_indexes=args.drop_indexes)
+    print(f"Loaded {result['blocks']} blocks ({result['inserted']} transfers inserted) "
+          f"at {result['blocks_per_second']:.0f} blocks/s")
+
+
+if __name__ == '__main__':
+    main()
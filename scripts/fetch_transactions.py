@@ -1,39 +1,43 @@
-from app.utils.alchemy_api import get_usdc_transactions
+from app import create_app
+from app.routes import get_web3
+from app.utils.backfill import fetch_range_rows
+from app.utils.bulk_insert import bulk_insert_transactions
+from app.utils.migrations import migrate_database
 from app.utils.fraud_detection import detect_fraud
+from app.utils.rollups import update_rollups
 from app.utils.s3_storage import store_transactions_to_s3
-from app import db, models
+from config import Config
 import os
 
+RECENT_BLOCKS = 100  # For months of history use scripts/backfill.py
+
 def main():
-    api_key = os.getenv('ALCHEMY_API_KEY')
     bucket_name = os.getenv('AWS_S3_BUCKET')
-    
-    # Fetch transactions
-    transactions = get_usdc_transactions(api_key)
-    if not transactions:
-        print("No transactions fetched")
-        return
-    
-    # Detect fraud
-    transactions = detect_fraud(transactions)
-    
-    # Store to S3
-    s3_key = store_transactions_to_s3(transactions, bucket_name)
-    print(f"Stored transactions to S3: {s3_key}")
-    
-    # Store to PostgreSQL
-    for tx in transactions:
-        transaction = models.Transaction(
-            tx_hash=tx['hash'],
-            amount=tx['amount'],
-            sender=tx['sender'],
-            receiver=tx['receiver'],
-            timestamp=tx['timestamp'],
-            is_fraud=tx['is_fraud']
-        )
-        db.session.add(transaction)
-    db.session.commit()
-    print("Stored transactions to PostgreSQL")
+    app = create_app()
+    with app.app_context():
+        migrate_database(Config.USDC_CONTRACT_ADDRESS)
+
+        # Fetch Transfer events of the monitored tokens in the last confirmed blocks
+        w3 = get_web3()
+        end_block = w3.eth.block_number - Config.CONFIRMATION_DEPTH
+        transactions = fetch_range_rows(w3, max(end_block - RECENT_BLOCKS + 1, 0), end_block)
+        if not transactions:
+            print("No transactions fetched")
+            return
+
+        # Detect fraud (detect_fraud expects unix timestamps)
+        flagged = detect_fraud([dict(tx, timestamp=tx['timestamp'].timestamp()) for tx in transactions])
+        for tx, result in zip(transactions, flagged):
+            tx['is_anomaly'] = bool(result['is_fraud'])
+
+        # Store to S3
+        if bucket_name:
+            s3_keys = store_transactions_to_s3(transactions, bucket_name)
+            print(f"Stored transactions to S3: {', '.join(s3_keys)}")
+
+        # Store to the database
+        inserted, skipped = bulk_insert_transactions(transactions, on_insert=update_rollups)
+        print(f"Stored {inserted} transactions to the database ({skipped} already stored)")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,64 @@
+"""
+Shared test configuration, app fixture and transaction row factory.
+
+Every test database is TEST_DATABASE_URL: in-memory SQLite by default, or
+a scratch PostgreSQL database whose tables the tests drop.
+"""
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from app import create_app, db
+from app.utils.model_registry import model_registry
+from config import Config
+
+START = datetime(2025, 5, 25, 12, 0, 0)
+
+class TestConfig(Config):
+    SQLALCHEMY_DATABASE_URI = Config.TEST_DATABASE_URL
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+
+def make_row(n, **fields):
+    """
+    Transaction row `n`: its own tx hash, block 1000 + n mined 12 seconds
+    after block n - 1 (from START), amount n; `fields` override any column.
+    """
+    row = {
+        'tx_hash': f'0x{n:064x}',
+        'token_address': Config.USDC_CONTRACT_ADDRESS,
+        'from_address': '0x' + 'a' * 40,
+        'to_address': '0x' + 'b' * 40,
+        'amount': float(n),
+        'block_number': 1000 + n,
+        'log_index': 0,
+        'timestamp': START + timedelta(seconds=12 * n),
+        'is_anomaly': False,
+        'anomaly_score': None
+    }
+    row.update(fields)
+    return row
+
+class AppTestCase(unittest.TestCase):
+    """Runs each test in an app context of a fresh `config_class` app, with a test client; drops the tables after."""
+
+    config_class = TestConfig
+
+    def setUp(self):
+        self.app = create_app(self.config_class)
+        self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def use_temporary_model_dir(self):
+        """Point the model registry at a directory removed after the test, so no real model is read or written."""
+        directory = tempfile.TemporaryDirectory()
+        saved_dir = model_registry.directory
+        model_registry.directory = directory.name
+        model_registry.clear()
+        self.addCleanup(directory.cleanup)
+        self.addCleanup(model_registry.clear)
+        self.addCleanup(setattr, model_registry, 'directory', saved_dir)
@@ -0,0 +1,68 @@
+import unittest
+from datetime import datetime, timedelta
+from app import db
+from app.models import Transaction
+from app.utils.address_activity import totals_query
+from app.utils.bulk_insert import bulk_insert_transactions
+from config import Config
+from helpers import START, AppTestCase, make_row
+
+ALICE = '0x' + '1' * 40
+BOB = '0x' + '2' * 40
+
+class TestAddressActivity(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        bulk_insert_transactions([make_row(
+            n,
+            from_address=ALICE if n % 2 == 0 else BOB,
+            to_address=BOB if n % 2 == 0 else ALICE,
+            amount=10.0,
+            timestamp=START + timedelta(minutes=n),
+            is_anomaly=n == 4
+        ) for n in range(6)])
+
+    def test_activity_totals_and_range(self):
+        """
+        Tests that the activity endpoint splits inbound and outbound totals,
+        counts anomalies and honours the time range.
+        """
+        response = self.client.get(f'/api/address/{ALICE}/activity?start=2025-05-25T12:01:00')
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(data['outbound'], {'count': 2, 'volume': 20.0, 'anomalies': 1})
+        self.assertEqual(data['inbound']['count'], 3)
+        self.assertEqual(len(data['transfers']), 5)
+        self.assertEqual(self.client.get('/api/address/not-an-address/activity').status_code, 400)
+
+    def test_time_args_with_timezone_or_out_of_range(self):
+        """
+        Tests that ISO times with a timezone are read as the UTC time they
+        denote, and that out-of-range unix times are rejected with a 400.
+        """
+        expected = self.client.get(f'/api/address/{ALICE}/activity?start=2025-05-25T12:01:00').get_json()
+        for start in ('2025-05-25T12:01:00Z', '2025-05-25T14:01:00%2B02:00'):
+            response = self.client.get(f'/api/address/{ALICE}/activity?start={start}')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.get_json()['inbound'], expected['inbound'])
+        for path in ('/api/recent/histogram', '/api/graph/top-fan', '/api/graph/cycles',
+                     f'/api/graph/neighborhood/{ALICE}'):
+            self.assertEqual(self.client.get(f'{path}?start=2025-05-25T12:00:00Z&end=2025-05-25T13:00:00Z')
+                             .status_code, 200, path)
+        for path in ('/api/recent/histogram', f'/api/address/{ALICE}/activity', '/api/transactions'):
+            self.assertEqual(self.client.get(f'{path}?start=1e20').status_code, 400, path)
+
+    @unittest.skipUnless(Config.TEST_DATABASE_URL.startswith('sqlite'), 'reads the SQLite query plan')
+    def test_activity_totals_use_covering_index(self):
+        """
+        Tests that the totals query address_activity runs is answered from the address index alone.
+        """
+        query = totals_query(Transaction.from_address, ALICE, datetime(2025, 1, 1), None)
+        statement = query.statement.compile(db.engine)
+        params = statement.construct_params()
+        plan = db.session.connection().exec_driver_sql(
+            f'EXPLAIN QUERY PLAN {statement}', tuple(params[name] for name in statement.positiontup)).fetchall()
+        self.assertIn('COVERING INDEX ix_transaction_from_activity', str(plan))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+from datetime import datetime
+from app import db
+from app.models import Transaction
+from app.utils.bulk_insert import bulk_insert_transactions
+from app.utils.event_stream import event_broker
+from app.utils.model_registry import model_registry
+from app.utils.rollups import window_summary
+from config import Config
+from helpers import AppTestCase, make_row
+
+def make_rows(amounts):
+    return [make_row(n, amount=amount, log_index=n % 3) for n, amount in enumerate(amounts)]
+
+class TestDetectAnomalies(AppTestCase):
+    def setUp(self):
+        self.use_temporary_model_dir()
+        super().setUp()
+
+    def test_scores_whole_window_and_flags_outlier(self):
+        """
+        Tests that every transaction in the window gets a score and that an
+        extreme transfer is flagged as an anomaly.
+        """
+        from app.routes import detect_anomalies
+
+        amounts = [100.0 + (n % 7) for n in range(60)]
+        amounts[30] = 5000000.0
+        bulk_insert_transactions(make_rows(amounts))
+
+        subscriber = event_broker.subscribe()
+        try:
+            detect_anomalies()
+        finally:
+            event_broker.unsubscribe(subscriber)
+
+        self.assertEqual(Transaction.query.filter(Transaction.anomaly_score.is_(None)).count(), 0)
+        outlier = Transaction.query.filter_by(amount=5000000.0).one()
+        self.assertTrue(outlier.is_anomaly)
+        events = []
+        while (event := subscriber.get(timeout=0)) is not None:
+            events.append(event['data'])
+        # The stream names the flagged transfer, not only its transaction
+        self.assertIn({'tx_hash': outlier.tx_hash, 'log_index': 0, 'is_anomaly': True},
+                      [{key: data[key] for key in ('tx_hash', 'log_index', 'is_anomaly')} for data in events])
+        self.assertEqual(window_summary(datetime(2025, 5, 25))['anomaly_count'],
+                         Transaction.query.filter_by(is_anomaly=True).count())
+        # A window below MODEL_MIN_TRAINING_ROWS is scored but its model is not cached
+        self.assertEqual(model_registry.load(f'transactions:{Config.USDC_CONTRACT_ADDRESS}'), (None, None))
+
+    def test_cached_model_scores_only_new_rows(self):
+        """
+        Tests that a second pass reuses the cached model version and only
+        scores transactions ingested since the previous pass.
+        """
+        from app.routes import detect_anomalies
+
+        rows = make_rows([100.0 + (n % 7) for n in range(180)])
+        bulk_insert_transactions(rows[:150])
+        detect_anomalies()
+        _, metadata = model_registry.load(f'transactions:{Config.USDC_CONTRACT_ADDRESS}')
+        first_scores = dict(db.session.query(Transaction.id, Transaction.anomaly_score))
+
+        bulk_insert_transactions(rows[150:])
+        detect_anomalies()
+        _, latest = model_registry.load(f'transactions:{Config.USDC_CONTRACT_ADDRESS}')
+
+        self.assertEqual(latest['version'], metadata['version'])
+        self.assertEqual(Transaction.query.filter(Transaction.anomaly_score.is_(None)).count(), 0)
+        for tx_id, score in db.session.query(Transaction.id, Transaction.anomaly_score):
+            if tx_id in first_scores:
+                self.assertEqual(score, first_scores[tx_id])
+
+if __name__ == '__main__':
+    unittest.main()
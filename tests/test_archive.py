@@ -0,0 +1,162 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+from app.models import Transaction, TransactionRollup
+from app.utils.archive import ArchiveQueue, ArchiveReader, ArchiveWriter, LocalBackend, S3Backend, replay
+from app.utils import streaming_detector
+from app.utils.feature_store import AddressFeatureStore, snapshot_path as feature_store_snapshot_path
+from app.utils.rollups import window_summary
+from config import Config
+from helpers import AppTestCase, make_row
+
+def make_rows(count, start=datetime(2025, 5, 25, 11, 30, 0)):
+    return [make_row(n, amount_raw=2 ** 100 + n, timestamp=start + timedelta(minutes=n), is_anomaly=n == 7)
+            for n in range(count)]
+
+class TestArchive(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.backend = LocalBackend(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_partitions_and_round_trip(self):
+        """
+        Tests that rows are split into hourly files named after their block
+        range, that rewriting them reuses the same files, and that they read
+        back exactly, including uint256 amounts.
+        """
+        rows = make_rows(150)
+        writer = ArchiveWriter(self.backend, fmt='ndjson', row_group_size=16)
+        keys = writer.write(rows)
+        self.assertEqual(keys[0].split('/')[:3], ['transactions', 'date=2025-05-25', 'hour=11'])
+        self.assertTrue(keys[0].split('/')[-1].startswith('0000001000-0000001029-'))
+        self.assertEqual(len(keys), 3)
+        self.assertEqual(writer.write(rows), keys)
+        self.assertEqual(len(self.backend.list()), 3)
+
+        reader = ArchiveReader(self.backend)
+        self.assertEqual([row for chunk in reader.iter_chunks() for row in chunk], rows)
+
+    def test_reader_prunes_partitions(self):
+        """
+        Tests that time and block ranges skip whole files and filter the
+        rows of the files they overlap.
+        """
+        ArchiveWriter(self.backend, fmt='ndjson').write(make_rows(150))
+        reader = ArchiveReader(self.backend)
+
+        self.assertEqual(len(reader.keys(start=datetime(2025, 5, 25, 12, 10))), 2)
+        self.assertEqual(len(reader.keys(start_block=1031, end_block=1040)), 1)
+        rows = [row for chunk in reader.iter_chunks(start_block=1031, end_block=1040) for row in chunk]
+        self.assertEqual([row['block_number'] for row in rows], list(range(1031, 1041)))
+
+    def test_queue_writes_complete_hours(self):
+        """
+        Tests that queued rows are written once their hour is complete or
+        on stop, and that stop leaves nothing buffered.
+        """
+        rows = make_rows(90)
+        queue = ArchiveQueue(ArchiveWriter(self.backend, fmt='ndjson'), flush_rows=1000, flush_age=3600)
+        queue.add(rows[:60])
+        keys = queue.flush()
+        self.assertEqual([key.split('/')[2] for key in keys], ['hour=11'])
+        self.assertEqual(queue.stats()['pending'], 30)
+
+        queue.add(rows[60:])
+        queue.stop()
+        self.assertEqual(queue.stats()['pending'], 0)
+        self.assertEqual(queue.stats()['archived'], 90)
+        reader = ArchiveReader(self.backend)
+        self.assertEqual([row for chunk in reader.iter_chunks() for row in chunk], rows)
+
+    def test_s3_multipart_upload(self):
+        """
+        Tests that S3 objects are uploaded in bounded parts and completed,
+        and that a failed write aborts the upload.
+        """
+        client = MagicMock()
+        client.create_multipart_upload.return_value = {'UploadId': 'u1'}
+        client.upload_part.side_effect = lambda **kwargs: {'ETag': f"e{kwargs['PartNumber']}"}
+        backend = S3Backend('bucket', client=client, part_size=1024)
+
+        stream = backend.writer('transactions/x.ndjson.gz')
+        stream.write(b'x' * 1500)
+        stream.write(b'y' * 100)
+        stream.close()
+        self.assertEqual(client.upload_part.call_count, 2)
+        parts = client.complete_multipart_upload.call_args.kwargs['MultipartUpload']['Parts']
+        self.assertEqual(parts, [{'ETag': 'e1', 'PartNumber': 1}, {'ETag': 'e2', 'PartNumber': 2}])
+
+        stream = backend.writer('transactions/y.ndjson.gz')
+        stream.abort()
+        client.abort_multipart_upload.assert_called_once_with(Bucket='bucket', Key='transactions/y.ndjson.gz',
+                                                              UploadId='u1')
+
+class TestReplay(AppTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.backend = LocalBackend(self.directory.name)
+        super().setUp()
+
+    def tearDown(self):
+        super().tearDown()
+        self.directory.cleanup()
+
+    def test_replay_rebuilds_db_and_rollups(self):
+        """
+        Tests that replaying the archive restores every transaction and
+        rebuilds the rollups once, and that a second replay inserts nothing.
+        """
+        ArchiveWriter(self.backend, fmt='ndjson').write(make_rows(90))
+        reader = ArchiveReader(self.backend)
+
+        self.assertEqual(replay(reader), {'rows': 90, 'inserted': 90})
+        self.assertEqual(Transaction.query.count(), 90)
+        self.assertEqual(Transaction.query.filter_by(block_number=1005).one().amount_raw, 2 ** 100 + 5)
+        self.assertGreater(TransactionRollup.query.count(), 0)
+        summary = window_summary(datetime(2025, 5, 25))
+        self.assertEqual((summary['total_transactions'], summary['anomaly_count']), (90, 1))
+
+        self.assertEqual(replay(reader, targets=('db',)), {'rows': 90, 'inserted': 0})
+
+    def test_replay_saves_model_snapshots(self):
+        """
+        Tests that replaying into the models saves the feature store and
+        streaming detector snapshots the processes restore at startup.
+        """
+        ArchiveWriter(self.backend, fmt='ndjson').write(make_rows(90))
+        model_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(model_dir.cleanup)
+        # Fresh state, so the shared feature store and detectors are left alone
+        with patch.object(Config, 'MODEL_DIR', model_dir.name), patch.object(Config, 'ANOMALY_DETECTOR', 'streaming'), \
+                patch('app.utils.feature_store.feature_store', AddressFeatureStore()), \
+                patch.dict(streaming_detector._detectors, clear=True):
+            replay(ArchiveReader(self.backend), targets=('models',))
+            restored = AddressFeatureStore()
+            self.assertTrue(restored.load(feature_store_snapshot_path()))
+            self.assertEqual(restored.stats()['observed'], 90)
+            self.assertTrue(os.path.exists(streaming_detector.snapshot_path(Config.USDC_CONTRACT_ADDRESS)))
+        self.assertEqual(Transaction.query.count(), 0)
+
+    def test_only_inserted_rows_are_queued(self):
+        """
+        Tests that ingestion hands only newly inserted rows to the archive
+        queue, after they are committed.
+        """
+        from app.routes import write_rows
+
+        rows = make_rows(10)
+        # Not streamed, as the shared broker's position only moves forward
+        with patch.object(Config, 'ARCHIVE_BACKEND', 'local'), patch('app.utils.archive.archive_queue') as queue, \
+                patch('app.routes.publish_transactions'):
+            write_rows(rows[:6])
+            write_rows(rows)
+        queued = [row['block_number'] for call in queue.add.call_args_list for row in call.args[0]]
+        self.assertEqual(queued, [row['block_number'] for row in rows])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+from app.models import BackfillUnit, Transaction
+from app.utils.backfill import block_at_time, run_backfill, unfinished_job
+from app.utils.ingest_cursor import get_last_block
+from app.utils.rollups import window_summary
+from config import Config
+from helpers import AppTestCase
+
+def fake_timestamps(w3, block_numbers):
+    return {number: 1700000000 + 12 * number for number in block_numbers}
+
+class FakeChain:
+    """One transfer every 10 blocks; optionally fails once on a given range."""
+
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.ranges = []
+
+    def get_transfer_events(self, w3, start_block, end_block, tokens=None):
+        if start_block == self.fail_on:
+            self.fail_on = None
+            raise ConnectionError('node went away')
+        self.ranges.append(start_block)
+        return [{
+            'tx_hash': f'0x{block:064x}',
+            'token_address': Config.USDC_CONTRACT_ADDRESS,
+            'from_address': '0x' + 'a' * 40,
+            'to_address': '0x' + 'b' * 40,
+            'value': 1000000,
+            'block_number': block,
+            'log_index': 0
+        } for block in range(start_block, end_block + 1) if block % 10 == 0]
+
+class TestBackfill(AppTestCase):
+    def run_backfill(self, chain, **kwargs):
+        with patch('app.routes.get_transfer_events', chain.get_transfer_events), \
+             patch('app.utils.backfill.get_block_timestamps', fake_timestamps):
+            return run_backfill(None, 1000, 1999, unit_size=100, workers=3, progress_interval=0, **kwargs)
+
+    def test_resumes_from_checkpoints(self):
+        """
+        Tests that a failed run keeps the units it loaded, that re-running
+        only fetches the pending ones, and that rollups, indexes and the
+        cursor are rebuilt once the job completes.
+        """
+        chain = FakeChain(fail_on=1500)
+        with self.assertRaises(ConnectionError):
+            self.run_backfill(chain, drop_indexes=True)
+        # Units fetched but not yet written when the run failed stay pending
+        loaded = {unit.start_block for unit in BackfillUnit.query.filter_by(done=True)}
+        self.assertTrue(loaded <= set(chain.ranges))
+        self.assertEqual(Transaction.query.count(), 10 * len(loaded))
+
+        chain.ranges = []
+        result = self.run_backfill(chain, drop_indexes=True)
+        self.assertEqual(set(chain.ranges), set(range(1000, 2000, 100)) - loaded)
+        self.assertEqual(result['units'], 10 - len(loaded))
+        self.assertEqual(Transaction.query.count(), 100)
+        self.assertEqual(window_summary(datetime(2023, 1, 1))['total_transactions'], 100)
+        self.assertEqual(get_last_block(Config.USDC_CONTRACT_ADDRESS), 1999)
+
+        # A finished job has nothing left to do
+        chain.ranges = []
+        self.assertEqual(self.run_backfill(chain)['units'], 0)
+        self.assertEqual(chain.ranges, [])
+
+    def test_unfinished_job_is_found(self):
+        """
+        Tests that an interrupted default-named job is found from its start
+        block with the end block it was planned with, until it completes.
+        """
+        chain = FakeChain(fail_on=1500)
+        with self.assertRaises(ConnectionError):
+            self.run_backfill(chain)
+        self.assertEqual(unfinished_job(1000), ('1000-1999', 1999))
+        self.assertIsNone(unfinished_job(1001))
+
+        self.run_backfill(chain)
+        self.assertIsNone(unfinished_job(1000))
+
+    def test_only_new_transfers_are_archived(self):
+        """
+        Tests that backfilled transfers are handed to the archive queue once
+        committed, and that reloading stored ones archives nothing again.
+        """
+        with patch.object(Config, 'ARCHIVE_BACKEND', 'local'), patch('app.utils.archive.archive_queue') as queue:
+            self.run_backfill(FakeChain())
+            self.assertEqual(sum(len(call.args[0]) for call in queue.add.call_args_list), 100)
+            queue.reset_mock()
+            self.run_backfill(FakeChain(), job='reload')
+            queue.add.assert_not_called()
+
+    def test_block_at_time(self):
+        """Tests that dates resolve to the first block mined at or after them."""
+        with patch('app.utils.backfill.get_block_timestamps', fake_timestamps):
+            self.assertEqual(block_at_time(None, 1700000000 + 12 * 500, 10000), 500)
+            self.assertEqual(block_at_time(None, 1700000000 + 12 * 500 + 1, 10000), 501)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import unittest
+from unittest.mock import MagicMock
+from app.utils.balance_service import BalanceService, balance_service
+from app.utils.response_cache import response_cache
+from helpers import AppTestCase
+
+ADDRESSES = ['0x' + f'{n:040x}' for n in range(1, 51)]
+
+def fake_provider(pages=1):
+    """Session whose post() answers alchemy_getTokenBalances batches with `pages` pages per address."""
+    session = MagicMock()
+
+    def post(url, json, timeout):
+        replies = []
+        for call in json:
+            address, _, options = call['params']
+            page = int(options.get('pageKey', '0'))
+            result = {'address': address,
+                      'tokenBalances': [{'contractAddress': f'0xtoken{page}', 'tokenBalance': '0x1'}]}
+            if page + 1 < pages:
+                result['pageKey'] = str(page + 1)
+            replies.append({'jsonrpc': '2.0', 'id': call['id'], 'result': result})
+        response = MagicMock()
+        response.json.return_value = replies
+        return response
+
+    session.post.side_effect = post
+    return session
+
+class TestBalanceService(unittest.TestCase):
+    def setUp(self):
+        response_cache.backend.clear()
+
+    def tearDown(self):
+        response_cache.backend.clear()
+
+    def test_batch_is_one_round_trip(self):
+        """
+        Tests that 50 cold addresses are fetched with a single batch request
+        with timeouts, and that a repeat is served from the cache.
+        """
+        session = fake_provider()
+        service = BalanceService('http://rpc', session=session)
+
+        balances = service.get_balances(ADDRESSES)
+        self.assertEqual(len(balances), 50)
+        self.assertEqual(session.post.call_count, 1)
+        self.assertIsNotNone(session.post.call_args.kwargs['timeout'])
+
+        service.get_balances(ADDRESSES[:10])
+        self.assertEqual(session.post.call_count, 1)
+        self.assertEqual(service.stats()['hits'], 10)
+
+    def test_follows_page_keys(self):
+        """
+        Tests that every page is collected by following pageKey, with one
+        batch per page depth.
+        """
+        session = fake_provider(pages=3)
+        service = BalanceService('http://rpc', session=session)
+
+        balances = service.get_balances(ADDRESSES[:5])
+        self.assertEqual(len(balances[ADDRESSES[0]]), 3)
+        self.assertEqual(session.post.call_count, 3)
+
+    def test_new_block_invalidates(self):
+        """
+        Tests that cached balances are keyed by the ingested block.
+        """
+        session = fake_provider()
+        service = BalanceService('http://rpc', session=session)
+        service.get_balances(ADDRESSES[:1])
+        response_cache.bump_watermark(block=123)
+        service.get_balances(ADDRESSES[:1])
+        self.assertEqual(session.post.call_count, 2)
+
+    def test_error_reply_without_id(self):
+        """
+        Tests that an error reply with a null id, and addresses left without
+        a reply, are reported as errors instead of failing the batch.
+        """
+        session = fake_provider()
+        answer = session.post.side_effect
+
+        def post(url, json, timeout):
+            response = answer(url, json, timeout)
+            replies = response.json.return_value[2:]
+            replies.append({'jsonrpc': '2.0', 'id': None, 'error': {'code': -32600, 'message': 'Invalid request'}})
+            response.json.return_value = replies
+            return response
+
+        session.post.side_effect = post
+        service = BalanceService('http://rpc', session=session)
+        balances = service.get_balances(ADDRESSES[:5])
+        self.assertEqual(balances[ADDRESSES[0]], {'error': 'No reply'})
+        self.assertEqual(balances[ADDRESSES[1]], {'error': 'No reply'})
+        self.assertEqual(len(balances[ADDRESSES[2]]), 1)
+
+class TestBalanceEndpoints(AppTestCase):
+    def setUp(self):
+        self.saved_session = balance_service.session
+        balance_service.session = fake_provider()
+        balance_service.cache.clear()
+        super().setUp()
+
+    def tearDown(self):
+        super().tearDown()
+        balance_service.session = self.saved_session
+        balance_service.cache.clear()
+
+    def test_batch_endpoint(self):
+        """
+        Tests the POST batch endpoint, its validation, and that the single
+        address endpoint keeps returning a list.
+        """
+        response = self.client.post('/api/token-balances', json={'addresses': ADDRESSES})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.get_json()), set(ADDRESSES))
+        self.assertEqual(balance_service.session.post.call_count, 1)
+
+        response = self.client.post('/api/token-balances', json={'addresses': ['not-an-address']})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get(f'/api/token-balances/{ADDRESSES[0]}')
+        self.assertIsInstance(response.get_json(), list)
+        self.assertEqual(balance_service.session.post.call_count, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+from app.utils.block_cache import BlockCache, fetch_block_headers
+
+class TestBlockCache(unittest.TestCase):
+    def test_lru_eviction_and_hit_rate(self):
+        """
+        Tests that the cache evicts the least recently used header once full
+        and that hits and misses are counted for the hit rate.
+        """
+        cache = BlockCache(max_size=2)
+        cache.put(1, {'number': 1})
+        cache.put(2, {'number': 2})
+        cache.get(1)  # 1 becomes most recently used
+        cache.put(3, {'number': 3})
+
+        self.assertIsNone(cache.get(2))
+        self.assertIsNotNone(cache.get(1))
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 1)
+        self.assertAlmostEqual(stats['hit_rate'], 2 / 3)
+
+    def test_one_lookup_per_distinct_block(self):
+        """
+        Tests that fetching headers for many events in few blocks only hits
+        the node once per distinct block, and not at all on a repeat.
+        """
+        w3 = SimpleNamespace(provider=SimpleNamespace(), eth=MagicMock())
+        w3.eth.get_block.side_effect = lambda n: {'number': n, 'hash': None, 'timestamp': 1000 + n}
+
+        cache = BlockCache()
+        headers = fetch_block_headers(w3, [5, 5, 5, 6, 6], cache)
+        self.assertEqual(headers[6]['timestamp'], 1006)
+        self.assertEqual(w3.eth.get_block.call_count, 2)
+
+        fetch_block_headers(w3, [5, 6], cache)
+        self.assertEqual(w3.eth.get_block.call_count, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,20 @@
+import unittest
+from app.models import Transaction
+from app.utils.bulk_insert import bulk_insert_transactions
+from helpers import AppTestCase, make_row
+
+class TestBulkInsert(AppTestCase):
+    def test_skips_duplicates_in_batch_and_database(self):
+        """
+        Tests that duplicates inside the batch and rows already stored are
+        both skipped and reported, across several insert chunks.
+        """
+        inserted, skipped = bulk_insert_transactions([make_row(1), make_row(2), make_row(1)], batch_size=2)
+        self.assertEqual((inserted, skipped), (2, 1))
+
+        inserted, skipped = bulk_insert_transactions([make_row(2), make_row(3), make_row(4)], batch_size=2)
+        self.assertEqual((inserted, skipped), (2, 1))
+        self.assertEqual(Transaction.query.count(), 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+from datetime import datetime
+from app import db
+from app.models import Transaction
+from app.utils.bulk_insert import bulk_insert_transactions
+from app.utils.change_feed import ChangeFeed
+from app.utils.event_stream import event_broker
+from app.utils.response_cache import response_cache
+from app.utils.transfer_graph import transfer_graph
+from helpers import AppTestCase, make_row
+
+def make_rows(first, count, log_indexes=(0,)):
+    return [make_row(
+        n,
+        from_address='0x' + f'{n % 4 + 1:040x}',
+        to_address='0x' + f'{n % 3 + 10:040x}',
+        # Below other tests' blocks, as the shared broker's position only moves forward
+        block_number=10 + n,
+        log_index=log_index,
+        timestamp=datetime(2025, 5, 25, 12, 0, n)
+    ) for n in range(first, first + count) for log_index in log_indexes]
+
+class TestChangeFeed(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.subscriber = event_broker.subscribe()
+
+    def tearDown(self):
+        event_broker.unsubscribe(self.subscriber)
+        transfer_graph.clear()
+        super().tearDown()
+
+    def events(self):
+        events = []
+        while True:
+            event = self.subscriber.get(timeout=0)
+            if event is None:
+                return events
+            events.append(event)
+
+    def test_feeds_commits_of_another_process(self):
+        """
+        Tests that rows inserted without the in-process commit hooks are
+        streamed, added to the graph and bump the cache watermark, and that
+        anomaly flags set later are streamed once the rows are scored.
+        """
+        # Inserted directly, as ingest.py would from its own process
+        bulk_insert_transactions(make_rows(0, 3))
+        feed = ChangeFeed(batch_size=4)
+        self.assertEqual(feed.poll(), 0)
+        self.assertEqual(len(transfer_graph), 3)
+        self.assertEqual(self.events(), [])
+
+        bulk_insert_transactions(make_rows(3, 3, log_indexes=(0, 1)))
+        sequence = response_cache.watermark()['sequence']
+        self.assertEqual(feed.poll(), 4)
+        self.assertEqual(feed.poll(), 2)
+        self.assertEqual(feed.poll(), 0)
+        transactions = [event['data'] for event in self.events() if event['event'] == 'transaction']
+        self.assertEqual([(tx['block_number'], tx['log_index']) for tx in transactions],
+                         [(13, 0), (13, 1), (14, 0), (14, 1), (15, 0), (15, 1)])
+        self.assertEqual(len(transfer_graph), 9)
+        self.assertEqual(response_cache.watermark()['block'], 15)
+        self.assertGreater(response_cache.watermark()['sequence'], sequence)
+
+        # The ingest process scores the pending rows and flags one of them
+        Transaction.query.filter(Transaction.block_number >= 13).update({'anomaly_score': 0.1})
+        Transaction.query.filter_by(block_number=14, log_index=1).update({'is_anomaly': True, 'anomaly_score': -0.4})
+        db.session.commit()
+        feed.poll()
+        anomalies = [event['data'] for event in self.events() if event['event'] == 'anomaly']
+        self.assertEqual(len(anomalies), 1)
+        self.assertEqual(anomalies[0]['anomaly_score'], -0.4)
+        self.assertEqual((anomalies[0]['tx_hash'], anomalies[0]['log_index']), (f'0x{4:064x}', 1))
+        self.assertEqual(feed.stats()['pending'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
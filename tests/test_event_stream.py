@@ -0,0 +1,92 @@
+import json
+import unittest
+from datetime import datetime
+from app.utils.bulk_insert import bulk_insert_transactions
+from app.utils.event_stream import EventBroker, event_broker, format_sse
+from app.routes import publish_transactions
+from helpers import AppTestCase, make_row
+
+def stream_row(n):
+    # Above the change feed tests' blocks, as the shared broker's position only moves forward
+    return make_row(n, block_number=100 + n, timestamp=datetime(2025, 5, 25, 12, 0, n))
+
+class TestEventBroker(unittest.TestCase):
+    def test_resume_from_last_event_id(self):
+        """
+        Tests that a reconnecting client receives only the events after its
+        Last-Event-ID, and that a position-only id from another process is
+        resumed by chain position.
+        """
+        broker = EventBroker(queue_size=10, history_size=10)
+        for n in range(5):
+            broker.publish('transaction', {'n': n}, position=(100 + n, 0))
+        last_id = broker._history[1]['id']
+
+        subscriber = broker.subscribe(last_id)
+        self.assertEqual([subscriber.get(timeout=0)['data']['n'] for _ in range(3)], [2, 3, 4])
+        self.assertIsNone(subscriber.get(timeout=0))
+
+        subscriber = broker.subscribe('102:0:999999')
+        self.assertEqual([subscriber.get(timeout=0)['data']['n'] for _ in range(2)], [3, 4])
+
+    def test_reset_when_history_exhausted(self):
+        """
+        Tests that a client whose last event fell out of the history is told
+        to refetch instead of silently missing events.
+        """
+        broker = EventBroker(queue_size=10, history_size=2)
+        for n in range(5):
+            broker.publish('transaction', {'n': n}, position=(100 + n, 0))
+        subscriber = broker.subscribe('100:0:1')
+        self.assertEqual(subscriber.get(timeout=0)['event'], 'reset')
+
+    def test_slow_client_is_dropped(self):
+        """
+        Tests that publishing never blocks on a client with a full queue:
+        the client is dropped and other clients keep receiving events.
+        """
+        broker = EventBroker(queue_size=2, history_size=10)
+        slow = broker.subscribe()
+        fast = broker.subscribe()
+        for n in range(3):
+            broker.publish('transaction', {'n': n}, position=(100 + n, 0))
+            fast.get(timeout=0)
+        self.assertTrue(slow.dropped)
+        self.assertFalse(fast.dropped)
+        self.assertEqual(broker.stats()['subscribers'], 1)
+        self.assertEqual(broker.stats()['dropped_clients'], 1)
+
+    def test_format_sse(self):
+        """
+        Tests the text/event-stream framing of an event.
+        """
+        broker = EventBroker()
+        broker.publish('anomaly', {'tx_hash': '0x1'}, position=(7, 3))
+        self.assertEqual(format_sse(broker._history[0]),
+                         'id: 7:3:1\nevent: anomaly\ndata: {"tx_hash": "0x1"}\n\n')
+
+class TestStreamEndpoint(AppTestCase):
+    def test_inserted_rows_are_streamed(self):
+        """
+        Tests that committed inserts are published as transaction and rollup
+        events, and that /api/stream replays them after Last-Event-ID.
+        """
+        start = event_broker._sequence
+        last_event_id = f'0:0:{start}'
+        bulk_insert_transactions([stream_row(1), stream_row(2)], on_commit=publish_transactions)
+
+        response = self.client.get('/api/stream', headers={'Last-Event-ID': last_event_id})
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        chunks = (chunk.decode() for chunk in response.response)
+        self.assertTrue(next(chunks).startswith('retry:'))
+        events = [next(chunks) for _ in range(3)]
+        response.close()
+
+        self.assertIn('event: transaction', events[0])
+        self.assertIn(f'id: 101:0:{start + 1}', events[0])
+        self.assertEqual(json.loads(events[1].split('data: ')[1])['tx_hash'], stream_row(2)['tx_hash'])
+        self.assertIn('event: rollup', events[2])
+        self.assertEqual(event_broker.stats()['subscribers'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
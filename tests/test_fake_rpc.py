@@ -0,0 +1,68 @@
+import unittest
+from unittest.mock import patch
+from web3 import Web3
+from app.models import Transaction
+from app.routes import fetch_transactions
+from app.utils.block_cache import block_cache
+from app.utils.ingest_cursor import advance_cursors, get_last_block
+from benchmarks.fake_rpc import FakeChain, FakeRPCServer
+from benchmarks.run_benchmarks import regressions
+from benchmarks.synthetic import FIRST_BLOCK, synthetic_transfers
+from config import Config
+from helpers import AppTestCase
+
+class TestFakeRPC(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        block_cache.clear()
+        self.chain = FakeChain(synthetic_transfers(300, transfers_per_block=10))
+        self.server = FakeRPCServer(self.chain, max_logs=50).start()
+
+    def tearDown(self):
+        self.server.stop()
+        block_cache.clear()
+        super().tearDown()
+
+    def test_ingests_synthetic_chain_offline(self):
+        """
+        Tests that fetch_transactions ingests every synthetic transfer from
+        the fake node, splitting eth_getLogs ranges that exceed its response
+        limit and reading block headers in batches.
+        """
+        advance_cursors([Config.USDC_CONTRACT_ADDRESS], FIRST_BLOCK - 1)
+        with patch.object(Config, 'ALCHEMY_API_URL', self.server.url), \
+             patch('app.routes.finish_ingest_cycle'):
+            fetch_transactions()
+
+        self.assertEqual(Transaction.query.count(), 300)
+        self.assertEqual(get_last_block(Config.USDC_CONTRACT_ADDRESS), self.chain.head - Config.CONFIRMATION_DEPTH)
+        self.assertGreater(self.server.calls['eth_getLogs'], 300 // 50)
+        # Headers of all 30 blocks come back in far fewer HTTP requests
+        self.assertEqual(self.server.calls['eth_getBlockByNumber'], 30)
+        self.assertLess(self.server.requests, self.server.calls['eth_getLogs'] + 30)
+
+    def test_batch_requests(self):
+        """Tests that a JSON-RPC batch is answered call by call, errors included."""
+        w3 = Web3(Web3.HTTPProvider(self.server.url))
+        self.assertEqual(w3.eth.block_number, self.chain.head)
+        replies = self.server.handle([
+            {'jsonrpc': '2.0', 'id': 1, 'method': 'eth_getBlockByNumber', 'params': [hex(FIRST_BLOCK), False]},
+            {'jsonrpc': '2.0', 'id': 2, 'method': 'eth_getLogs',
+             'params': [{'fromBlock': hex(FIRST_BLOCK), 'toBlock': hex(self.chain.head)}]},
+            {'jsonrpc': '2.0', 'id': 3, 'method': 'eth_sendRawTransaction', 'params': []}
+        ])
+        self.assertEqual(int(replies[0]['result']['number'], 16), FIRST_BLOCK)
+        self.assertEqual(replies[1]['error']['code'], -32005)
+        self.assertEqual(replies[2]['error']['code'], -32601)
+
+    def test_regressions(self):
+        """Tests that only throughput drops and latency increases past the threshold are reported."""
+        baseline = {'results': {'1000': {'ingest': {'transfers_per_second': 1000, 'rpc_requests': 3},
+                                         'endpoints': {'transactions': {'p99_ms': 10.0}}}}}
+        current = {'results': {'1000': {'ingest': {'transfers_per_second': 850, 'rpc_requests': 9},
+                                        'endpoints': {'transactions': {'p99_ms': 13.0}}}}}
+        self.assertEqual([metric for metric, *_ in regressions(baseline, current, 0.2)],
+                         ['1000.endpoints.transactions.p99_ms'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from app.utils.feature_store import AddressFeatureStore
+from app.utils.fraud_detection import FRAUD_FEATURES, detect_fraud
+from app.utils.model_registry import ModelRegistry
+
+START = datetime(2025, 5, 25, 12, 0, 0)
+ALICE = '0x' + 'a' * 40
+BOB = '0x' + 'b' * 40
+CAROL = '0x' + 'c' * 40
+
+def transfer(n, sender, receiver, amount=10.0, seconds=0):
+    return {
+        'tx_hash': f'0x{n:064x}',
+        'from_address': sender,
+        'to_address': receiver,
+        'amount': amount,
+        'timestamp': START + timedelta(seconds=seconds)
+    }
+
+class TestAddressFeatureStore(unittest.TestCase):
+    def setUp(self):
+        self.store = AddressFeatureStore(windows={'1h': 3600, '24h': 86400}, max_addresses=100,
+                                         ttl=7 * 86400, recent_size=100)
+
+    def features(self, row):
+        return dict(zip(self.store.feature_names, self.store.features_for([row])[0]))
+
+    def test_rolling_windows(self):
+        """
+        Tests that counts and distinct counterparties cover both directions,
+        and that transfers leave the 1h window but stay in the 24h one.
+        """
+        self.store.observe(transfer(1, ALICE, BOB, seconds=0))
+        self.store.observe(transfer(2, CAROL, ALICE, seconds=60))
+        self.store.observe(transfer(3, ALICE, BOB, seconds=120))
+
+        features = self.features(transfer(4, ALICE, CAROL, seconds=180))
+        self.assertEqual(features['sender_count_1h'], 3)
+        self.assertEqual(features['sender_counterparties_1h'], 2)
+        self.assertEqual(features['receiver_count_1h'], 1)
+
+        features = self.features(transfer(5, ALICE, CAROL, seconds=2 * 3600))
+        self.assertEqual(features['sender_count_1h'], 0)
+        self.assertEqual(features['sender_count_24h'], 3)
+
+    def test_point_in_time_features(self):
+        """
+        Tests that an observed transfer keeps the features seen just before
+        it, so scoring it later does not count the transfer itself.
+        """
+        self.store.observe(transfer(1, ALICE, BOB))
+        self.store.observe(transfer(2, ALICE, BOB, seconds=30))
+
+        first = self.features(transfer(1, ALICE, BOB))
+        second = self.features(transfer(2, ALICE, BOB, seconds=30))
+        self.assertEqual(first['sender_count_1h'], 0)
+        self.assertEqual(second['sender_count_1h'], 1)
+
+    def test_transfers_of_one_transaction(self):
+        """Tests that transfers sharing a tx_hash keep their own point-in-time vectors."""
+        first = {**transfer(1, ALICE, BOB), 'log_index': 0}
+        second = {**transfer(1, ALICE, BOB), 'log_index': 1}
+        self.store.observe_rows([first, second])
+
+        self.assertEqual(self.features(first)['sender_count_1h'], 0)
+        self.assertEqual(self.features(second)['sender_count_1h'], 1)
+
+    def test_lru_and_ttl_eviction(self):
+        """
+        Tests that memory stays bounded: the least recently active address
+        is evicted past max_addresses, and idle addresses past the TTL.
+        """
+        store = AddressFeatureStore(windows={'1h': 3600}, max_addresses=3, ttl=86400, recent_size=10)
+        store.observe(transfer(1, ALICE, BOB))
+        store.observe(transfer(2, BOB, CAROL, seconds=10))
+        store.observe(transfer(3, CAROL, '0x' + 'd' * 40, seconds=20))
+        self.assertEqual(store.stats()['addresses'], 3)
+        self.assertNotIn(ALICE, store._addresses)
+
+        store.observe(transfer(4, '0x' + 'e' * 40, '0x' + 'f' * 40, seconds=2 * 86400))
+        self.assertEqual(set(store._addresses), {'0x' + 'e' * 40, '0x' + 'f' * 40})
+
+    def test_snapshot_round_trip(self):
+        """
+        Tests that a snapshot restores address state for a fast restart.
+        """
+        self.store.observe(transfer(1, ALICE, BOB))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'features.joblib')
+            self.store.save(path)
+            restored = AddressFeatureStore(windows={'1h': 3600, '24h': 86400})
+            self.assertTrue(restored.load(path))
+            self.assertFalse(AddressFeatureStore(windows={'1h': 3600}).load(path))
+
+        row = transfer(2, ALICE, CAROL, seconds=60)
+        self.assertEqual(restored.features_for([row]).tolist(), self.store.features_for([row]).tolist())
+
+    def test_detect_fraud_uses_address_features(self):
+        """
+        Tests that detect_fraud scores with the address features appended.
+        """
+        for n in range(120):
+            self.store.observe(transfer(n, ALICE, BOB, seconds=n))
+        transactions = [{'amount': 10.0 + n, 'timestamp': 1630000000 + n, 'tx_hash': f'0x{n:064x}',
+                         'from_address': ALICE, 'to_address': BOB} for n in range(120)]
+        with tempfile.TemporaryDirectory() as directory:
+            registry = ModelRegistry(directory)
+            result = detect_fraud(transactions, registry=registry, feature_store=self.store)
+            self.assertEqual(len(result), 120)
+            self.assertEqual(registry.load('detect_fraud')[0].n_features_in_, len(FRAUD_FEATURES))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import unittest
+from datetime import datetime, timedelta
+import numpy as np
+from app import create_app, db
+from app.models import Transaction
+from app.routes import detect_anomalies, write_rows
+from app.utils.hot_window import HotWindow, hot_window
+from app.utils.response_cache import response_cache
+from app.utils.rollups import window_summary
+from config import Config
+from helpers import AppTestCase, TestConfig, make_row
+
+DAI = '0x' + 'd' * 40
+
+def make_rows(count, start, token=None, first=0):
+    return [make_row(
+        n,
+        tx_hash=f'0x{1000 + n:064x}',
+        log_index=n % 3,
+        token_address=token or Config.USDC_CONTRACT_ADDRESS,
+        from_address='0x' + f'{n % 17:040x}',
+        to_address='0x' + f'{n % 5 + 100:040x}',
+        amount=float(100 + (n * 37) % 1000),
+        timestamp=start + timedelta(seconds=30 * n),
+        is_anomaly=n % 50 == 0
+    ) for n in range(first, first + count)]
+
+class TestHotWindow(AppTestCase):
+    def setUp(self):
+        self.use_temporary_model_dir()
+        super().setUp()
+        # Minute-aligned, so rollup minute buckets and the window cover the same transfers
+        self.start = (datetime.utcnow() - timedelta(hours=3)).replace(second=0, microsecond=0)
+
+    def tearDown(self):
+        hot_window.clear()
+        super().tearDown()
+
+    def test_queries_match_database(self):
+        """
+        Tests that summaries, histograms, range sums and top transfers served
+        from memory match the database answers the endpoints fall back to.
+        """
+        write_rows(make_rows(300, self.start) + make_rows(40, self.start, DAI, first=300))
+        self.assertEqual(hot_window.load(), 340)
+
+        memory = hot_window.summary(self.start)
+        rollups = window_summary(self.start)
+        self.assertEqual(memory['total_transactions'], rollups['total_transactions'])
+        self.assertAlmostEqual(memory['total_volume'], rollups['total_volume'])
+        self.assertEqual(memory['anomaly_count'], rollups['anomaly_count'])
+        self.assertEqual(sorted(memory['hourly_data']), sorted(rollups['hourly_data']))
+        self.assertEqual(memory['tokens'][DAI]['count'], 40)
+        self.assertEqual(hot_window.range_sum(self.start, token_address=DAI)['count'], 40)
+
+        for path in ('/api/recent/histogram?bucket=300&start={}&token=' + DAI,
+                     '/api/recent/top-transfers?limit=5&start={}'):
+            url = path.format(self.start.isoformat())
+            from_memory = self.client.get(url).get_json()
+            hot_window.clear()
+            response_cache.bump_watermark()
+            from_db = self.client.get(url).get_json()
+            hot_window.load()
+            self.assertEqual(from_memory['source'], 'memory')
+            self.assertEqual(from_db['source'], 'database')
+            self.assertEqual(from_memory.get('buckets'), from_db.get('buckets'))
+            self.assertEqual([t['tx_hash'] for t in from_memory.get('transfers', [])],
+                             [t['tx_hash'] for t in from_db.get('transfers', [])])
+
+        # Older ranges are not held and fall back to the database
+        older = self.start - timedelta(days=2)
+        self.assertIsNone(hot_window.summary(older))
+        self.assertEqual(self.client.get(f'/api/recent/top-transfers?start={older.isoformat()}')
+                         .get_json()['source'], 'database')
+        # Database fallbacks are bounded
+        oldest = datetime.utcnow() - timedelta(seconds=Config.RECENT_MAX_SPAN + 3600)
+        self.assertEqual(self.client.get(f'/api/recent/histogram?bucket=3600&start={oldest.isoformat()}')
+                         .status_code, 400)
+
+    def test_ring_buffer_moves_floor(self):
+        """Tests that overwriting the oldest transfers raises the covered range and keeps the newest."""
+        window = HotWindow(capacity=100)
+        window.load()
+        rows = make_rows(150, self.start)
+        window.add_rows(rows[:120])
+        window.add_rows(rows[120:])
+
+        self.assertEqual(len(window), 100)
+        self.assertFalse(window.covers(rows[49]['timestamp']))
+        self.assertTrue(window.covers(rows[50]['timestamp']))
+        self.assertEqual(window.range_sum(rows[50]['timestamp'])['count'], 100)
+        largest = max(rows[50:], key=lambda row: row['amount'])
+        self.assertEqual(window.top_transfers(rows[50]['timestamp'], limit=1)[0]['tx_hash'], largest['tx_hash'])
+        latest = window.latest(Config.USDC_CONTRACT_ADDRESS, 10)
+        self.assertEqual(latest['tx_hashes'], [row['tx_hash'] for row in reversed(rows[-10:])])
+
+        # A window loaded for another app does not answer for this one
+        other = create_app(TestConfig)
+        with other.app_context():
+            self.assertIsNone(window.summary(rows[50]['timestamp']))
+
+    def test_detect_anomalies_from_memory(self):
+        """Tests that anomaly features come from the hot window and scores are mirrored back into it."""
+        hot_window.load()
+        amounts = [100.0 + (n % 7) for n in range(60)]
+        amounts[30] = 5000000.0
+        rows = make_rows(60, self.start)
+        for row, amount in zip(rows, amounts):
+            row.update(amount=amount, is_anomaly=False, from_address='0x' + 'a' * 40, to_address='0x' + 'b' * 40)
+        write_rows(rows)
+
+        hits = hot_window.hits
+        detect_anomalies(window=50)
+        self.assertGreater(hot_window.hits, hits)
+        self.assertEqual(Transaction.query.filter(Transaction.anomaly_score.isnot(None)).count(), 50)
+        latest = hot_window.latest(Config.USDC_CONTRACT_ADDRESS, 50)
+        stored = dict(db.session.query(Transaction.tx_hash, Transaction.anomaly_score))
+        np.testing.assert_allclose(latest['scores'], [stored[tx_hash] for tx_hash in latest['tx_hashes']])
+        self.assertTrue(Transaction.query.filter_by(amount=5000000.0).one().is_anomaly)
+        self.assertEqual(hot_window.summary(self.start)['anomaly_count'],
+                         Transaction.query.filter_by(is_anomaly=True).count())
+
+if __name__ == '__main__':
+    unittest.main()
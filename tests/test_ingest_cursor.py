@@ -0,0 +1,30 @@
+import unittest
+from app import create_app, db
+from app.utils.ingest_cursor import advance_cursor, get_last_block, plan_ranges
+from helpers import TestConfig
+
+class TestIngestCursor(unittest.TestCase):
+    def test_plan_ranges(self):
+        """
+        Tests that only confirmed blocks after the cursor are planned, in
+        chunks, and that a first run looks back from the head.
+        """
+        self.assertEqual(plan_ranges(100, 108, 3, 10, 2000), [(101, 105)])
+        self.assertEqual(plan_ranges(105, 108, 3, 10, 2000), [])
+        self.assertEqual(plan_ranges(None, 1003, 3, 500, 1000), [(0, 499), (500, 999), (1000, 1000)])
+        self.assertEqual(plan_ranges(0, 10000, 0, 100, 0, max_chunks=2), [(1, 100), (101, 200)])
+
+    def test_cursor_only_moves_forward(self):
+        """
+        Tests that the cursor is persisted per contract and is never rewound.
+        """
+        app = create_app(TestConfig)
+        with app.app_context():
+            self.assertIsNone(get_last_block('0xabc'))
+            advance_cursor('0xabc', 50)
+            advance_cursor('0xabc', 40)
+            self.assertEqual(get_last_block('0xabc'), 50)
+            db.drop_all()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import unittest
+from unittest.mock import patch
+from app.models import Transaction
+from app.utils.bulk_insert import bulk_insert_transactions
+from app.utils import log_decoder
+from app.utils.log_decoder import TRANSFER_TOPIC, decode_transfer_log, format_amount, store_decimals
+from config import Config
+from helpers import AppTestCase, make_row
+
+SENDER = '0x1c7D4B196Cb0C7B01d743Fbc6116a902379C7238'
+RECEIVER = '0x' + '0' * 39 + '1'
+HUGE = 2 ** 200 + 12345  # Far beyond float and int64 precision
+
+def raw_log(value, topics=None):
+    return {
+        'topics': topics or [TRANSFER_TOPIC, '0x' + '0' * 24 + SENDER[2:].lower(), '0x' + '0' * 24 + RECEIVER[2:]],
+        'data': '0x%064x' % value,
+        'address': Config.USDC_CONTRACT_ADDRESS.lower(),
+        'blockNumber': '0x10',
+        'logIndex': '0x2',
+        'transactionHash': '0x' + 'ab' * 32
+    }
+
+class TestLogDecoder(unittest.TestCase):
+    def test_decode_transfer_log(self):
+        """
+        Tests that topics and data are decoded into checksummed addresses and
+        an exact integer amount.
+        """
+        transfer = decode_transfer_log(raw_log(HUGE))
+        self.assertEqual(transfer['from_address'], SENDER)
+        self.assertEqual(transfer['to_address'], RECEIVER)
+        self.assertEqual(transfer['token_address'], Config.USDC_CONTRACT_ADDRESS)
+        self.assertEqual(transfer['value'], HUGE)
+        self.assertEqual((transfer['block_number'], transfer['log_index']), (16, 2))
+
+    def test_skips_non_erc20_logs(self):
+        """
+        Tests that ERC-721 transfers (token id as a fourth topic) and logs
+        removed by a reorg are ignored.
+        """
+        log = raw_log(1)
+        self.assertIsNone(decode_transfer_log(dict(log, topics=log['topics'] + ['0x' + '0' * 64])))
+        self.assertIsNone(decode_transfer_log(dict(log, removed=True)))
+
+    def test_format_amount(self):
+        """
+        Tests that formatting base units is exact for any uint256.
+        """
+        self.assertEqual(format_amount(1234500, 6), '1.2345')
+        self.assertEqual(format_amount(5000000, 6), '5')
+        self.assertEqual(format_amount(HUGE, 6), str(HUGE)[:-6] + '.' + str(HUGE)[-6:])
+        self.assertIsNone(format_amount(None, 6))
+
+class TestExactAmounts(AppTestCase):
+    def test_amount_raw_round_trips_exactly(self):
+        """
+        Tests that a uint256 amount survives storage and is served as exact
+        raw and formatted strings.
+        """
+        bulk_insert_transactions([make_row(
+            0xab,
+            from_address=SENDER,
+            to_address=RECEIVER,
+            amount_raw=HUGE,
+            amount=HUGE / 1e6,
+            log_index=2
+        )])
+        self.assertEqual(Transaction.query.one().amount_raw, HUGE)
+
+        row = self.client.get('/api/transactions').get_json()[0]
+        self.assertEqual(row['amount_raw'], str(HUGE))
+        self.assertEqual(row['amount_formatted'], format_amount(HUGE, 6))
+
+    def test_stored_decimals_format_other_tokens(self):
+        """
+        Tests that decimals stored by the ingesting process format the
+        amounts served by a process that never looked them up itself.
+        """
+        token = '0x' + '6b' * 20
+        # Stored in this test's database, not recorded for others
+        with patch.object(log_decoder, '_stored', set()):
+            store_decimals({token: 18})
+        bulk_insert_transactions([make_row(
+            0xcd,
+            token_address=token,
+            from_address=SENDER,
+            to_address=RECEIVER,
+            amount_raw=15 * 10 ** 17,
+            amount=1.5,
+            log_index=3
+        )])
+        # An API process starts with no decimals in memory
+        with patch.dict(log_decoder._decimals, clear=True), patch.object(log_decoder, '_stored_read_at', None):
+            row = self.client.get('/api/transactions?limit=5').get_json()[0]
+            self.assertEqual(row['amount_formatted'], '1.5')
+
+if __name__ == '__main__':
+    unittest.main()
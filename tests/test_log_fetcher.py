@@ -0,0 +1,41 @@
+import unittest
+from app.utils.log_fetcher import LogRangeFetcher
+
+def make_get_logs(logs_per_block, max_logs):
+    """Fake eth_getLogs that rejects ranges returning more than max_logs entries."""
+    def get_logs(start_block, end_block):
+        if (end_block - start_block + 1) * logs_per_block > max_logs:
+            raise ValueError({'code': -32005, 'message': 'Log response size exceeded'})
+        return [{'blockNumber': block, 'logIndex': index}
+                for block in range(end_block, start_block - 1, -1)
+                for index in range(logs_per_block)]
+    return get_logs
+
+class TestLogRangeFetcher(unittest.TestCase):
+    def test_splits_rejected_ranges_without_dropping_logs(self):
+        """
+        Tests that ranges rejected as too large are split until they succeed,
+        that every log is returned in block and log-index order, and that the
+        learned chunk size shrinks to what the provider accepts.
+        """
+        fetcher = LogRangeFetcher(initial_chunk=1000, target_logs=40, max_workers=3, requests_per_second=0)
+        logs = fetcher.fetch(make_get_logs(logs_per_block=2, max_logs=50), 1, 300)
+
+        self.assertEqual(len(logs), 600)
+        self.assertEqual(logs, sorted(logs, key=lambda log: (log['blockNumber'], log['logIndex'])))
+        self.assertGreater(fetcher.stats()['splits'], 0)
+        self.assertLessEqual(fetcher.chunk_size, 25)
+
+    def test_other_errors_propagate(self):
+        """
+        Tests that errors other than oversized responses are not swallowed.
+        """
+        def get_logs(start_block, end_block):
+            raise ConnectionError('node unavailable')
+
+        fetcher = LogRangeFetcher(requests_per_second=0)
+        with self.assertRaises(ConnectionError):
+            fetcher.fetch(get_logs, 1, 10)
+
+if __name__ == '__main__':
+    unittest.main()
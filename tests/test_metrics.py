@@ -0,0 +1,95 @@
+import time
+import unittest
+from unittest.mock import patch
+from app.utils.metrics import MetricsRegistry, rpc_calls, rpc_errors, time_rpc
+from app.utils.profiler import SamplingProfiler
+from config import Config
+from helpers import AppTestCase
+
+def busy_loop(seconds):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        sum(range(100))
+
+class TestMetrics(AppTestCase):
+    def test_histogram_exposition(self):
+        """Tests the Prometheus text rendering of cumulative histogram buckets, sum and count."""
+        registry = MetricsRegistry(prefix='test_')
+        histogram = registry.histogram('latency_seconds', 'Latency', ['step'], buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 5.0):
+            histogram.observe(value, 'fit')
+        lines = registry.render().splitlines()
+        self.assertIn('# TYPE test_latency_seconds histogram', lines)
+        self.assertIn('test_latency_seconds_bucket{step="fit",le="0.1"} 1', lines)
+        self.assertIn('test_latency_seconds_bucket{step="fit",le="1.0"} 2', lines)
+        self.assertIn('test_latency_seconds_bucket{step="fit",le="+Inf"} 3', lines)
+        self.assertIn('test_latency_seconds_sum{step="fit"} 5.55', lines)
+        self.assertIn('test_latency_seconds_count{step="fit"} 3', lines)
+
+    def test_disabled_registry_records_nothing(self):
+        """Tests that recording is a no-op while metrics are disabled, and cheap while enabled."""
+        registry = MetricsRegistry(enabled=False)
+        histogram = registry.histogram('latency_seconds', 'Latency', ['step'])
+        histogram.observe(0.1, 'fit')
+        self.assertEqual(histogram.snapshot('fit'), (0, 0.0))
+
+        registry.enabled = True
+        started = time.perf_counter()
+        for _ in range(10000):
+            histogram.observe(0.01, 'fit')
+        self.assertLess((time.perf_counter() - started) / 10000, 50e-6)
+        self.assertEqual(histogram.snapshot('fit')[0], 10000)
+
+    def test_rpc_timer_counts_batches_and_errors(self):
+        """Tests that batch calls are counted individually and a failed request as one error."""
+        calls, errors = rpc_calls.value('eth_getBlockByNumber'), rpc_errors.value('eth_getBlockByNumber')
+        with time_rpc([{'method': 'eth_getBlockByNumber'}] * 3):
+            pass
+        with self.assertRaises(ConnectionError):
+            with time_rpc({'method': 'eth_getBlockByNumber'}):
+                raise ConnectionError('node went away')
+        self.assertEqual(rpc_calls.value('eth_getBlockByNumber'), calls + 4)
+        self.assertEqual(rpc_errors.value('eth_getBlockByNumber'), errors + 1)
+
+    def test_metrics_endpoint(self):
+        """Tests that /metrics reports per-route request latency and cache hit rates."""
+        self.assertEqual(self.client.get('/api/transactions').status_code, 200)
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        body = response.get_data(as_text=True)
+        self.assertIn('stablecoin_monitor_http_request_seconds_count{method="GET",route="/api/transactions"}', body)
+        self.assertIn('stablecoin_monitor_http_requests_total{method="GET",route="/api/transactions",status="200"}',
+                      body)
+        self.assertIn('stablecoin_monitor_cache_hit_ratio{cache="response_cache"}', body)
+        self.assertIn('stablecoin_monitor_queue_depth{queue="event_stream"} 0', body)
+
+    def test_profiler(self):
+        """Tests that the profiler endpoints are off by default and sample busy threads when started."""
+        self.assertEqual(self.client.post('/api/profiler', json={'action': 'start'}).status_code, 403)
+
+        with patch.object(Config, 'PROFILER_ENABLED', True):
+            for body in ({'interval': 0}, {'interval': -1}, {'duration': 10 ** 9}, {'duration': -5}):
+                self.assertEqual(self.client.post('/api/profiler', json={'action': 'start', **body}).status_code, 400)
+            response = self.client.post('/api/profiler', json={'action': 'start', 'interval': 0.001})
+            self.assertTrue(response.get_json()['running'])
+            self.assertEqual(self.client.post('/api/profiler', json={'action': 'start'}).status_code, 409)
+            busy_loop(0.2)
+            self.assertFalse(self.client.post('/api/profiler', json={'action': 'stop'}).get_json()['running'])
+            stats = self.client.get('/api/profiler').get_json()
+            collapsed = self.client.get('/api/profiler?format=collapsed').get_data(as_text=True)
+        self.assertGreater(stats['samples'], 0)
+        self.assertIn('test_metrics.py:busy_loop', collapsed)
+
+    def test_profiler_duration(self):
+        """Tests that a profiler started with a duration stops by itself."""
+        profiler = SamplingProfiler(interval=0.001)
+        profiler.start(duration=0.05)
+        busy_loop(0.2)
+        self.assertFalse(profiler.running)
+        self.assertGreater(profiler.samples, 0)
+        self.assertEqual(sum(entry['samples'] for entry in profiler.top()),
+                         sum(int(line.rsplit(' ', 1)[1]) for line in profiler.collapsed().splitlines()))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import threading
+import time
+import unittest
+from unittest.mock import patch
+import numpy as np
+from sklearn.ensemble import IsolationForest
+from app.models import Transaction
+from app.utils.bulk_insert import bulk_insert_transactions
+from app.utils.model_executor import ModelExecutor, ModelJobCancelled, model_executor
+from app.utils.model_registry import model_registry
+from config import Config
+from helpers import AppTestCase, make_row
+
+def make_features(count, seed=0):
+    return np.random.RandomState(seed).normal(size=(count, 4))
+
+def make_rows(amounts, start=0):
+    return [make_row(n, amount=amount) for n, amount in enumerate(amounts, start)]
+
+class TestModelExecutor(unittest.TestCase):
+    def setUp(self):
+        self.executor = ModelExecutor('process')
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_matches_inline_results(self):
+        """Tests that fits and scores in the worker process match the same calls made inline."""
+        features = make_features(2000)
+        fitted = self.executor.fit('test', IsolationForest(random_state=42), features)
+        scores = self.executor.score_samples('test', fitted, features[:500])
+        expected = IsolationForest(random_state=42).fit(features).score_samples(features[:500])
+        np.testing.assert_allclose(scores, expected)
+
+        # The fitted model stays in the worker, so scoring again does not resend it
+        self.assertIs(self.executor._worker_models['test'], fitted)
+        np.testing.assert_allclose(self.executor.score_samples('test', fitted, features[:500]), expected)
+        self.assertEqual(self.executor.stats()['completed'], 3)
+
+    def test_timeout_restarts_worker(self):
+        """Tests that a fit past its timeout is abandoned and the next job gets a fresh worker."""
+        features = make_features(2000)
+        small = self.executor.fit('small', IsolationForest(n_estimators=10, random_state=42), features)
+        with self.assertRaises(ModelJobCancelled):
+            self.executor.fit('slow', IsolationForest(n_estimators=5000), make_features(50000), timeout=0.1)
+        self.assertEqual(self.executor.stats()['cancelled'], 1)
+
+        # A model cached by the terminated worker is shipped again
+        scores = self.executor.score_samples('small', small, features)
+        np.testing.assert_allclose(scores, small.score_samples(features))
+        self.assertEqual(self.executor.workers_started, 2)
+
+    def test_cancel(self):
+        """Tests that cancelling interrupts a running fit and reports whether one was running."""
+        self.assertFalse(self.executor.cancel())
+        errors = []
+
+        def fit():
+            try:
+                self.executor.fit('slow', IsolationForest(n_estimators=5000), make_features(50000))
+            except ModelJobCancelled as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=fit)
+        thread.start()
+        while self.executor.stats()['running'] is None:
+            time.sleep(0.01)
+        self.assertTrue(self.executor.cancel())
+        thread.join()
+        self.assertEqual(len(errors), 1)
+        self.assertIsNone(self.executor.stats()['worker_pid'])
+
+class TestDetectAnomaliesExecutor(AppTestCase):
+    def setUp(self):
+        self.use_temporary_model_dir()
+        super().setUp()
+
+    def test_failed_refit_keeps_current_model(self):
+        """
+        Tests that when a due refit is cancelled the current model version is
+        kept and still scores newly ingested transactions.
+        """
+        from app.routes import detect_anomalies
+
+        amounts = [100.0 + (n % 7) for n in range(180)]
+        bulk_insert_transactions(make_rows(amounts[:150]))
+        detect_anomalies()
+        name = f'transactions:{Config.USDC_CONTRACT_ADDRESS}'
+        _, metadata = model_registry.load(name)
+
+        bulk_insert_transactions(make_rows(amounts[150:], 150))
+        with patch.object(Config, 'MODEL_RETRAIN_INTERVAL', -1), \
+             patch.object(model_executor, 'fit', side_effect=ModelJobCancelled('cancelled')):
+            detect_anomalies()
+
+        self.assertEqual(model_registry.load(name)[1]['version'], metadata['version'])
+        self.assertEqual(Transaction.query.filter(Transaction.anomaly_score.is_(None)).count(), 0)
+
+    def test_background_detection(self):
+        """Tests that an ingest cycle hands scoring to the background thread and coalesces repeats."""
+        from app.routes import finish_ingest_cycle
+
+        amounts = [100.0 + (n % 7) for n in range(60)]
+        amounts[30] = 5000000.0
+        bulk_insert_transactions(make_rows(amounts))
+        started = threading.Event()
+        release = threading.Event()
+
+        def blocked():
+            started.set()
+            release.wait()
+
+        self.assertTrue(model_executor.submit('blocked', blocked))
+        started.wait()
+        with patch('app.routes.prune_minute_buckets'), patch('app.routes.feature_store.save'):
+            finish_ingest_cycle()
+            finish_ingest_cycle()
+        self.assertEqual(model_executor.depth(), 1)
+        release.set()
+        model_executor.join()
+
+        outlier = Transaction.query.filter_by(amount=5000000.0).one()
+        self.assertTrue(outlier.is_anomaly)
+        state = self.client.get('/api/model-executor').get_json()
+        self.assertEqual(state['mode'], Config.MODEL_EXECUTOR)
+        self.assertEqual(self.client.post('/api/model-executor', json={'action': 'cancel'}).status_code, 409)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+import numpy as np
+from sklearn.ensemble import IsolationForest
+from app.utils.model_registry import ModelRegistry
+from config import Config
+
+class TestModelRegistry(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.features = np.random.RandomState(0).normal(size=(200, 2))
+        self.model = IsolationForest(n_estimators=10, random_state=0).fit(self.features)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_versions_survive_restart(self):
+        """
+        Tests that saved models get increasing versions and can be warm loaded
+        by a fresh registry pointing at the same directory.
+        """
+        registry = ModelRegistry(self.tmp.name)
+        registry.save('transactions', self.model, ['a', 'b'], self.features)
+        registry.save('transactions', self.model, ['a', 'b'], self.features)
+
+        restarted = ModelRegistry(self.tmp.name)
+        self.assertEqual(restarted.warm_load(), ['transactions'])
+        model, metadata = restarted.load('transactions')
+        self.assertEqual(metadata['version'], 2)
+        self.assertEqual(metadata['feature_names'], ['a', 'b'])
+        np.testing.assert_allclose(model.score_samples(self.features), self.model.score_samples(self.features))
+
+    def test_old_versions_pruned(self):
+        """Tests that only the last MODEL_KEEP_VERSIONS model files are kept."""
+        registry = ModelRegistry(self.tmp.name)
+        with patch.object(Config, 'MODEL_KEEP_VERSIONS', 2):
+            for _ in range(5):
+                registry.save('transactions', self.model, ['a', 'b'], self.features)
+        files = sorted(entry for entry in os.listdir(os.path.join(self.tmp.name, 'transactions'))
+                       if entry.endswith('.joblib'))
+        self.assertEqual(files, ['v4.joblib', 'v5.joblib'])
+        self.assertEqual(ModelRegistry(self.tmp.name).load('transactions')[1]['version'], 5)
+
+    def test_retrain_reasons(self):
+        """
+        Tests that retraining is requested for a missing model, a changed
+        schema, an expired schedule and shifted feature distributions only.
+        """
+        registry = ModelRegistry(self.tmp.name)
+        self.assertEqual(registry.needs_retrain('transactions', ['a', 'b'], self.features), (True, 'missing'))
+
+        registry.save('transactions', self.model, ['a', 'b'], self.features)
+        self.assertEqual(registry.needs_retrain('transactions', ['a', 'b'], self.features), (False, None))
+        self.assertEqual(registry.needs_retrain('transactions', ['a'], self.features), (True, 'schema'))
+        self.assertEqual(registry.needs_retrain('transactions', ['a', 'b'], self.features + 5), (True, 'drift'))
+        later = datetime.utcnow() + timedelta(days=1)
+        self.assertEqual(registry.needs_retrain('transactions', ['a', 'b'], self.features, now=later), (True, 'schedule'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+from sqlalchemy import inspect, text
+from web3 import Web3
+from app import db
+from app.models import Transaction
+from app.utils.bulk_insert import bulk_insert_transactions
+from app.utils.log_decoder import TRANSFER_TOPIC, fetch_transfer_logs
+from app.utils.migrations import backfill_token_address, ensure_transfer_key
+from app.utils.model_registry import model_registry
+from app.utils.rollups import update_rollups, window_summary
+from config import Config
+from helpers import AppTestCase, make_row
+
+USDC = Config.USDC_CONTRACT_ADDRESS
+DAI = Web3.to_checksum_address('0x' + '6b' * 20)
+TOKENS = {'USDC': USDC, 'DAI': DAI}
+
+def make_rows(token_address, amounts, first_block=1000):
+    return [make_row(
+        n,
+        tx_hash=f'0x{first_block + n:064x}',
+        token_address=token_address,
+        amount=amount,
+        block_number=first_block + n,
+        log_index=0 if token_address == USDC else 1
+    ) for n, amount in enumerate(amounts)]
+
+class TestMultiTokenSweep(unittest.TestCase):
+    def test_one_get_logs_request_for_every_token(self):
+        """
+        Tests that every monitored token goes into the address list of a
+        single eth_getLogs filter and that transfers carry their token.
+        """
+        log = {
+            'address': DAI.lower(),
+            'topics': [TRANSFER_TOPIC, '0x' + '0' * 24 + 'a' * 40, '0x' + '0' * 24 + 'b' * 40],
+            'data': '0x%064x' % 10 ** 18,
+            'blockNumber': '0x10',
+            'logIndex': '0x0',
+            'transactionHash': '0x' + 'ab' * 32
+        }
+        response = MagicMock()
+        response.json.return_value = {'jsonrpc': '2.0', 'id': 1, 'result': [log]}
+        with patch('app.utils.log_decoder._session.post', return_value=response) as post:
+            transfers = fetch_transfer_logs('http://node', [USDC, DAI], 16, 16)
+
+        post.assert_called_once()
+        self.assertEqual(post.call_args.kwargs['json']['params'][0]['address'], [USDC, DAI])
+        self.assertEqual(transfers[0]['token_address'], DAI)
+
+class TestMultiTokenStorage(AppTestCase):
+    def setUp(self):
+        self.use_temporary_model_dir()
+        super().setUp()
+
+    def test_transfers_of_one_transaction_are_kept_per_log(self):
+        """
+        Tests that two token transfers emitted by the same transaction are
+        both stored, while replaying them is still skipped.
+        """
+        rows = make_rows(USDC, [1.0]) + make_rows(DAI, [2.0])
+        self.assertEqual(bulk_insert_transactions(rows), (2, 0))
+        self.assertEqual(bulk_insert_transactions(rows), (0, 2))
+
+    def test_rollups_and_dashboard_per_token(self):
+        """
+        Tests that rollups keep a token dimension and that the dashboard
+        API can be filtered by token symbol.
+        """
+        bulk_insert_transactions(make_rows(USDC, [1.0, 2.0]) + make_rows(DAI, [10.0], first_block=2000),
+                                 on_insert=update_rollups)
+
+        summary = window_summary(datetime(2025, 5, 25))
+        self.assertEqual(summary['total_transactions'], 3)
+        self.assertEqual(summary['tokens'][USDC]['volume'], 3.0)
+        self.assertEqual(summary['tokens'][DAI]['volume'], 10.0)
+        self.assertEqual(window_summary(datetime(2025, 5, 25), token_address=DAI)['total_volume'], 10.0)
+
+        with patch.object(Config, 'MONITORED_TOKENS', TOKENS), \
+             patch('app.routes.datetime') as routes_datetime:
+            routes_datetime.utcnow.return_value = datetime(2025, 5, 26)
+            data = self.client.get('/api/dashboard-data?token=dai').get_json()
+        self.assertEqual(data['total_volume'], 10.0)
+        self.assertEqual(self.client.get('/api/dashboard-data?token=nope').status_code, 400)
+
+    def test_anomaly_model_per_token(self):
+        """
+        Tests that batch detection fits and saves one model per monitored
+        token, each on its own token's transfers.
+        """
+        from app.routes import detect_anomalies
+
+        bulk_insert_transactions(make_rows(USDC, [100.0 + n % 7 for n in range(120)]) +
+                                 make_rows(DAI, [5.0 + n % 3 for n in range(120)], first_block=5000))
+        with patch.object(Config, 'MONITORED_TOKENS', TOKENS):
+            detect_anomalies()
+
+        for token in (USDC, DAI):
+            _, metadata = model_registry.load(f'transactions:{token}')
+            self.assertEqual(metadata['training_window']['rows'], 120)
+        self.assertEqual(Transaction.query.filter(Transaction.anomaly_score.is_(None)).count(), 0)
+
+    def test_migrates_legacy_unique_tx_hash(self):
+        """
+        Tests that a table keyed on tx_hash alone is rebuilt with the
+        (tx_hash, log_index) key, keeping its rows and attributing them to USDC.
+        """
+        db.drop_all()
+        id_column = 'id SERIAL PRIMARY KEY' if db.engine.dialect.name == 'postgresql' else 'id INTEGER PRIMARY KEY'
+        with db.engine.begin() as connection:
+            connection.execute(text(
+                f'CREATE TABLE "transaction" ({id_column}, tx_hash VARCHAR(66) NOT NULL, '
+                'from_address VARCHAR(42) NOT NULL, to_address VARCHAR(42) NOT NULL, amount FLOAT NOT NULL, '
+                'timestamp TIMESTAMP NOT NULL, block_number INTEGER NOT NULL, is_anomaly BOOLEAN, '
+                'anomaly_score FLOAT, UNIQUE (tx_hash))'
+            ))
+            connection.execute(text(
+                "INSERT INTO \"transaction\" (tx_hash, from_address, to_address, amount, timestamp, block_number) "
+                "VALUES ('0x01', '0xa', '0xb', 1.0, '2025-05-25 12:00:00', 1000)"
+            ))
+
+        self.assertTrue(ensure_transfer_key())
+        self.assertFalse(ensure_transfer_key())
+        self.assertEqual(backfill_token_address(USDC), 1)
+        unique = [c['column_names'] for c in inspect(db.engine).get_unique_constraints('transaction')]
+        self.assertIn(['tx_hash', 'log_index'], unique)
+        self.assertEqual(Transaction.query.one().token_address, USDC)
+
+if __name__ == '__main__':
+    unittest.main()
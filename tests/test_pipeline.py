@@ -0,0 +1,73 @@
+import asyncio
+import random
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+from app.models import Transaction
+from app.pipeline import IngestionPipeline
+from app.utils.ingest_cursor import get_last_block
+from config import Config
+from helpers import AppTestCase
+
+def fake_events(w3, start_block, end_block, tokens=None):
+    """Two transfers per block, returned after a random delay so ranges finish out of order."""
+    time.sleep(random.uniform(0, 0.02))
+    return [{
+        'tx_hash': f'0x{block:060x}{log_index:04x}',
+        'token_address': Config.USDC_CONTRACT_ADDRESS,
+        'from_address': '0x' + 'a' * 40,
+        'to_address': '0x' + 'b' * 40,
+        'value': 1000000 * block,
+        'block_number': block,
+        'log_index': log_index
+    } for block in range(start_block, end_block + 1) for log_index in range(2)]
+
+def fake_timestamps(w3, block_numbers):
+    return {number: 1700000000 + 12 * number for number in block_numbers}
+
+class TestIngestionPipeline(AppTestCase):
+    @patch.multiple(Config, CONFIRMATION_DEPTH=3, INGEST_CHUNK_SIZE=5, INITIAL_LOOKBACK_BLOCKS=40)
+    def test_ingests_in_order_and_flushes_on_stop(self):
+        """
+        Tests that ranges fetched concurrently are written in block order,
+        that the cursor ends on the last confirmed block, and that stopping
+        flushes every batch in flight and runs the final maintenance pass.
+        """
+        w3 = SimpleNamespace(eth=SimpleNamespace(block_number=1000))
+        pipeline = IngestionPipeline(self.app, w3=w3, queue_size=2, fetch_workers=3,
+                                     poll_interval=0.01, maintenance_interval=3600)
+        written = []
+        finish = MagicMock()
+
+        async def stop_when_caught_up():
+            while pipeline.committed_block != 997:
+                await asyncio.sleep(0.01)
+            pipeline.stop()
+
+        async def run():
+            await asyncio.gather(pipeline.run(), stop_when_caught_up())
+
+        commit_batch = pipeline._commit_batch
+        def record_commit(batch):
+            written.append(batch.start_block)
+            return commit_batch(batch)
+
+        with patch('app.routes.get_transfer_events', fake_events), \
+             patch('app.utils.block_cache.get_block_timestamps', fake_timestamps), \
+             patch('app.routes.finish_ingest_cycle', finish), \
+             patch.object(pipeline, '_commit_batch', record_commit):
+            asyncio.run(asyncio.wait_for(run(), timeout=30))
+
+        self.assertEqual(written, sorted(written))
+        self.assertEqual(written[0], 957)
+        self.assertEqual(get_last_block(Config.USDC_CONTRACT_ADDRESS), 997)
+        self.assertEqual(Transaction.query.count(), 2 * (997 - 957 + 1))
+        finish.assert_called_once()
+
+        stats = pipeline.stats()['stages']
+        self.assertEqual(stats['fetch']['batches'], 9)
+        self.assertEqual(stats['write']['rows'], Transaction.query.count())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+from app.utils.bulk_insert import bulk_insert_transactions
+from app.utils.response_cache import response_cache
+from helpers import AppTestCase, make_row
+
+class TestResponseCache(AppTestCase):
+    def setUp(self):
+        response_cache.backend.clear()
+        super().setUp()
+
+    def tearDown(self):
+        super().tearDown()
+        response_cache.backend.clear()
+
+    def test_etag_304_until_watermark_moves(self):
+        """
+        Tests that a repeated poll with the returned ETag gets a 304, that
+        cached bodies are served without re-running the query, and that an
+        ingest commit invalidates both.
+        """
+        bulk_insert_transactions([make_row(1)])
+        first = self.client.get('/api/transactions')
+        etag = first.headers['ETag']
+        self.assertEqual(len(first.get_json()), 1)
+
+        self.assertEqual(self.client.get('/api/transactions', headers={'If-None-Match': etag}).status_code, 304)
+
+        # Not visible until ingestion announces the commit
+        bulk_insert_transactions([make_row(2)])
+        self.assertEqual(len(self.client.get('/api/transactions').get_json()), 1)
+
+        response_cache.bump_watermark(block=1002)
+        fresh = self.client.get('/api/transactions', headers={'If-None-Match': etag})
+        self.assertEqual(fresh.status_code, 200)
+        self.assertEqual(len(fresh.get_json()), 2)
+        self.assertNotEqual(fresh.headers['ETag'], etag)
+
+if __name__ == '__main__':
+    unittest.main()
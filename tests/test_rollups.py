@@ -0,0 +1,36 @@
+import unittest
+from datetime import datetime, timedelta
+from app.models import TransactionRollup
+from app.utils.bulk_insert import bulk_insert_transactions
+from app.utils.rollups import rebuild_rollups, update_rollups, window_summary
+from helpers import AppTestCase, make_row
+
+def make_rows(timestamps):
+    return [make_row(n, amount=10.0 * (n + 1), timestamp=timestamp, is_anomaly=n == 0)
+            for n, timestamp in enumerate(timestamps)]
+
+class TestRollups(AppTestCase):
+    def test_incremental_rollups_match_rebuild(self):
+        """
+        Tests that rollups maintained at insert time ignore skipped duplicates,
+        match a full rebuild, and give exact totals for a window starting
+        part-way through an hour.
+        """
+        base = datetime(2025, 5, 25, 10, 0, 0)
+        rows = make_rows([base + timedelta(minutes=m) for m in (5, 40, 65, 130)])
+        bulk_insert_transactions(rows, on_insert=update_rollups)
+        bulk_insert_transactions(rows[:2], on_insert=update_rollups)
+
+        incremental = window_summary(base + timedelta(minutes=30))
+        self.assertEqual(incremental['total_transactions'], 3)
+        self.assertEqual(incremental['total_volume'], 20.0 + 30.0 + 40.0)
+        self.assertEqual(incremental['anomaly_count'], 0)
+        self.assertEqual(sorted(incremental['hourly_data']), [base, base + timedelta(hours=1), base + timedelta(hours=2)])
+
+        hourly = {r.bucket_start: r.count for r in TransactionRollup.query.filter_by(granularity='hour')}
+        rebuild_rollups()
+        self.assertEqual(hourly, {r.bucket_start: r.count for r in TransactionRollup.query.filter_by(granularity='hour')})
+        self.assertEqual(window_summary(base)['anomaly_count'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
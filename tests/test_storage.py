@@ -0,0 +1,158 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timedelta
+from app import db
+from app.models import Transaction
+from app.routes import detect_anomalies, write_rows
+from app.utils.bulk_insert import bulk_insert_transactions
+from app.utils.ingest_cursor import advance_cursors, get_last_block
+from app.utils.storage import current_storage, engine_options, resolve_mode, run_write
+from config import Config
+from helpers import AppTestCase, make_row
+
+def make_rows(count, start=0):
+    now = datetime.utcnow()
+    return [make_row(
+        i,
+        from_address='0x' + f'{i % 50:040x}',
+        amount_raw=(i % 1000 + 1) * 10 ** 6,
+        amount=float(i % 1000 + 1),
+        block_number=1000 + i // 10,
+        log_index=i % 10,
+        timestamp=now - timedelta(seconds=count - i)
+    ) for i in range(start, start + count)]
+
+class StorageModeTests:
+    """Ingestion, scoring and API reads that every storage mode must support."""
+
+    database_uri = None
+
+    def setUp(self):
+        class ModeConfig(Config):
+            SQLALCHEMY_DATABASE_URI = self.database_uri
+            STORAGE_MODE = 'auto'
+
+        self.config_class = ModeConfig
+        # Models fitted by the tests must not land in (or be loaded from) the real model directory
+        self.use_temporary_model_dir()
+        super().setUp()
+
+    def tearDown(self):
+        current_storage().stop()
+        engine = db.get_engine(self.app)
+        super().tearDown()
+        engine.dispose()
+
+    def test_ingest_score_and_read(self):
+        """
+        Tests that rows are written once despite duplicates, that cursors
+        advance, and that scoring and the read endpoints see the writes.
+        """
+        rows = make_rows(1500)
+        self.assertEqual(write_rows(rows + rows[:100]), (1500, 100))
+        self.assertEqual(write_rows(rows[:10]), (0, 10))
+        advance_cursors([Config.USDC_CONTRACT_ADDRESS], 1149)
+        self.assertEqual(get_last_block(Config.USDC_CONTRACT_ADDRESS), 1149)
+        self.assertGreater(detect_anomalies(), 0)
+
+        page = self.client.get('/api/transactions?limit=1000').get_json()
+        self.assertEqual(len(page), 1000)
+        self.assertEqual(page[0]['tx_hash'], rows[-1]['tx_hash'])
+        self.assertEqual(page[0]['amount_raw'], str(rows[-1]['amount_raw']))
+        summary = self.client.get('/api/dashboard-data').get_json()
+        self.assertEqual(summary['total_transactions'], 1500)
+        self.assertEqual(summary['anomaly_count'], Transaction.query.filter_by(is_anomaly=True).count())
+
+    def test_single_transaction_bulk_insert(self):
+        """Tests that a bulk insert over several chunks commits once and hands every new row to on_commit."""
+        committed = []
+        inserted, _ = run_write(bulk_insert_transactions, make_rows(1200), batch_size=500,
+                                on_commit=lambda new_rows: committed.append(len(new_rows)))
+        self.assertEqual(inserted, 1200)
+        self.assertEqual(committed, [1200])
+
+    def test_reads_during_writes(self):
+        """Tests that API reads keep working while another thread writes batches."""
+        errors = []
+
+        def ingest():
+            with self.app.app_context():
+                try:
+                    for start in range(0, 3000, 300):
+                        write_rows(make_rows(300, start))
+                except Exception as e:
+                    errors.append(e)
+
+        writer = threading.Thread(target=ingest)
+        writer.start()
+        while writer.is_alive():
+            response = self.client.get('/api/transactions?limit=50')
+            self.assertEqual(response.status_code, 200, response.get_data(as_text=True))
+        writer.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(Transaction.query.count(), 3000)
+
+class TestWALStorage(StorageModeTests, AppTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.database_uri = 'sqlite:///' + os.path.join(self.directory, 'monitor.db')
+        super().setUp()
+
+    def tearDown(self):
+        super().tearDown()
+        shutil.rmtree(self.directory)
+
+    def test_wal_setup(self):
+        """Tests the WAL pragmas, the writer thread and read-only routing of GET requests."""
+        storage = current_storage()
+        self.assertEqual(storage.mode, 'wal')
+        self.assertEqual(db.session.execute('PRAGMA journal_mode').scalar(), 'wal')
+        self.assertEqual(db.session.execute('PRAGMA synchronous').scalar(), 1)
+
+        self.assertEqual(run_write(lambda: threading.current_thread().name), 'db-writer')
+        with self.app.test_request_context('/api/transactions'):
+            self.assertIs(db.session.get_bind(), storage.reader)
+        with self.app.test_request_context('/api/token-balances', method='POST'):
+            self.assertIsNot(db.session.get_bind(), storage.reader)
+        with storage.reader.connect() as connection:
+            with self.assertRaises(Exception):
+                connection.execute('DELETE FROM "transaction"')
+
+POSTGRES_URL = os.getenv('TEST_POSTGRES_URL') or (
+    Config.TEST_DATABASE_URL if Config.TEST_DATABASE_URL.startswith('postgresql') else None)
+
+@unittest.skipUnless(POSTGRES_URL, 'set TEST_DATABASE_URL or TEST_POSTGRES_URL to a scratch PostgreSQL database')
+class TestPostgresStorage(StorageModeTests, AppTestCase):
+    database_uri = POSTGRES_URL
+
+    def test_copy_skips_legacy_rows(self):
+        """Tests that COPY loads skip stored transfers, including legacy rows without a log index."""
+        rows = make_rows(1200)
+        legacy = dict(rows[0], log_index=None)
+        bulk_insert_transactions([legacy])
+        self.assertEqual(bulk_insert_transactions(rows), (1199, 1))
+
+class TestStorageModes(unittest.TestCase):
+    def test_resolve_mode(self):
+        """Tests how 'auto' picks a mode and that impossible combinations are rejected."""
+        self.assertEqual(resolve_mode('sqlite:///monitor.db'), 'wal')
+        self.assertEqual(resolve_mode('sqlite://'), 'default')
+        self.assertEqual(resolve_mode('postgresql://user@host/db', 'auto'), 'postgresql')
+        self.assertEqual(resolve_mode('sqlite:///monitor.db', 'default'), 'default')
+        with self.assertRaises(ValueError):
+            resolve_mode('sqlite://', 'wal')
+        with self.assertRaises(ValueError):
+            resolve_mode('sqlite:///monitor.db', 'postgresql')
+
+    def test_postgres_engine_options(self):
+        """Tests that PostgreSQL gets a sized pool and drops the SQLite-only connect timeout."""
+        options = engine_options('postgresql', Config.SQLALCHEMY_ENGINE_OPTIONS)
+        self.assertEqual(options['pool_size'], Config.POSTGRES_POOL_SIZE)
+        self.assertNotIn('timeout', options['connect_args'])
+        self.assertIn('statement_timeout', options['connect_args']['options'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from app.utils.streaming_detector import StreamingDetector
+
+class TestStreamingDetector(unittest.TestCase):
+    def feed_normal(self, detector, n, rng):
+        rows = [{'amount': float(rng.lognormal(4, 0.3)), 'block_number': 1000 + i} for i in range(n)]
+        return detector.score_rows(rows)
+
+    def test_flags_outlier_after_warm_up(self):
+        """
+        Tests that scores are withheld during warm-up, lie in [-1, 0]
+        afterwards, and that a huge transfer after a long gap is flagged.
+        """
+        rng = np.random.RandomState(1)
+        detector = StreamingDetector(window_size=100)
+        rows = self.feed_normal(detector, 600, rng)
+
+        self.assertIsNone(rows[0]['anomaly_score'])
+        self.assertTrue(all(-1 <= row['anomaly_score'] <= 0 for row in rows[200:]))
+        self.assertLess(sum(row['is_anomaly'] for row in rows[200:]), 40)
+
+        score, is_anomaly = detector.score(50000000.0, 1000 + 5000)
+        self.assertTrue(is_anomaly)
+
+    def test_state_survives_restart(self):
+        """
+        Tests that a saved detector restores identical state.
+        """
+        rng = np.random.RandomState(2)
+        detector = StreamingDetector(window_size=50)
+        self.feed_normal(detector, 120, rng)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'streaming.joblib')
+            detector.save(path)
+            restored = StreamingDetector(window_size=50)
+            self.assertTrue(restored.load(path))
+        self.assertEqual(restored.score(100.0, 2000), detector.score(100.0, 2000))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import json
+import unittest
+from datetime import timedelta
+from app.utils.bulk_insert import bulk_insert_transactions
+from app.utils.response_cache import response_cache
+from helpers import START, AppTestCase, make_row
+
+ALICE = '0x' + '1' * 40
+
+class TestTransactionsAPI(AppTestCase):
+    def setUp(self):
+        response_cache.backend.clear()
+        super().setUp()
+        # Pairs of rows share a timestamp so the id tie-breaker is exercised
+        bulk_insert_transactions([make_row(
+            n,
+            from_address=ALICE if n % 3 == 0 else '0x' + '2' * 40,
+            to_address='0x' + '3' * 40,
+            timestamp=START + timedelta(seconds=12 * (n // 2)),
+            is_anomaly=n % 5 == 0
+        ) for n in range(25)])
+
+    def test_keyset_pages_cover_all_rows_once(self):
+        """
+        Tests that following X-Next-Cursor walks every row exactly once in
+        newest-first order and that the last page has no cursor.
+        """
+        seen, cursor = [], None
+        while True:
+            url = '/api/transactions?limit=7' + (f'&cursor={cursor}' if cursor else '')
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(tx['id'] for tx in response.get_json())
+            cursor = response.headers.get('X-Next-Cursor')
+            if not cursor:
+                break
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(len(set(seen)), 25)
+        self.assertEqual(seen[0], 25)
+
+    def test_filters_and_streaming_exports(self):
+        """
+        Tests server-side filters and that NDJSON and CSV exports stream the
+        same filtered rows.
+        """
+        data = self.client.get(f'/api/transactions?address={ALICE}&min_amount=5&is_anomaly=false').get_json()
+        self.assertEqual(sorted(tx['amount'] for tx in data), [6.0, 9.0, 12.0, 18.0, 21.0, 24.0])
+
+        response = self.client.get('/api/transactions?format=ndjson&is_anomaly=true')
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual(len(rows), 5)
+
+        lines = self.client.get('/api/transactions?format=csv&is_anomaly=true').get_data(as_text=True).splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['id', 'tx_hash', 'from_address'])
+        self.assertEqual(len(lines), 6)
+        self.assertEqual(self.client.get('/api/transactions?cursor=bogus').status_code, 400)
+
+if __name__ == '__main__':
+    unittest.main()
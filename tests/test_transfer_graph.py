@@ -0,0 +1,156 @@
+import unittest
+from unittest.mock import patch
+from datetime import timedelta
+from app.utils.bulk_insert import bulk_insert_transactions
+from app.utils.transfer_graph import TransferGraph, load_recent_edges, transfer_graph
+from helpers import START, AppTestCase, make_row
+from web3 import Web3
+
+def address(name):
+    return Web3.to_checksum_address('0x' + name * 40)
+
+def transfer_row(n, sender, receiver, amount=10.0, minutes=0):
+    return make_row(n, from_address=address(sender), to_address=address(receiver), amount=amount,
+                    block_number=100 + n, timestamp=START + timedelta(minutes=minutes))
+
+class TestTransferGraph(unittest.TestCase):
+    def setUp(self):
+        self.graph = TransferGraph(max_edges=1000, max_addresses=1000)
+
+    def test_k_hop_neighborhood(self):
+        """
+        Tests that a peel chain a -> b -> c -> d is followed hop by hop and
+        that edges among the reached addresses are aggregated.
+        """
+        self.graph.add_rows([transfer_row(1, 'a', 'b'), transfer_row(2, 'a', 'b', minutes=1),
+                             transfer_row(3, 'b', 'c'), transfer_row(4, 'c', 'd'), transfer_row(5, 'e', 'a')])
+
+        result = self.graph.neighborhood(address('a'), hops=2)
+        self.assertEqual({node['address']: node['hop'] for node in result['nodes']},
+                         {address('a'): 0, address('b'): 1, address('c'): 2})
+        ab = [edge for edge in result['edges'] if edge['to'] == address('b')][0]
+        self.assertEqual((ab['count'], ab['volume']), (2, 20.0))
+
+        result = self.graph.neighborhood(address('a'), hops=1, direction='in')
+        self.assertEqual({node['address'] for node in result['nodes']}, {address('a'), address('e')})
+        self.assertIsNone(self.graph.neighborhood(address('f')))
+
+    def test_top_fan_out_counts_fresh_counterparties(self):
+        """
+        Tests that fan-out counts distinct receivers and that only receivers
+        first seen inside the window count as fresh.
+        """
+        self.graph.add_rows([transfer_row(1, 'b', 'c', minutes=0)])
+        self.graph.add_rows([transfer_row(n, 'a', receiver, minutes=60 + n)
+                             for n, receiver in enumerate(['c', 'd', 'e', 'f', 'd'], start=2)])
+
+        top = self.graph.top_fan('out', start=START + timedelta(minutes=30))
+        self.assertEqual(top[0]['address'], address('a'))
+        self.assertEqual(top[0]['counterparties'], 4)
+        self.assertEqual(top[0]['fresh_counterparties'], 3)
+        self.assertEqual(top[0]['transfers'], 5)
+
+    def test_time_respecting_cycles(self):
+        """
+        Tests that a -> b -> c -> a is reported once, and that a cycle whose
+        closing transfer happened before it started is not.
+        """
+        self.graph.add_rows([transfer_row(1, 'a', 'b', minutes=0), transfer_row(2, 'b', 'c', minutes=1),
+                             transfer_row(3, 'c', 'a', minutes=2),
+                             transfer_row(4, 'e', 'd', minutes=0), transfer_row(5, 'd', 'f', minutes=5),
+                             transfer_row(6, 'f', 'e', minutes=3)])
+
+        cycles = self.graph.cycles()
+        self.assertEqual(len(cycles), 1)
+        self.assertEqual(cycles[0]['length'], 3)
+        self.assertEqual(set(cycles[0]['path']), {address('a'), address('b'), address('c')})
+        self.assertEqual(len(self.graph.cycles(address('a'))), 1)
+        # Funds leaving b only come back through a transfer made before
+        self.assertEqual(self.graph.cycles(address('b')), [])
+        self.assertEqual(self.graph.cycles(address('d')), [])
+
+    def test_memory_is_bounded(self):
+        """
+        Tests that the oldest edges are overwritten past max_edges and that
+        addresses no longer referenced are dropped on compaction.
+        """
+        graph = TransferGraph(max_edges=4, max_addresses=6)
+        graph.add_rows([transfer_row(n, 'a', name, minutes=n) for n, name in enumerate('bcdef12')])
+
+        self.assertEqual(len(graph), 4)
+        self.assertEqual(graph.stats()['addresses'], 5)
+        result = graph.neighborhood(address('a'), hops=1)
+        self.assertEqual({node['address'] for node in result['nodes']} - {address('a')},
+                         {address(name) for name in 'ef12'})
+
+    def test_compaction_is_amortized(self):
+        """
+        Tests that when live addresses alone exceed max_addresses, compaction
+        waits for more addresses instead of running on every batch, and that
+        a window taken before compaction keeps answering in its own ids.
+        """
+        graph = TransferGraph(max_edges=100, max_addresses=10)
+
+        def fan_out(first, count):
+            rows = [transfer_row(n, 'a', 'b', minutes=n) for n in range(first, first + count)]
+            for n, row in enumerate(rows, first):
+                row['to_address'] = Web3.to_checksum_address(f'0x{n:040x}')
+            graph.add_rows(rows)
+
+        compact = graph._compact
+        with patch.object(graph, '_compact', side_effect=compact) as compactions:
+            fan_out(1, 15)
+            window = graph._window(None, None)
+            for n in range(16, 22):
+                fan_out(n, 1)
+        # 16 live addresses move the next compaction to 21 interned addresses
+        self.assertEqual(compactions.call_count, 2)
+        self.assertEqual(graph.stats()['addresses'], 22)
+
+        result = graph.neighborhood(address('a'), hops=1)
+        self.assertEqual(len(result['nodes']), 22)
+        self.assertEqual(window.interner.address(window.lookup(address('a'))), address('a'))
+        # Addresses interned after the window was taken are outside its id space
+        self.assertIsNone(window.lookup(Web3.to_checksum_address(f'0x{18:040x}')))
+
+class TestGraphEndpoints(AppTestCase):
+    def tearDown(self):
+        super().tearDown()
+        transfer_graph.clear()
+
+    def test_loaded_on_first_use(self):
+        """Tests that the app factory leaves the graph empty and a graph endpoint loads it."""
+        bulk_insert_transactions([transfer_row(1, 'a', 'b'), transfer_row(2, 'b', 'c', minutes=1)])
+        transfer_graph.clear()
+        self.assertFalse(transfer_graph.stats()['loaded'])
+        self.assertEqual(transfer_graph.stats()['memory_bytes'], 0)
+
+        response = self.client.get(f"/api/graph/neighborhood/{address('a')}", query_string={'start': START.isoformat()})
+        self.assertEqual(len(response.get_json()['nodes']), 3)
+        self.assertTrue(transfer_graph.stats()['loaded'])
+
+    def test_graph_endpoints(self):
+        """
+        Tests that the graph is rebuilt from stored transfers and serves the
+        neighborhood, top-fan and cycle endpoints.
+        """
+        bulk_insert_transactions([transfer_row(1, 'a', 'b', minutes=0), transfer_row(2, 'b', 'c', minutes=1),
+                                  transfer_row(3, 'c', 'a', minutes=2)])
+        self.assertEqual(load_recent_edges(transfer_graph), 3)
+        window = {'start': START.isoformat()}
+
+        response = self.client.get(f"/api/graph/neighborhood/{address('a')}", query_string={'hops': 2, **window})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.get_json()['nodes']), 3)
+
+        response = self.client.get('/api/graph/top-fan', query_string=window)
+        self.assertEqual(len(response.get_json()['addresses']), 3)
+
+        response = self.client.get('/api/graph/cycles', query_string={'address': address('a'), **window})
+        self.assertEqual(len(response.get_json()['cycles']), 1)
+
+        response = self.client.get(f"/api/graph/neighborhood/{address('f')}")
+        self.assertEqual(response.status_code, 404)
+
+if __name__ == '__main__':
+    unittest.main()